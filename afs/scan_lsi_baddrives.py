@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+
+###
+### List drives behind the LSI controller(s) with non-zero error counters,
+### from one "storcli64 /call/eall/sall show all J"
+###
+
+import os
+import sys
+
+### storcli.py lives one level up in the repo (and alongside us once installed)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from storcli import Storcli_Drives, Drive_Errors
+
+for Drive in Storcli_Drives().values():
+
+	for Name, Value in Drive_Errors(Drive):
+		print(str(Drive.Eid_Slt) + " - " + Name + " = " + str(Value))
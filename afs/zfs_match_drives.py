@@ -15,51 +15,9 @@ from prettytable import PrettyTable
 ### Note:  Any time you can avoid using Popen is a huge win time-wise
 from subprocess import Popen, PIPE, STDOUT
 
-CacheDataArray = {}
-CacheTimeArray = {}
-
-def SysExec(cmd):
-
-        """
-        Run the given command and return the output
-        """
-
-        # Cache the output of the command for 20 seconds
-        Cache_Expires = 20
-
-        # Computed once, used twice
-        Cache_Keys = list(CacheDataArray.keys())
-        if cmd in Cache_Keys:
-                Cache_Age  = time.time() - CacheTimeArray[cmd]
-        else:
-                Cache_Age  = 0
-
-        Return_Val = "ERROR"
-
-        # If we have valid data cached, return it
-        if cmd in Cache_Keys and Cache_Age < Cache_Expires:
-                Return_Val = CacheDataArray[cmd]
-
-        # If the cmd is "cat", use fopen/fread/fclose to open it and
-        # cache it as we go
-        elif not cmd in Cache_Keys and cmd.split()[0] == "cat":
-                f = open(cmd.split()[1], "r")
-                CacheDataArray[cmd] = f.read()
-                CacheTimeArray[cmd] = time.time()
-                f.close()
-                Return_Val = CacheDataArray[cmd]
-
-        # If we don't have cached data, or it's too old, regenerate it
-        elif not cmd in Cache_Keys or Cache_Age > Cache_Expires:
-                CacheDataArray[cmd] = Popen(cmd.split(), stdout=PIPE, stderr=STDOUT).communicate()[0]
-                CacheTimeArray[cmd] = time.time()
-                Return_Val = CacheDataArray[cmd]
-
-        if str(type(Return_Val)) == "<class 'bytes'>":
-                Return_Val = Return_Val.decode("utf-8")
-
-        return Return_Val
-
+### sysexec.py lives one level up in the repo (and alongside us once installed)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from sysexec import SysExec
 
 #ls -alh /dev/disk/by-path/ | grep sas | grep -v part | rev | cut -d " " -f 3,1 | rev
 ### Get a list of paired /dev entries on servers with multipathing
@@ -9,6 +9,10 @@ import time
 from subprocess import Popen, PIPE, STDOUT
 from prettytable import PrettyTable
 
+### storcli.py lives at the top of the repo
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+from storcli import Storcli_Drives, Storcli_Virtual_Drives
+
 # Enable/disable debugging messages
 Print_Debug = False
 
@@ -186,53 +190,21 @@ def map_pd_to_vd_with_storcli():
 
 	map_vd_dev = map_WWN_to_Dev()
 
-	VD_to_PD_Map = {}
-	VD = []
-	scsi_naa_id = ""
-	PD = []
-	for line in SysExec("storcli64 /c0 /vall show all").splitlines():
-
-		if not re.search("/c0/|SCSI NAA| HDD ", line):
-			continue
-
-		if re.search("/c0/", line):
-			VD = line.split("/")[2].split()[0]
-
-		if re.search(" HDD ", line):
-			PD.append(line.split()[0])
-
-		if re.search("SCSI NAA", line):
-			scsi_naa_id = line.split("=")[1].strip()
-
-		if PD and VD and scsi_naa_id:
-
-			VD_to_PD_Map[VD] = {}
-
-			VD_to_PD_Map[VD]["scsi_naa_id"] = scsi_naa_id
-			VD_to_PD_Map[VD]["PD_List"] = PD
-
-			VD = []
-			scsi_naa_id = ""
-			PD = []
-
+	# One storcli run for all virtual drives and one for all physical drives
+	Drives = Storcli_Drives()
 
 	PD_to_VD_Map = []
-	for VD, list in VD_to_PD_Map.items():
-		PD_List = VD_to_PD_Map[VD]["PD_List"]
-		for i in PD_List:
-
-			e = i.split(":")[0]
-			s = i.split(":")[1]
+	for VDrive in Storcli_Virtual_Drives().values():
 
-			for line in SysExec("storcli64 /c0/e" + str(e) + "/s" + str(s) + " show all").splitlines():
+		if VDrive.Controller != 0:
+			continue
 
-				if re.search("^WWN", line):
-					WWN = line.split("=")[1].strip()
+		for Drive in Drives.values():
 
-				if re.search("^SN", line):
-					Serial = line.split("=")[1].strip()
+			if Drive.Controller != VDrive.Controller or not Drive.Eid_Slt in VDrive.Drives:
+				continue
 
-			PD_to_VD_Map.append([i, e, s, map_vd_dev[VD_to_PD_Map[VD]["scsi_naa_id"]], WWN.lower(), Serial, VD, VD_to_PD_Map[VD]["scsi_naa_id"]])
+			PD_to_VD_Map.append([Drive.Eid_Slt, Drive.Enclosure, Drive.Slot, map_vd_dev.get(VDrive.Naa_Id), Drive.Wwn, Drive.Serial, VDrive.Vd, VDrive.Naa_Id])
 
 	return(PD_to_VD_Map)
 
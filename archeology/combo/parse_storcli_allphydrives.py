@@ -8,6 +8,10 @@ import time
 
 from subprocess import Popen, PIPE, STDOUT
 
+### storcli.py lives at the top of the repo
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+from storcli import Storcli_Drives
+
 # Enable/disable debugging messages
 Print_Debug = True
 
@@ -143,133 +147,20 @@ def SysExec(cmd):
 
 def parse_storcli_allphydrives():
 	"""
-	Return a parsed version of "storcli /cALL/eALL/sALL show all"
+	Return a parsed version of "storcli /cALL/eALL/sALL show all J":
+	{ "/c0/e8/s1": { field: value } }
 	"""
 
-	output = SysExec("storcli64 /cALL/eALL/sALL show all")
-
 	parse_output = {}
 
-	# Pass 1:  Pluck out all the "key = val" lines and put them into a dict
-	for line in output.splitlines():
-
-		if not re.search("Drive | = ", line):
-			continue
-
-		if re.search("^CLI Version|^Operating system|^Controller|^Status|^Description|Inquiry Data", line):
-			continue
-
-		if re.search("^Drive", line) and re.search(" - Detailed Information :| State:| Device attributes :| Policies/Settings :", line):
-			continue
-
-		spl = line.split(" = ")
-
-		if len(spl) == 1:
-			ces = spl[0].split(" ")[1]
-			parse_output[ces] = {}
-		else:
-			key = line.split(" = ")[0].lower().strip().replace(" ", "_")
-			val = line.split(" = ")[1].strip().replace(" ", "_")
-
-			# Skip this one
-			if key == "inquiry_date":
-				continue
-
-			parse_output[ces][key] = val
-
-	# Pass 2:  Parse this section:
-	#
-	# -----------------------------------------------------------------------------
-	# EID:Slt DID State DG      Size Intf Med SED PI SeSz Model            Sp Type
-	# -----------------------------------------------------------------------------
-	# 9:12     10 Onln   0 10.913 TB SAS  HDD N   N  512B ST12000NM0027    U  -
-
-	# EID:Slt == Enclosure Device ID:Slot No.
-	# DID = Device ID
-	# State = Drive State
-	# DG = DriveGroup
-	# Size = Size of Drive
-	# Intf = Interface (SAS, SATA, etc.)
-	# Med  = Media Type
-	# SED  = Self Encryptive Drive
-	# PI   = Protection Info
-	# SeSZ = Sector Size
-	# Model = Drive Model
-	# Sp   = Spun [(U)p, (D)own, etc]
-	# Type = ???
-	Drive_info_headers = [ "EID:Slt", "DID", "State", "DG", "Size", "Size_Units", "Intf", "Med", "SED", "PI", "SeSz", "Model", "Sp", "Type" ]
-
-	Drive = ""
-	Drive_info = {}
-	for line in output.splitlines():
-
-		if not re.search("Drive |:", line):
-			continue
-
-		if re.search("^Drive", line) and re.search(" - Detailed Information :| State:| Device attributes :| Policies/Settings :|position", line):
-			continue
-
-		if re.search("Port Information|EID:Slt|Drive Temperature|Inquiry Data", line):
-			continue
-
-		if re.search("Drive", line):
-			Drive = line.split()[1]
-		else:
-			tmp = line.split()
-			Drive_info = dict(zip([x.lower() for x in Drive_info_headers], tmp))
-
-		if Drive and Drive_info:
-			for key, val in Drive_info.items():
-				parse_output[Drive][key] = val
-
-			Drive = ""
-			Drive_info = {}
-
-
-	# Pass 3:  Parse this section:
-	#
-	# Port Information :
-	# -----------------------------------------
-	# Port Status Linkspeed SAS address
-	# -----------------------------------------
-	#    0 Active 12.0Gb/s  0x5000c500a6c97269
-	#    1 Active 12.0Gb/s  0x0
-
-	Port_info_headers = ["Port", "State", "Speed", "SASAddr"]
-
-	Drive = ""
-	Port0_info = []
-	Port1_info = []
-	for line in output.splitlines():
-
-		if not re.search("Drive|0x", line):
-			continue
-
-		if re.search("Detailed Information|State|Device attributes|Policies|=|\|", line):
-			continue
-
-		if re.search("Drive", line):
-			Drive = line.split()[1]
-
-		if re.search(" 0 ", line):
-			tmp = line.split()
-			Port0_info = dict(zip([x.lower() for x in Port_info_headers], tmp))
-
-		if re.search(" 1 ", line):
-			tmp = line.split()
-			Port1_info = dict(zip([x.lower() for x in Port_info_headers], tmp))
-
-		if Drive and Port0_info and Port1_info:
-			for key, val in Port0_info.items():
-				parse_output[Drive][key + "_0"] = val
-			for key, val in Port1_info.items():
-				parse_output[Drive][key + "_1"] = val
+	for Path, Drive in Storcli_Drives().items():
+		parse_output[Path] = dict((key.lower(), val) for key, val in Drive._asdict().items() if key != "Raw")
 
 	return(parse_output)
 
 storcli_info = parse_storcli_allphydrives()
 
 # For debugging, take one drive and print out its info
-foo = storcli_info["/c0/e8/s1"]
-for key, val in foo.items():
-	print("/c0/e8/s1 " + key + " = " + val)
+for Drive in list(storcli_info)[:1]:
+	for key, val in storcli_info[Drive].items():
+		print(Drive + " " + key + " = " + str(val))
@@ -8,6 +8,10 @@ import time
 
 from subprocess import Popen, PIPE, STDOUT
 
+### storcli.py lives at the top of the repo
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+from storcli import Storcli_Drives, Storcli_Virtual_Drives
+
 # Enable/disable debugging messages
 Print_Debug = True
 
@@ -143,102 +147,28 @@ def SysExec(cmd):
 
 def parse_storcli_allvirtdrives():
 	"""
-	Return a parsed version of "storcli /cALL/eALL/sALL show all"
+	Return a parsed version of "storcli /cALL/vALL show all J":
+	{ "/c0/v0": { field: value, "pdrives": { "8:1": { field: value } } } }
 	"""
 
-	output = SysExec("storcli64 /cALL/vALL show all")
+	Drives = Storcli_Drives()
 
 	parse_output = {}
-	# Pass 1:  Pluck out all the "key = val" lines and put them into a dict
-	for line in output.splitlines():
-
-		if not re.search("/c| = ", line):
-			continue
-
-		if re.search("^CLI Version|^Operating system|^Controller|^Status|^Description", line):
-			continue
-
-		if re.search("^Drive", line) and re.search(" - Detailed Information :| State:| Device attributes :| Policies/Settings :", line):
-			continue
-
-		spl = line.split(" = ")
-
-		if len(spl) == 1:
-			ces = spl[0].split(" ")[1]
-			parse_output[ces] = {}
-		else:
-			key = line.split(" = ")[0].lower().strip().replace(" ", "_")
-			val = line.split(" = ")[1].strip().replace(" ", "_")
-
-			parse_output[ces][key] = val
-
-	print("DEBUG:  parse_output = " + str(parse_output))
-
-	# Pass 2:  Parse physical disks that belong to virtual disks
-	PD_headers = [ "EID:Slt", "DID", "State", "DG", "Size", "Size_Units", "Intf", "Med", "SED", "PI", "SeSz", "Model", "Sp", "Type" ]
-
-	for line in output.splitlines():
-
-		if re.search("=|PDs for VD|Properties|EID|Slt", line):
-			continue
-
-		if not re.search("/c|:", line):
-			continue
-
-		if re.search("/c", line):
-			VDrive = line.split()[0]
-			PDrives[VDrive] = {}
-		else:
-			Dict = dict(zip([x.lower() for x in PD_headers], line.split()))
-			CES = Dict["EID:Slt"]
-			Dict.pop("EID:Slt")
-#			parse_output[ces]PDrives[VDrive][CES] = Dict
-
-
-	# Pass 3:  Parse this section:
-	#
-	# Port Information :
-	# -----------------------------------------
-	# Port Status Linkspeed SAS address
-	# -----------------------------------------
-	#    0 Active 12.0Gb/s  0x5000c500a6c97269
-	#    1 Active 12.0Gb/s  0x0
-
-	Port_info_headers = ["Port", "State", "Speed", "SASAddr"]
-
-	Drive = ""
-	Port0_info = []
-	Port1_info = []
-	for line in output.splitlines():
-
-		if not re.search("Drive|0x", line):
-			continue
-
-		if re.search("Detailed Information|State|Device attributes|Policies|=|\|", line):
-			continue
-
-		if re.search("Drive", line):
-			Drive = line.split()[1]
 
-		if re.search(" 0 ", line):
-			tmp = line.split()
-			Port0_info = dict(zip([x.lower() for x in Port_info_headers], tmp))
+	for Path, VDrive in Storcli_Virtual_Drives().items():
 
-		if re.search(" 1 ", line):
-			tmp = line.split()
-			Port1_info = dict(zip([x.lower() for x in Port_info_headers], tmp))
+		parse_output[Path] = dict((key.lower(), val) for key, val in VDrive._asdict().items() if key != "Raw")
+		parse_output[Path]["pdrives"] = {}
 
-		if Drive and Port0_info and Port1_info:
-			for key, val in Port0_info.items():
-				parse_output[Drive][key + "_0"] = val
-			for key, val in Port1_info.items():
-				parse_output[Drive][key + "_1"] = val
+		for Drive in Drives.values():
+			if Drive.Controller == VDrive.Controller and Drive.Eid_Slt in VDrive.Drives:
+				parse_output[Path]["pdrives"][Drive.Eid_Slt] = dict((key.lower(), val) for key, val in Drive._asdict().items() if key != "Raw")
 
 	return(parse_output)
 
 storcli_info = parse_storcli_allvirtdrives()
 
 # For debugging, take one drive and print out its info
-foo = storcli_info["/c0/e8/s1"]
-for key, val in foo.items():
-	print("/c0/e8/s1 " + key + " = " + val)
+for Drive in list(storcli_info)[:1]:
+	for key, val in storcli_info[Drive].items():
+		print(Drive + " " + key + " = " + str(val))
@@ -13,7 +13,7 @@ Date="${Day} ${Hour}:00:00"
 
 ### Pull Dev/Rid info from lsblock
 lb=$(mktemp)
-lsblock | grep disk:hd | awk '{ print $1,$2 }' | sed "s/ /,/" > "${lb}"
+lsblock --csv --fields=SD_Device,RID,MediaType | awk -F, '$3 == "disk:hd" { print $1","$2 }' > "${lb}"
 
 ### Determine the enclosure type
 Enclosure_tmp=$(lsscsi -g | grep "enclosu")
@@ -52,7 +52,7 @@ done
 ### Cache smartctl and lsslot results so we don't have to poll multiple times
 s=$(mktemp)
 l=$(mktemp)
-lsslot | egrep -v "(Backplane|----)" | awk '{ print $2,$4,$8,$10 }' | sed "s/ /,/g" > ${l}
+lsslot --csv --fields=Backplane,Slot,Dev,RID | tail -n +2 > ${l}
 
 ### Iterate over all drives and collect info
 for i in $(cat "${lb}")
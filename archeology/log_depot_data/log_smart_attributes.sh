@@ -1,39 +1,14 @@
 #!/usr/bin/env bash
 
-### Get the date for logging
-Day=$(date "+%F")
-Hour=$(date "+%H")
-Date="${Day} ${Hour}:00:00"
-
-DRIVES=$(lsblock | grep /dev/ | awk '{ print $1,$2 }' | tr " " ",")
-
-t=$(mktemp)
-
-for line in ${DRIVES}
-do
-
-	DEV=$(echo ${line} | cut -d "," -f 1)
-	RID=$(echo ${line} | cut -d "," -f 2)
-
-	if [ "${RID}" == "NORID" ]; then
-
-		# See if it's the OS SSD
-		d=$(echo ${DEV} | cut -d "/" -f 3)
-
-		is_rotational=$(cat /sys/block/${d}/queue/rotational)
-
-		if [ "${is_rotational}" -eq "0" ]; then
-			RID="OS_SSD"
-		fi
-	fi
-
-	smart_attributes.py ${DEV} | grep "[0-9]_" | awk '{ print $1,$2,$3,$4,$5 }' | tr " " ":" > ${t}
-
-	for entry in $(cat ${t})
-	do
-
-		echo "${Date},${HOSTNAME},${RID},${entry}"
-
-	done
-done
-
+### Sample the SMART attributes of every drive into the per-drive history
+### store (/var/lib/depot-tools/smart, see smarthist.py), then print the
+### samples just taken in the CSV format this script has always produced:
+###
+###	<date>,<host>,<rid>,<id>_<name>:<value>:<worst>:<thresh>:<raw>
+###
+### Use "smart_history.py query" / "smart_history.py csv --since ..." to look
+### further back instead of grepping an aggregate CSV.
+
+smart_history.py record || exit 1
+
+smart_history.py csv --since 30m
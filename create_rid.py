@@ -41,5 +41,5 @@ if len(sys.argv) != 3:
 Rid = sys.argv[1]
 Dev = sys.argv[2]
 
-RID_Create(Rid, Dev, AssumeYes = True)
+RID_Command(RID_Create, Rid, Dev, AssumeYes = True)
 
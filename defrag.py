@@ -10,9 +10,10 @@ import os
 import re
 import sys
 import logging
-import multiprocessing
+import argparse
 
 from ridlib import *
+from iobudget import IOBudget, TimeWindow, Parse_Rate
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(message)s')
 
@@ -28,20 +29,43 @@ for i in sys.argv:
 # Define log directory and create it if it doesn't exist.
 LogDir = "/var/log/defrag"
 
-# Get a list of available rids
-Depot_Dir = "/depot"
-Rids = []
-for Dir in os.listdir(Depot_Dir):
-	if not re.search("^rid-", Dir):
-		continue
-	Rids.append(Dir.split("-")[1])
+# Where the per-RID extent indexes and walk checkpoints are kept between runs.
+IndexDir = "/var/lib/depot-tools/defrag"
 
-logging.debug("Rids = " + str(Rids))
+# How many rids to defrag at once, in total and per controller/SCSI host/enclosure.
+# e4defrag is much harder on the controller than fsck.
+Workers = 8
+Limits = { "controller": 4, "host": 4, "enclosure": 2 }
+
+parser = argparse.ArgumentParser(description = ' - Defrag all the Rids on a depot without getting in the way of ibp_server')
+
+parser.add_argument('rids',             metavar = 'rid', nargs = '*', help = 'The RIDs to defrag (default: every RID under /depot)')
+parser.add_argument('--threshold',      metavar = '<extents>', type = int, default = 3, help = 'Only defrag files with more extents than this (default: 3)')
+parser.add_argument('--workers',        metavar = '<n>', type = int, default = Workers, help = 'How many RIDs to defrag at once (default: ' + str(Workers) + ')')
+parser.add_argument('--rate',           metavar = '<bytes/s>', type = Parse_Rate, default = None, help = 'Per-RID defrag budget, e.g. 20M (default: unlimited)')
+parser.add_argument('--global-rate',    metavar = '<bytes/s>', type = Parse_Rate, default = None, help = 'Defrag budget shared by all RIDs, e.g. 200M (default: unlimited)')
+parser.add_argument('--busy-threshold', metavar = '<percent>', type = float, default = None, help = 'Back off while a RID\'s disk is busier than this, per /proc/diskstats')
+parser.add_argument('--window',         metavar = '<HH:MM-HH:MM>', type = TimeWindow, default = None, help = 'Only defrag inside this daily window, e.g. 22:00-06:00, and pause outside it')
+parser.add_argument('--no-ionice',      action = 'store_true', help = 'Don\'t run e4defrag in the idle I/O scheduling class')
 
 if __name__ == '__main__':
-	jobs = []
-	for Rid in Rids:
-		logging.debug("Spawning defrag process on RID " + Rid)
-		p = multiprocessing.Process(target = RID_Defrag, args=(Rid, LogDir,))
-		jobs.append(p)
-		p.start()
+
+	args = parser.parse_args()
+
+	# Get a list of available rids
+	Depot_Dir = "/depot"
+	Rids = args.rids
+	if not Rids:
+		for Dir in os.listdir(Depot_Dir):
+			if not re.search("^rid-", Dir):
+				continue
+			Rids.append(Dir.split("-")[1])
+
+	logging.debug("Rids = " + str(Rids))
+
+	Budget = IOBudget(Rate = args.rate, Global_Rate = args.global_rate, Busy_Threshold = args.busy_threshold,
+			Window = args.window, Idle = not args.no_ionice)
+
+	Results = RID_Run_All(RID_Defrag, Rids, LogDir, Extent_Threshold = args.threshold, IndexDir = IndexDir,
+			Budget = Budget, Workers = args.workers, Limits = Limits)
+	sys.exit(Print_RID_Results(Results))
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+
+"""
+extentindex - A persistent per-RID index of file extent counts for RID_Defrag.
+
+A RID holds millions of allocations and almost none of them change between
+two defrag runs, yet every run used to measure every file again and throw the
+previous results away.  ExtentIndex keeps (path, inode, size, mtime, extents)
+for every file of one RID in a local SQLite file so a run only measures files
+that are new or changed.
+
+The walk is checkpointed one top-level data directory (data/0 .. data/255) at
+a time: a directory is marked done only after its files are stored and
+defragged, so a run that is interrupted picks up at the first directory that
+isn't done yet.  Once every directory is done the next run starts a new pass.
+
+The extents log in /var/log/defrag is written from the index by Write_Report().
+"""
+
+import os
+import sqlite3
+import time
+
+from fiemap import FileExtents
+
+INDEX_DIR = "/var/lib/depot-tools/defrag"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path           TEXT PRIMARY KEY,
+    root           TEXT NOT NULL,
+    inode          INTEGER NOT NULL,
+    size           INTEGER NOT NULL,
+    mtime          INTEGER NOT NULL,
+    extents        INTEGER NOT NULL,
+    extents_before INTEGER,
+    defragged      INTEGER
+);
+CREATE INDEX IF NOT EXISTS files_root ON files (root);
+CREATE TABLE IF NOT EXISTS checkpoint (
+    root     TEXT PRIMARY KEY,
+    pass     INTEGER NOT NULL,
+    finished INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class ExtentIndex(object):
+    """
+    The extent index of one RID.  The connection belongs to the thread that
+    created the index; known() opens its own, so it can be called from the
+    Scan_Roots() worker threads.
+    """
+
+    def __init__(self, Rid, Index_Dir=INDEX_DIR):
+
+        self.Rid = Rid
+
+        os.makedirs(Index_Dir, exist_ok=True)
+        self.Path = os.path.join(Index_Dir, "rid-" + str(Rid) + ".sqlite")
+
+        self._db = sqlite3.connect(self.Path, timeout=60)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+    def _meta(self, Key, Default=None):
+
+        Row = self._db.execute("SELECT value FROM meta WHERE key = ?", (Key,)).fetchone()
+        return Row[0] if Row else Default
+
+    def _set_meta(self, Key, Value):
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (Key, str(Value)))
+
+    def current_pass(self):
+        return int(self._meta("pass", 0))
+
+    def pass_times(self):
+        """
+        Return when the current pass started and when a pass last finished
+        (epoch seconds, or None).
+        """
+
+        Started = self._meta("pass_started")
+        Finished = self._meta("pass_finished")
+        return (int(Started) if Started else None, int(Finished) if Finished else None)
+
+    def pending_roots(self, Roots):
+        """
+        Return the Roots not yet done in the current pass, in order.  If they
+        are all done (or no pass was ever started) a new pass is started and
+        every root is returned.
+        """
+
+        Pass = self.current_pass()
+        Done = set(r[0] for r in self._db.execute("SELECT root FROM checkpoint WHERE pass = ?", (Pass,)))
+
+        Pending = [Root for Root in Roots if Root not in Done]
+
+        if Pass == 0 or not Pending:
+            with self._db:
+                self._set_meta("pass", Pass + 1)
+                self._set_meta("pass_started", int(time.time()))
+            Pending = list(Roots)
+
+        return Pending
+
+    def known(self, Root):
+        """
+        Return {path: FileExtents} for everything stored under Root.
+        """
+
+        db = sqlite3.connect(self.Path, timeout=60)
+        try:
+            Rows = db.execute("SELECT path, inode, size, mtime, extents FROM files WHERE root = ?", (Root,)).fetchall()
+        finally:
+            db.close()
+
+        return dict((Row[0], FileExtents(*(Row + (False,)))) for Row in Rows)
+
+    def update_root(self, Root, Records, Defragged=None, Failed=()):
+        """
+        Store the result of scanning Root and mark it done in this pass.
+        Records is the full list of files found under it; anything stored
+        that wasn't found is dropped.  Defragged maps path -> (extents before,
+        extents after) for the files e4defrag ran on.  Files in Failed (e4defrag
+        failed on them) aren't stored, so the next pass measures and tries
+        them again.
+        """
+
+        if Defragged is None:
+            Defragged = {}
+
+        Now = int(time.time())
+        Failed = set(Failed)
+        Seen = set(Record.Path for Record in Records if Record.Path not in Failed)
+
+        with self._db:
+
+            Stored = [r[0] for r in self._db.execute("SELECT path FROM files WHERE root = ?", (Root,))]
+            self._db.executemany("DELETE FROM files WHERE path = ?", [(p,) for p in Stored if p not in Seen])
+
+            self._db.executemany(
+                "INSERT OR REPLACE INTO files (path, root, inode, size, mtime, extents) VALUES (?, ?, ?, ?, ?, ?)",
+                [(r.Path, Root, r.Inode, r.Size, r.Mtime, r.Extents) for r in Records if r.Changed and r.Path in Seen])
+
+            self._db.executemany(
+                "UPDATE files SET extents_before = ?, extents = ?, defragged = ? WHERE path = ?",
+                [(Before, After, Now, Path) for Path, (Before, After) in Defragged.items() if After is not None])
+
+            self._db.execute("INSERT OR REPLACE INTO checkpoint (root, pass, finished) VALUES (?, ?, ?)",
+                             (Root, self.current_pass(), Now))
+
+    def finish_pass(self):
+        with self._db:
+            self._set_meta("pass_finished", int(time.time()))
+
+    def stats(self, Threshold):
+        """
+        Return (files, bytes, files above Threshold) over the whole RID.
+        """
+
+        Files, Bytes = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files").fetchone()
+        Above = self._db.execute("SELECT COUNT(*) FROM files WHERE extents > ?", (Threshold,)).fetchone()[0]
+
+        return Files, Bytes, Above
+
+    def defragged(self):
+        """
+        Return (path, size, extents before, extents after, when) for every
+        file e4defrag has been run on, most recent first.
+        """
+
+        return self._db.execute(
+            "SELECT path, size, extents_before, extents, defragged FROM files "
+            "WHERE defragged IS NOT NULL ORDER BY defragged DESC, path").fetchall()
+
+
+def Write_Report(Index, Logfile, Threshold):
+    """
+    Write the extents log for Index.Rid to Logfile from the index.
+    """
+
+    Rid = str(Index.Rid)
+    Files, Bytes, Above = Index.stats(Threshold)
+
+    Started, Finished = Index.pass_times()
+
+    def When(Stamp):
+        if Stamp is None:
+            return "never"
+        return time.strftime("%a %b %d %T %Z %Y", time.gmtime(int(Stamp)))
+
+    Tmp = Logfile + ".tmp"
+
+    with open(Tmp, "w") as f:
+
+        f.write("# EXTENTS REPORT RID " + Rid + " - " + When(time.time()) + "\n")
+        f.write("# PASS " + str(Index.current_pass()) + " STARTED " + When(Started) + ", LAST FINISHED " + When(Finished) + "\n")
+        f.write("# " + str(Files) + " files, " + str(Bytes) + " bytes, " + str(Above) +
+                " still above " + str(Threshold) + " extents\n")
+        f.write("##################################################################\n")
+
+        for Path, Size, Before, After, Stamp in Index.defragged():
+            f.write("Rid = " + Rid + " and Filename = " + Path + " and Filesize = " + str(Size) +
+                    " and Extents Before = " + str(Before) + " and Extents after = " + str(After) +
+                    " and Defragged = " + When(Stamp) + "\n")
+
+        f.write("##################################################################\n")
+
+    os.rename(Tmp, Logfile)
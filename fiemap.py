@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+
+"""
+fiemap - Count file extents in-process with the FS_IOC_FIEMAP ioctl.
+
+RID_Defrag used to fork "filefrag" for every allocation on a RID just to learn
+how many extents it had.  The same number is one ioctl away: calling FIEMAP
+with fm_extent_count = 0 makes the kernel return just the number of extents
+without copying any of them out.
+
+Scan_Extents() walks a set of directories on a thread pool (scandir and the
+ioctl both release the GIL) and yields one FileExtents record per file.
+Scan_Roots() does the same one top-level directory at a time and can reuse
+counts from a previous scan for files whose inode, size and mtime haven't
+changed.
+"""
+
+import collections
+import concurrent.futures
+import fcntl
+import logging
+import os
+import struct
+
+# _IOWR('f', 11, struct fiemap)
+FS_IOC_FIEMAP = 0xC020660B
+
+FIEMAP_MAX_OFFSET = 0xFFFFFFFFFFFFFFFF
+
+# struct fiemap: fm_start, fm_length, fm_flags, fm_mapped_extents, fm_extent_count, fm_reserved
+_FIEMAP_HEADER = struct.Struct("=QQIIII")
+
+# struct fiemap_extent: fe_logical, fe_physical, fe_length, fe_reserved64[2], fe_flags, fe_reserved[3]
+_FIEMAP_EXTENT = struct.Struct("=QQQQQIIII")
+
+# Directories on a RID that are never worth defragmenting
+SKIP_DIRS = ("deleted_trash", "expired_trash", "lost+found")
+
+# Changed is False when Extents was reused from a previous scan.
+FileExtents = collections.namedtuple("FileExtents", ["Path", "Inode", "Size", "Mtime", "Extents", "Changed"])
+
+
+def _fiemap(fd, Count):
+
+    Buf = bytearray(_FIEMAP_HEADER.size + Count * _FIEMAP_EXTENT.size)
+    _FIEMAP_HEADER.pack_into(Buf, 0, 0, FIEMAP_MAX_OFFSET, 0, 0, Count, 0)
+
+    fcntl.ioctl(fd, FS_IOC_FIEMAP, Buf, True)
+
+    Mapped = _FIEMAP_HEADER.unpack_from(Buf, 0)[3]
+    return Mapped, Buf
+
+
+def _merged_extents(fd, Mapped):
+    """
+    Count extents the way filefrag does: physically contiguous extents
+    (ext4 splits large ones into 128 MiB pieces) count as one.
+    """
+
+    Mapped, Buf = _fiemap(fd, Mapped)
+
+    Count = 0
+    Next_Physical = None
+    for i in range(Mapped):
+        _, Physical, Length = _FIEMAP_EXTENT.unpack_from(Buf, _FIEMAP_HEADER.size + i * _FIEMAP_EXTENT.size)[:3]
+        if Physical != Next_Physical:
+            Count += 1
+        Next_Physical = Physical + Length
+
+    return Count
+
+
+def Count_Extents(Path, Threshold=0):
+    """
+    Return the number of extents in Path, or None if it can't be determined.
+
+    Counts at or below Threshold come straight from the kernel's extent count
+    (one cheap ioctl); counts above it have contiguous extents merged like
+    filefrag does, so a large but unfragmented file isn't reported as
+    fragmented.
+    """
+
+    try:
+        fd = os.open(Path, os.O_RDONLY | getattr(os, "O_NOATIME", 0))
+    except PermissionError:
+        try:
+            fd = os.open(Path, os.O_RDONLY)
+        except OSError:
+            return None
+    except OSError:
+        return None
+
+    try:
+        Mapped = _fiemap(fd, 0)[0]
+        if Mapped > Threshold and Mapped > 1:
+            Mapped = _merged_extents(fd, Mapped)
+        return Mapped
+    except OSError as e:
+        logging.debug("Count_Extents:: FIEMAP failed on " + Path + ": " + str(e))
+        return None
+    finally:
+        os.close(fd)
+
+
+def _scan_tree(Root, Threshold, Skip_Dirs, Known=None):
+
+    if Known is None:
+        Known = {}
+
+    Results = []
+    Stack = [Root]
+
+    while Stack:
+
+        Dir = Stack.pop()
+
+        try:
+            Entries = list(os.scandir(Dir))
+        except OSError as e:
+            logging.debug("Scan_Extents:: cannot scan " + Dir + ": " + str(e))
+            continue
+
+        for Entry in Entries:
+
+            try:
+                if Entry.is_dir(follow_symlinks=False):
+                    if Entry.name not in Skip_Dirs:
+                        Stack.append(Entry.path)
+                    continue
+
+                if not Entry.is_file(follow_symlinks=False):
+                    continue
+
+                St = Entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+
+            Old = Known.get(Entry.path)
+            if Old is not None and (Old.Inode, Old.Size, Old.Mtime) == (St.st_ino, St.st_size, int(St.st_mtime)):
+                Results.append(Old._replace(Changed=False))
+                continue
+
+            Extents = Count_Extents(Entry.path, Threshold)
+            if Extents is None:
+                continue
+
+            Results.append(FileExtents(Entry.path, St.st_ino, St.st_size, int(St.st_mtime), Extents, True))
+
+    return Results
+
+
+def Scan_Roots(Roots, Threshold=0, Workers=8, Skip_Dirs=SKIP_DIRS, Known=None):
+    """
+    Walk every directory in Roots on a pool of Workers threads and yield
+    (Root, [FileExtents, ...]) for each one, in the order given.  Directories
+    named in Skip_Dirs are not descended into.  See Count_Extents() for
+    Threshold.
+
+    Known, if given, is called with each Root (on a worker thread) and returns
+    a {path: FileExtents} dict from an earlier scan; files whose inode, size
+    and mtime still match are not measured again.
+    """
+
+    Roots = [Root for Root in Roots if os.path.basename(Root) not in Skip_Dirs and os.path.isdir(Root)]
+
+    def Scan(Root):
+        return Root, _scan_tree(Root, Threshold, Skip_Dirs, Known(Root) if Known else None)
+
+    Workers = max(1, Workers)
+
+    # Only keep a couple of roots per worker in flight, so a caller that
+    # pauses between roots pauses the walk too.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=Workers) as Pool:
+
+        Queue = collections.deque()
+        Roots = iter(Roots)
+
+        for Root in Roots:
+            Queue.append(Pool.submit(Scan, Root))
+            if len(Queue) >= 2 * Workers:
+                break
+
+        while Queue:
+            Root, Results = Queue.popleft().result()
+            for Next in Roots:
+                Queue.append(Pool.submit(Scan, Next))
+                break
+            yield Root, Results
+
+
+def Scan_Extents(Roots, Threshold=0, Workers=8, Skip_Dirs=SKIP_DIRS):
+    """
+    Like Scan_Roots(), but yield the FileExtents records one at a time.
+    """
+
+    for _, Results in Scan_Roots(Roots, Threshold, Workers, Skip_Dirs):
+        for Record in Results:
+            yield Record
@@ -109,13 +109,13 @@ else:
 
 			if is_rid_mounted(rid):
 				print("DEBUG:  Rid " + rid + " is currently mounted.  Unmounting...")
-				RID_Umount(rid)
+				RID_Command(RID_Umount, rid)
 
 			print("DEBUG:  Conducting fsck on Rid " + rid + "...")
-			RID_Fsck(rid)
+			RID_Command(RID_Fsck, rid, Force = True)
 
 			print("DEBUG:  Mounting Rid " + rid + "...")
-			RID_Mount(rid)
+			RID_Command(RID_Mount, rid)
 
 			print("DEBUG:  Readding rid to running IBP server...")
 			RID_Merge_Config()
@@ -5,7 +5,6 @@ import re
 import sys
 import stat
 import logging
-import multiprocessing
 
 from ridlib import *
 
@@ -19,8 +18,15 @@ for i in sys.argv:
 	if re.search("time", i):
 		sys.argv.remove(i)
 
+# Filesystems whose superblock says they are clean and recently checked are
+# skipped unless "--force" is given.
+Force = "--force" in sys.argv[1:]
+
 # By default, assume a parallel fsck unless specifically told serial.  Ignore this bit until later.
 
+# How many rids to fsck at once, in total and per controller/SCSI host/enclosure.
+Workers = 8
+Limits = { "controller": 8, "host": 8, "enclosure": 4 }
 
 # Get a list of available rids
 Rids = Generate_Rid_Dict()
@@ -29,9 +35,5 @@ Rids = Generate_Rid_Dict()
 logging.debug("Rids = " + str(Rids))
 
 if __name__ == '__main__':
-	jobs = []
-	for This_Rid in Rids:
-		logging.debug("Spawning defrag process on RID " + This_Rid)
-		p = multiprocessing.Process(target = RID_Fsck, args=(This_Rid,))
-		jobs.append(p)
-		p.start()
+	Results = RID_Run_All(RID_Fsck, Rids, Force = Force, Workers = Workers, Limits = Limits)
+	sys.exit(Print_RID_Results(Results))
@@ -17,7 +17,9 @@ def Help_RID_Fsck():
 	print("")
 	print(sys.argv[0] + " - fsck all partitions belonging to a given rid.")
 	print("")
-	print("USAGE:  " + sys.argv[0] + " <RID>")
+	print("USAGE:  " + sys.argv[0] + " [--force] <RID>")
+	print("")
+	print("Partitions that are clean and recently checked are skipped unless --force is given.")
 	print("")
 	sys.exit(1)
 
@@ -29,9 +31,14 @@ for i in sys.argv:
 	if re.search("time", i):
 		sys.argv.remove(i)
 
+Force = False
+if "--force" in sys.argv:
+	sys.argv.remove("--force")
+	Force = True
+
 if len(sys.argv) != 2:
 	Help_RID_Fsck()
 
 Rid = sys.argv[1]
 
-RID_Fsck(Rid)
+print(RID_Command(RID_Fsck, Rid, Force = Force))
@@ -33,4 +33,4 @@ md_dir = re.sub("'", "", args.md_dir)
 
 logging.debug("import_rid.py::  rid = " + rid + " and md_dir = " + md_dir + " and snap = " + str(snap))
 
-RID_Import(rid, md_dir, Snap = snap)
+RID_Command(RID_Import, rid, md_dir, Snap = snap)
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+
+"""
+iobudget - Keep background maintenance I/O out of the way of ibp_server.
+
+defrag.py used to run e4defrag flat out on every RID at once, on the same
+spindles ibp_server is serving clients from.  An IOBudget limits that in
+four ways:
+
+    - a bytes per second budget per RID and one shared by all RIDs
+      (token buckets, charged with the size of each file before e4defrag
+      runs on it),
+    - e4defrag runs in the idle I/O scheduling class (ionice -c3),
+    - when /proc/diskstats shows the RID's disk busier than a threshold, the
+      RID backs off until it quiets down,
+    - outside a daily time window ("22:00-06:00") everything pauses.
+
+IOBudget is shared by every RID of a run; each RID gets its own RidThrottle
+from IOBudget.for_rid() and calls wait() before each unit of work.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+
+DISKSTATS = "/proc/diskstats"
+
+_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+
+def Parse_Rate(Text):
+    """
+    Parse a byte rate such as "50M", "1.5G" or "4096" (per second) into
+    bytes per second.  "0" and "" mean unlimited and return None.
+    """
+
+    if Text is None:
+        return None
+
+    m = re.match(r"^\s*([0-9]*\.?[0-9]+)\s*([KMGT]?)(?:i?B)?(?:/s)?\s*$", str(Text), re.IGNORECASE)
+    if not m:
+        raise ValueError("Invalid rate: " + str(Text))
+
+    Rate = float(m.group(1)) * _UNITS[m.group(2).upper()]
+    return Rate if Rate > 0 else None
+
+
+class TokenBucket(object):
+    """
+    A thread-safe token bucket holding up to Burst bytes (one second of Rate
+    by default) and refilling at Rate bytes per second.  A Rate of None means
+    unlimited.
+    """
+
+    def __init__(self, Rate, Burst=None):
+
+        self.Rate = Rate
+        self.Burst = Burst if Burst is not None else Rate
+
+        self._lock = threading.Lock()
+        self._tokens = self.Burst
+        self._stamp = time.monotonic()
+
+    def _refill(self):
+
+        Now = time.monotonic()
+        self._tokens = min(self.Burst, self._tokens + (Now - self._stamp) * self.Rate)
+        self._stamp = Now
+
+    def consume(self, Bytes):
+        """
+        Take Bytes out of the bucket, sleeping until they're available.  A
+        request bigger than the bucket runs the balance negative, so a single
+        huge file waits its turn afterwards instead of never fitting.
+        Returns the number of seconds slept.
+        """
+
+        if not self.Rate:
+            return 0.0
+
+        Slept = 0.0
+
+        with self._lock:
+            self._refill()
+            Need = min(Bytes, self.Burst)
+            while self._tokens < Need:
+                Delay = (Need - self._tokens) / self.Rate
+                time.sleep(Delay)
+                Slept += Delay
+                self._refill()
+            self._tokens -= Bytes
+
+        return Slept
+
+
+class TimeWindow(object):
+    """
+    A daily window such as "22:00-06:00" (local time), which may wrap past
+    midnight.  None means always open.
+    """
+
+    def __init__(self, Spec):
+
+        m = re.match(r"^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*$", Spec)
+        if not m:
+            raise ValueError("Invalid time window: " + Spec + " (expected HH:MM-HH:MM)")
+
+        H1, M1, H2, M2 = [int(g) for g in m.groups()]
+        if H1 > 23 or H2 > 24 or (H2 == 24 and M2) or M1 > 59 or M2 > 59:
+            raise ValueError("Invalid time window: " + Spec)
+
+        self.Spec = Spec.strip()
+        self.Start = H1 * 60 + M1
+        self.End = H2 * 60 + M2
+
+    def _minute(self, Now=None):
+        t = time.localtime(Now)
+        return t.tm_hour * 60 + t.tm_min
+
+    def is_open(self, Now=None):
+
+        Minute = self._minute(Now)
+
+        if self.Start == self.End:
+            return True
+        if self.Start < self.End:
+            return self.Start <= Minute < self.End
+        return Minute >= self.Start or Minute < self.End
+
+    def seconds_until_open(self, Now=None):
+
+        if self.is_open(Now):
+            return 0
+
+        Now = time.time() if Now is None else Now
+        t = time.localtime(Now)
+        Wait = (self.Start - (t.tm_hour * 60 + t.tm_min)) % (24 * 60)
+        return max(1, Wait * 60 - t.tm_sec)
+
+
+def Read_Io_Ticks(Disk):
+    """
+    Return the milliseconds Disk has spent doing I/O (the io_ticks column of
+    /proc/diskstats), or None if it isn't listed.
+    """
+
+    Name = os.path.basename(Disk)
+
+    try:
+        with open(DISKSTATS) as f:
+            for Line in f:
+                Fields = Line.split()
+                if len(Fields) > 12 and Fields[2] == Name:
+                    return int(Fields[12])
+    except OSError:
+        pass
+
+    return None
+
+
+class BusyMonitor(object):
+    """
+    Tracks how busy a disk is (percent of wall time with I/O in flight) from
+    successive /proc/diskstats samples.
+    """
+
+    def __init__(self, Disk):
+
+        self.Disk = Disk
+        self.reset()
+
+    def reset(self):
+        """
+        Start the next sample now, forgetting the I/O done since the last one.
+        """
+
+        self._ticks = Read_Io_Ticks(self.Disk)
+        self._stamp = time.monotonic()
+
+    def busy(self, Min_Interval=1.0):
+        """
+        Return the disk's utilisation since the last call, sampling for at
+        least Min_Interval seconds.  Returns None if the disk can't be found.
+        """
+
+        if self._ticks is None:
+            return None
+
+        Elapsed = time.monotonic() - self._stamp
+        if Elapsed < Min_Interval:
+            time.sleep(Min_Interval - Elapsed)
+
+        Ticks = Read_Io_Ticks(self.Disk)
+        Now = time.monotonic()
+
+        if Ticks is None:
+            return None
+
+        Busy = 100.0 * (Ticks - self._ticks) / ((Now - self._stamp) * 1000.0)
+
+        self._ticks = Ticks
+        self._stamp = Now
+
+        return min(100.0, max(0.0, Busy))
+
+
+class IOBudget(object):
+    """
+    The limits for a whole run.  Rate and Global_Rate are bytes per second
+    (None for unlimited), Busy_Threshold is a percentage (None to never back
+    off) and Window a TimeWindow (None for always).  Every Check_Interval
+    seconds the disk is sampled for Sample_Interval seconds while this RID's
+    defrag is stopped, so only other I/O counts towards Busy_Threshold.
+    """
+
+    def __init__(self, Rate=None, Global_Rate=None, Busy_Threshold=None, Window=None,
+                 Idle=True, Check_Interval=5.0, Sample_Interval=0.5, Max_Backoff=300.0):
+
+        self.Rate = Rate
+        self.Busy_Threshold = Busy_Threshold
+        self.Window = Window
+        self.Idle = Idle
+        self.Check_Interval = Check_Interval
+        self.Sample_Interval = Sample_Interval
+        self.Max_Backoff = Max_Backoff
+
+        self.Global = TokenBucket(Global_Rate)
+
+    def command(self, Cmd):
+        """
+        Return Cmd (a list) wrapped to run in the idle I/O class if asked to.
+        """
+
+        if self.Idle:
+            return ["ionice", "-c", "3"] + list(Cmd)
+        return list(Cmd)
+
+    def for_rid(self, Rid, Disk):
+        return RidThrottle(self, Rid, Disk)
+
+
+class RidThrottle(object):
+    """
+    Applies an IOBudget to one RID on one disk.
+    """
+
+    def __init__(self, Budget, Rid, Disk):
+
+        self.Budget = Budget
+        self.Rid = str(Rid)
+        self.Bucket = TokenBucket(Budget.Rate)
+        self.Monitor = BusyMonitor(Disk) if Disk and Budget.Busy_Threshold is not None else None
+
+        self._checked = time.monotonic()
+
+        self.Paused = 0.0
+
+    def _wait_window(self):
+
+        Window = self.Budget.Window
+        if Window is None:
+            return
+
+        Wait = Window.seconds_until_open()
+        while Wait > 0:
+            logging.debug("RidThrottle:: Rid " + self.Rid + " outside window " + Window.Spec + ", pausing " + str(Wait) + "s")
+            time.sleep(min(Wait, 600))
+            self.Paused += min(Wait, 600)
+            Wait = Window.seconds_until_open()
+
+    def _wait_idle(self):
+
+        if self.Monitor is None:
+            return
+
+        if time.monotonic() - self._checked < self.Budget.Check_Interval:
+            return
+
+        Backoff = self.Budget.Check_Interval
+
+        # Since the last check the disk mostly did our own e4defrag runs,
+        # which would push it over the threshold on their own.  wait() is
+        # called between them, so a fresh sample only sees everybody else.
+        self.Monitor.reset()
+
+        while True:
+            Busy = self.Monitor.busy(self.Budget.Sample_Interval)
+            if Busy is None or Busy <= self.Budget.Busy_Threshold:
+                break
+
+            logging.debug("RidThrottle:: Rid " + self.Rid + " disk " + self.Monitor.Disk + " " + str(int(Busy)) +
+                          "% busy, backing off " + str(int(Backoff)) + "s")
+            time.sleep(Backoff)
+            self.Paused += Backoff
+            Backoff = min(Backoff * 2, self.Budget.Max_Backoff)
+
+        self._checked = time.monotonic()
+
+    def wait(self, Bytes=0):
+        """
+        Block until this RID may do Bytes of I/O: inside the time window, with
+        its disk under the busy threshold, and within both byte budgets.
+        """
+
+        self._wait_window()
+        self._wait_idle()
+
+        if Bytes:
+            self.Paused += self.Bucket.consume(Bytes)
+            self.Paused += self.Budget.Global.consume(Bytes)
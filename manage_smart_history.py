@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+"""
+Record, compact and query the SMART attribute history of the drives in this
+depot (see smarthist.py).
+
+    manage_smart_history.py record                      # Sample every drive, once an hour from cron
+    manage_smart_history.py compact                     # Downsample/expire old samples, once a day
+    manage_smart_history.py query 5 --since 30d         # 5 Reallocated_Sector_Ct on every drive, last 30 days
+    manage_smart_history.py csv --since 1h              # Everything from the last hour, in the old CSV format
+"""
+
+import os
+import re
+import sys
+import time
+import socket
+import logging
+import argparse
+
+from quarantine import Probe_Devices
+from ridindex import Get_Rid_Index
+from smartjson import Smart_Record, Attribute_Table
+from smarthist import SmartHistory, HISTORY_DIR, HOURLY_DAYS, RETENTION_DAYS
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s %(message)s')
+
+def Parse_Since(Text):
+
+	"""
+	Turn "1h", "30d", "2w", an epoch or "YYYY-MM-DD[ HH:MM[:SS]]" into epoch seconds.
+	"""
+
+	if Text is None:
+		return None
+
+	m = re.match("^([0-9]+)([smhdw])$", Text)
+	if m:
+		Scale = { "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400 }
+		return int(time.time()) - int(m.group(1)) * Scale[m.group(2)]
+
+	if re.match("^[0-9]{9,}$", Text):
+		return int(Text)
+
+	for Format in [ "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d" ]:
+		try:
+			return int(time.mktime(time.strptime(Text, Format)))
+		except ValueError:
+			pass
+
+	raise argparse.ArgumentTypeError("Can't parse time " + Text)
+
+
+def List_Drives():
+
+	Devs = []
+	for line in sorted(os.listdir("/sys/block")):
+
+		# Skip various non-block devices
+		if re.search("^loop|^ram|^dm|^zram|^md|^zd|^sr", line):
+			continue
+
+		Devs.append("/dev/" + line)
+
+	return Devs
+
+
+def Rid_Label(Dev, Dev_To_Rid):
+
+	if Dev in Dev_To_Rid:
+		return str(Dev_To_Rid[Dev])
+
+	# See if it's the OS SSD
+	try:
+		with open("/sys/block/" + Dev.split("/")[-1] + "/queue/rotational") as f:
+			if f.read().strip() == "0":
+				return "OS_SSD"
+	except OSError:
+		pass
+
+	return "NORID"
+
+
+def Record_All(History, Workers, Timeout):
+
+	Devs = List_Drives()
+	Dev_To_Rid = dict(Get_Rid_Index().disk_to_rid)
+	Host = socket.gethostname()
+	Now = int(time.time())
+
+	# One "smartctl -x --json" per drive, all at once.  Drives that hang are
+	# quarantined and left out of this sample (and the next few)
+	Records, Unavailable = Probe_Devices(Devs, lambda Dev: Smart_Record(Dev, timeout = Timeout), Workers = Workers, Deadline = Timeout, What = "smartctl")
+
+	Recorded = 0
+	for Dev in Devs:
+
+		if Dev in Unavailable:
+			logging.warning("manage_smart_history.py:: " + Dev + " " + Unavailable[Dev] + ", not sampled")
+			continue
+
+		Record = Records[Dev]
+
+		if isinstance(Record, Exception) or not Record.Ok:
+			logging.warning("manage_smart_history.py:: no SMART data from " + Dev)
+			continue
+
+		if History.record(Record, Attribute_Table(Record), Rid = Rid_Label(Dev, Dev_To_Rid), Host = Host, Now = Now):
+			Recorded += 1
+
+	return Recorded
+
+
+def Print_CSV(History, Attr, Since, Until):
+
+	"""
+	Print samples in the format log_smart_attributes.sh has always produced:
+	"<date>,<host>,<rid>,<id>_<name>:<value>:<worst>:<thresh>:<raw>"
+	"""
+
+	Rows = []
+
+	for Drive in History.drives():
+
+		Info = History.info(Drive)
+		Names = Info.get("attributes", {})
+		Thresholds = Info.get("thresholds", {})
+
+		Ids = [ Attr ] if Attr is not None else sorted(Names, key = int)
+
+		for Id in Ids:
+
+			Data = History.series(Drive, Id, Since, Until)
+			if not len(Data.Times):
+				continue
+
+			Id = str(History.resolve(Drive, Id))
+			Label = Id + "_" + Names.get(Id, "Unknown_Attribute")
+
+			for Ts, Value, Worst, Raw in zip(*Data):
+				Date = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(Ts))
+				Rows.append((Ts, Date + "," + str(Info.get("host")) + "," + str(Info.get("rid")) + "," + Label + ":" +
+					"%03d" % Value + ":" + "%03d" % Worst + ":" + "%03d" % int(Thresholds.get(Id, 0)) + ":" + str(Raw)))
+
+	for Row in sorted(Rows, key = lambda r: r[0]):
+		print(Row[1])
+
+
+parser = argparse.ArgumentParser(description = ' - Record and query the SMART attribute history of this depot')
+parser.add_argument('--root', metavar = '<dir>', default = HISTORY_DIR, help = 'Where the history is kept (default: ' + HISTORY_DIR + ')')
+
+sub = parser.add_subparsers(dest = 'command')
+
+p = sub.add_parser('record', help = 'Sample every drive now')
+p.add_argument('--workers', metavar = '<n>', type = int, default = 16, help = 'How many drives to query at once (default: 16)')
+p.add_argument('--timeout', metavar = '<seconds>', type = float, default = 60, help = 'Give up on a drive after this long (default: 60)')
+
+p = sub.add_parser('compact', help = 'Downsample and expire old samples')
+p.add_argument('--hourly-days', metavar = '<days>', type = int, default = HOURLY_DAYS, help = 'Keep hourly samples this long (default: ' + str(HOURLY_DAYS) + ')')
+p.add_argument('--retention-days', metavar = '<days>', type = int, default = RETENTION_DAYS, help = 'Keep daily samples this long (default: ' + str(RETENTION_DAYS) + ')')
+
+p = sub.add_parser('query', help = 'Print one attribute for every drive')
+p.add_argument('attr', metavar = 'attr', help = 'Smart ID# or Attribute Name')
+p.add_argument('--since', metavar = '<time>', type = Parse_Since, default = None, help = 'e.g. 24h, 30d or 2024-01-01')
+p.add_argument('--until', metavar = '<time>', type = Parse_Since, default = None)
+
+p = sub.add_parser('csv', help = 'Print samples in the old log_smart_attributes.sh CSV format')
+p.add_argument('--attr', metavar = '<attr>', default = None, help = 'Only this Smart ID# or Attribute Name')
+p.add_argument('--since', metavar = '<time>', type = Parse_Since, default = None, help = 'e.g. 1h, 30d or 2024-01-01')
+p.add_argument('--until', metavar = '<time>', type = Parse_Since, default = None)
+
+args = parser.parse_args()
+
+History = SmartHistory(args.root)
+
+if args.command == 'record':
+	Recorded = Record_All(History, args.workers, args.timeout)
+	logging.debug("manage_smart_history.py:: recorded " + str(Recorded) + " drives")
+
+elif args.command == 'compact':
+	for Drive in History.drives():
+		History.compact(Drive, Hourly_Days = args.hourly_days, Retention_Days = args.retention_days)
+
+elif args.command == 'query':
+
+	Results = History.query(args.attr, args.since, args.until)
+
+	print('{:20s} {:10s} {:8s} {:20s} {:>8s} {:>20s} {:>20s}'.format("Drive", "Rid", "Samples", "Last sample", "Value", "First raw", "Last raw"))
+	for Drive, Data in sorted(Results.items()):
+		Info = History.info(Drive)
+		print('{:20s} {:10s} {:8d} {:20s} {:8d} {:20d} {:20d}'.format(Drive, str(Info.get("rid")), len(Data.Times),
+			time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(Data.Times[-1])), Data.Values[-1], Data.Raws[0], Data.Raws[-1]))
+
+elif args.command == 'csv':
+	Print_CSV(History, args.attr, args.since, args.until)
+
+else:
+	parser.print_help()
+	sys.exit(1)
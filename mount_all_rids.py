@@ -11,7 +11,6 @@ import stat
 import logging
 import tempfile
 import time
-import multiprocessing
 
 from ridlib import *
 
@@ -34,15 +33,16 @@ def Help_RID_Mount_all():
 	print("")
 	sys.exit(0)
 
-# Get a list of available rids
-Rids = Generate_Rid_Dict()
+# How many rids to mount at once, in total and per controller/SCSI host/enclosure.
+# Mounting is cheap, so these are generous.
+Workers = 16
+Limits = { "controller": 16, "host": 16, "enclosure": 8 }
+
+# Get a list of available rids that aren't mounted yet
+Rids = [ Rid for Rid in Generate_Rid_Dict() if not os.path.isdir(depot_dir + "/rid-" + Rid) ]
 
 logging.debug("Rids = " + str(Rids))
 
 if __name__ == '__main__':
-	jobs = []
-	for This_Rid in Rids:
-		logging.debug("Spawning mount process on RID " + This_Rid)
-		p = multiprocessing.Process(target = RID_Mount, args=(This_Rid,))
-		jobs.append(p)
-		p.start()
+	Results = RID_Run_All(RID_Mount, Rids, Workers = Workers, Limits = Limits)
+	sys.exit(Print_RID_Results(Results))
@@ -30,4 +30,4 @@ for i in sys.argv:
 if len(sys.argv) < 2:
 	Help_RID_Mount()
 
-RID_Mount(sys.argv[1])
+RID_Command(RID_Mount, sys.argv[1])
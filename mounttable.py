@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+"""
+mounttable - An indexed, change-aware view of /proc/self/mounts.
+
+The ridlib mount helpers used to open and split /proc/mounts on every single
+question ("is this device mounted?", "is this directory a mount point?"), and
+mount_all_rids/umount_all_rids ask those questions dozens of times per RID.
+
+MountTable keeps /proc/self/mounts open and only re-reads it when the kernel
+says it changed: poll() on that file returns POLLPRI|POLLERR after any mount
+or umount in our namespace.  Between changes every lookup is a dict access.
+"""
+
+import os
+import re
+import select
+import threading
+
+PROC_MOUNTS = "/proc/self/mounts"
+
+
+def _unescape(field):
+    """
+    /proc/mounts escapes space, tab, newline and backslash as octal (\\040 etc).
+    """
+
+    if "\\" not in field:
+        return field
+    return re.sub(r"\\([0-7]{3})", lambda m: chr(int(m.group(1), 8)), field)
+
+
+class MountTable(object):
+    """
+    dev -> mount points and mount point -> dev lookups over /proc/self/mounts.
+    Safe to share between threads, and re-opens itself after a fork so parent
+    and child don't steal each other's change notifications.
+    """
+
+    def __init__(self, path=PROC_MOUNTS):
+
+        self.path = path
+
+        self._lock = threading.Lock()
+        self._fd = None
+        self._poller = None
+        self._pid = None
+        self._stale = True
+
+        self._entries = []       # [(dev, mountpoint, fstype), ...] in mount order
+        self._by_dev = {}        # dev -> [mountpoint, ...]
+        self._by_mpoint = {}     # mountpoint -> dev (the topmost mount wins)
+
+        self.reloads = 0
+
+    def _open(self):
+
+        self._close()
+
+        self._fd = os.open(self.path, os.O_RDONLY)
+        self._pid = os.getpid()
+        self._stale = True
+
+        if hasattr(select, "poll"):
+            self._poller = select.poll()
+            self._poller.register(self._fd, select.POLLPRI | select.POLLERR)
+
+    def _close(self):
+
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+
+        self._fd = None
+        self._poller = None
+
+    def _changed(self):
+        """
+        True if the mount table may have changed since we last read it.
+        """
+
+        if self._stale or self._poller is None:
+            return True
+
+        return bool(self._poller.poll(0))
+
+    def _read(self):
+
+        os.lseek(self._fd, 0, os.SEEK_SET)
+
+        chunks = []
+        while True:
+            chunk = os.read(self._fd, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+
+        return b"".join(chunks).decode("utf-8", errors="replace")
+
+    def _reload(self):
+
+        entries = []
+        by_dev = {}
+        by_mpoint = {}
+
+        for line in self._read().splitlines():
+
+            # <dev> <mountpoint> <fstype> <options> <dump> <pass>
+            fields = line.split()
+            if len(fields) < 3:
+                continue
+
+            dev = _unescape(fields[0])
+            mpoint = _unescape(fields[1])
+
+            entries.append((dev, mpoint, fields[2]))
+            by_dev.setdefault(dev, []).append(mpoint)
+            by_mpoint[mpoint] = dev
+
+        self._entries = entries
+        self._by_dev = by_dev
+        self._by_mpoint = by_mpoint
+        self._stale = False
+        self.reloads += 1
+
+    def refresh(self, force=False):
+        """
+        Re-read the mount table if it changed (or if force is set).
+        """
+
+        with self._lock:
+
+            if self._fd is None or self._pid != os.getpid():
+                self._open()
+
+            if force or self._changed():
+                self._reload()
+
+    def entries(self):
+        """
+        Return a list of (dev, mountpoint, fstype) tuples in mount order.
+        """
+
+        self.refresh()
+        return list(self._entries)
+
+    def mountpoints_of(self, dev):
+        self.refresh()
+        return list(self._by_dev.get(dev, []))
+
+    def mountpoint_of(self, dev):
+        """
+        Return the first mount point of dev, or None if it isn't mounted.
+        """
+
+        self.refresh()
+        mpoints = self._by_dev.get(dev)
+        if not mpoints:
+            return None
+        return mpoints[0]
+
+    def device_at(self, mpoint):
+        """
+        Return the device mounted on mpoint, or None if it isn't a mount point.
+        """
+
+        self.refresh()
+        return self._by_mpoint.get(os.path.abspath(mpoint))
+
+    def is_device_mounted(self, dev):
+        self.refresh()
+        return dev in self._by_dev
+
+    def is_mounted(self, mpoint):
+        self.refresh()
+        return os.path.abspath(mpoint) in self._by_mpoint
+
+
+# The table shared by everything that imports this module.
+Mount_Table = MountTable()
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+
+"""
+quarantine - Keep one hung device from stalling every monitoring run.
+
+A dying drive or expander can make smartctl, sg_ses or udevadm block in the
+kernel for tens of seconds, and a process stuck in D state can't even be
+killed, so a timeout on the command alone isn't enough: whoever waits for it
+is stuck too.  Probe() runs a query about a device on a daemon thread and
+stops waiting after a deadline.  A device that misses its deadline is written
+to a small quarantine file under /run with a cooldown, and until that expires
+every tool that probes it through this module skips it straight away and
+shows it as degraded instead of blocking on it again.
+
+The file is on tmpfs, so a reboot clears it.  Anyone who can't write it
+(a non-root lsblock, say) still honours it.
+"""
+
+import collections
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+
+QUARANTINE_FILE = "/run/depot-tools/quarantine.json"
+
+# How long a device stays quarantined after missing a deadline
+COOLDOWN = 15 * 60
+
+# How long a single probe of one device may take
+DEADLINE = 30
+
+# Why a device has no result from Probe_Devices()
+TIMED_OUT = "TIMEOUT"
+QUARANTINED = "QUARANTINED"
+
+
+def Device_Key(Dev):
+    """
+    The name a device is quarantined under: its canonical /dev path, so
+    "sda", "/dev/sda" and a /dev/disk/by-id link all agree.
+    """
+
+    Dev = str(Dev)
+    if not Dev.startswith("/"):
+        Dev = "/dev/" + Dev
+
+    return os.path.realpath(Dev)
+
+
+class Quarantine(object):
+    """
+    The set of quarantined devices, shared through QUARANTINE_FILE.  Entries
+    are { dev: {"since": epoch, "until": epoch, "reason": str} }.
+    """
+
+    def __init__(self, Path=QUARANTINE_FILE, Cooldown=COOLDOWN):
+
+        self.Path = Path
+        self.Cooldown = Cooldown
+
+        self._lock = threading.Lock()
+        self._entries = None
+        self._stamp = None
+
+    def _read(self):
+
+        try:
+            with open(self.Path) as f:
+                Entries = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        if not isinstance(Entries, dict):
+            return {}
+
+        Now = time.time()
+        return dict((Dev, Entry) for Dev, Entry in Entries.items() if Entry.get("until", 0) > Now)
+
+    def entries(self):
+        """
+        Return the devices quarantined right now.  The file is only re-read
+        when it has changed.
+        """
+
+        try:
+            Stamp = os.stat(self.Path).st_mtime_ns
+        except OSError:
+            Stamp = None
+
+        with self._lock:
+            if self._entries is None or Stamp != self._stamp:
+                self._entries = self._read()
+                self._stamp = Stamp
+
+            Now = time.time()
+            return dict((Dev, Entry) for Dev, Entry in self._entries.items() if Entry.get("until", 0) > Now)
+
+    def get(self, Dev):
+        """
+        Return the entry of Dev, or None if it isn't quarantined.
+        """
+
+        return self.entries().get(Device_Key(Dev))
+
+    def is_quarantined(self, Dev):
+        return self.get(Dev) is not None
+
+    def _modify(self, Change):
+
+        try:
+            os.makedirs(os.path.dirname(self.Path), exist_ok=True)
+
+            with open(self.Path + ".lock", "a") as Lock:
+                fcntl.flock(Lock, fcntl.LOCK_EX)
+
+                Entries = self._read()
+                Change(Entries)
+
+                Tmp = self.Path + "." + str(os.getpid()) + ".tmp"
+                with open(Tmp, "w") as f:
+                    json.dump(Entries, f, sort_keys=True)
+                os.rename(Tmp, self.Path)
+
+        except OSError as e:
+            logging.debug("Quarantine:: can't update " + self.Path + ": " + str(e))
+
+        with self._lock:
+            self._entries = None
+
+    def add(self, Dev, Reason):
+        """
+        Quarantine Dev for Cooldown seconds.
+        """
+
+        Dev = Device_Key(Dev)
+        Now = time.time()
+
+        logging.warning("Quarantine:: " + Dev + ": " + Reason + ", skipping it for " + str(int(self.Cooldown)) + "s")
+
+        def Change(Entries):
+            Entries[Dev] = {"since": int(Now), "until": int(Now + self.Cooldown), "reason": Reason}
+
+        self._modify(Change)
+
+    def release(self, Dev):
+        """
+        Take Dev out of quarantine (e.g. after it has been replaced).
+        """
+
+        Dev = Device_Key(Dev)
+        self._modify(lambda Entries: Entries.pop(Dev, None))
+
+
+_Default = None
+_Default_Lock = threading.Lock()
+
+
+def Default_Quarantine():
+    """
+    The Quarantine on QUARANTINE_FILE shared by everything in this process.
+    """
+
+    global _Default
+
+    with _Default_Lock:
+        if _Default is None:
+            _Default = Quarantine()
+        return _Default
+
+
+def _describe(Func):
+    return getattr(Func, "__name__", str(Func))
+
+
+def Probe(Dev, Func, *Args, Deadline=DEADLINE, Default=None, Registry=None, What=None, **Kwargs):
+    """
+    Return Func(*Args, **Kwargs), a query about Dev, if it finishes within
+    Deadline seconds.  If it doesn't, Dev is quarantined and Default is
+    returned; the query is left running on its daemon thread.  A Dev that
+    is already quarantined returns Default without running anything.
+    Exceptions from Func are raised in the caller.  What names the query in
+    the quarantine entry (default: Func's name).
+    """
+
+    Registry = Registry or Default_Quarantine()
+    What = What or _describe(Func)
+
+    if Registry.is_quarantined(Dev):
+        logging.debug("Probe:: " + str(Dev) + " is quarantined, skipping " + What)
+        return Default
+
+    Result = []
+
+    def Run():
+        try:
+            Result.append((True, Func(*Args, **Kwargs)))
+        except Exception as e:
+            Result.append((False, e))
+
+    t = threading.Thread(target=Run, daemon=True)
+    t.start()
+    t.join(Deadline)
+
+    if not Result:
+        Registry.add(Dev, What + " did not finish within " + str(Deadline) + "s")
+        return Default
+
+    Ok, Value = Result[0]
+    if not Ok:
+        raise Value
+
+    return Value
+
+
+ProbeResults = collections.namedtuple("ProbeResults", ["Results", "Unavailable"])
+
+
+def Probe_Devices(Devs, Func, Workers=16, Deadline=DEADLINE, Registry=None, What=None):
+    """
+    Run Func(Dev) for every device in Devs, at most Workers at once.  A
+    device that hasn't answered Deadline seconds after its probe started is
+    quarantined and its thread abandoned, so it doesn't hold a worker slot.
+
+    Returns ProbeResults(Results, Unavailable): Results maps Dev to what Func
+    returned (or the exception it raised), Unavailable maps Dev to TIMED_OUT
+    or QUARANTINED.
+    """
+
+    Registry = Registry or Default_Quarantine()
+
+    Results = {}
+    Unavailable = {}
+    Pending = collections.deque()
+    Running = {}            # Dev -> start time
+    Cond = threading.Condition()
+
+    for Dev in Devs:
+        if Registry.is_quarantined(Dev):
+            Unavailable[Dev] = QUARANTINED
+        else:
+            Pending.append(Dev)
+
+    def Worker(Dev):
+        try:
+            Result = Func(Dev)
+        except Exception as e:
+            logging.debug("Probe_Devices:: " + str(Dev) + ": " + str(e))
+            Result = e
+        with Cond:
+            if Dev not in Unavailable:
+                Results[Dev] = Result
+            Cond.notify_all()
+
+    with Cond:
+        while Pending or Running:
+
+            while Pending and len(Running) < max(1, Workers):
+                Dev = Pending.popleft()
+                Running[Dev] = time.time()
+                threading.Thread(target=Worker, args=(Dev,), daemon=True).start()
+
+            Now = time.time()
+            for Dev, Start in list(Running.items()):
+                if Dev in Results:
+                    del Running[Dev]
+                elif Now - Start >= Deadline:
+                    Unavailable[Dev] = TIMED_OUT
+                    del Running[Dev]
+
+            if Running and not (Pending and len(Running) < max(1, Workers)):
+                Cond.wait(max(0.0, min(Running.values()) + Deadline - time.time()))
+
+    for Dev, Why in Unavailable.items():
+        if Why == TIMED_OUT:
+            Registry.add(Dev, (What or _describe(Func)) + " did not finish within " + str(Deadline) + "s")
+
+    return ProbeResults(Results, Unavailable)
@@ -4,26 +4,20 @@ import os
 import re
 import sys
 import logging
+import argparse
 
 from ridlib import *
 
-def Help_Query_Drives_Smart_Attributes():
-	print("")
-	print(sys.argv[0] + " - Query a SMART attribute on all drives in the depot.")
-	print("")
-	print("USAGE:  " + sys.argv[0] + " [Smart ID# or Attribute Name]")
-	print("")
-	print("Example:  " + sys.argv[0] + " 5                # Will return 5 Reallocated_Sector_Ct")
-	print("          " + sys.argv[0] + " Start_Stop_Count # Will return 4 Start_Stop_Count")
-	print("")
-	sys.exit(1)
+parser = argparse.ArgumentParser(description = ' - Query a SMART attribute on all drives in the depot.',
+	epilog = 'Example:  ' + sys.argv[0] + ' 5 (returns 5 Reallocated_Sector_Ct), ' + sys.argv[0] + ' Start_Stop_Count (returns 4 Start_Stop_Count)')
 
-if len(sys.argv) != 2:
-	Help_Query_Drives_Smart_Attributes()
+parser.add_argument('query',     metavar = 'query', help = 'The Smart ID# or Attribute Name to query')
+parser.add_argument('--workers', metavar = '<n>', type = int, default = 16, help = 'How many drives to query at once (default: 16)')
+parser.add_argument('--timeout', metavar = '<seconds>', type = float, default = 30, help = 'Report a drive as TIMEOUT if it takes longer than this (default: 30)')
 
-Query = sys.argv[1]
+args = parser.parse_args()
 
-Output_Dict = Query_Drives_Smart_Attributes(Query)
+Output_Dict = Query_Drives_Smart_Attributes(args.query, Workers = args.workers, Deadline = args.timeout)
 
 if Output_Dict:
 	Print_Query_Drives_Smart_Attributes(Output_Dict)
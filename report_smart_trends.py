@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+"""
+Report drives whose SMART error counters are rising, accelerating or well
+above other drives of the same model, from the SMART history store (see
+smarthist.py and smarttrend.py).  The output uses the same pipe-delimited
+format as smart_failure_scanner.py.
+"""
+
+import re
+import sys
+import argparse
+
+try:
+	import smarttrend
+except ImportError as e:
+	print(sys.argv[0] + ": the SMART trend engine needs NumPy (" + str(e) + ").  Install python3-numpy or 'pip3 install numpy'.")
+	sys.exit(1)
+
+from ridlib import HumanFriendlyBytes
+from smarthist import SmartHistory, HISTORY_DIR
+
+def printFinding(Info, Str):
+
+	Vendor = Info.get("vendor") or ""
+	Model = Info.get("model") or ""
+	Serial = Info.get("serial") or ""
+
+	if Vendor == "SEAGATE":
+		Serial = Serial[0:8]
+
+	Ridstr = str(Info.get("rid") or "")
+	if not re.search("^[0-9]+$", Ridstr):
+		Ridstr = ""
+
+	Size = HumanFriendlyBytes(Info.get("capacity") or 0, 1000, 0)
+	Size = re.sub("\\.0", "", Size)
+	Size = re.sub(" ", "", Size)
+
+	print('{:20s}|{:4s}|{:15s}|{:7s}|{:2s}|{:22s}|{:4s}|{:30s}' . format(str(Info.get("host")), Ridstr, Serial, " ", " ", (Vendor + " " + Model).strip(), Size, Str))
+
+
+parser = argparse.ArgumentParser(description = ' - Report drives with worrying SMART trends')
+parser.add_argument('--root',   metavar = '<dir>', default = HISTORY_DIR, help = 'Where the history is kept (default: ' + HISTORY_DIR + ')')
+parser.add_argument('--window', metavar = '<days>', type = int, default = smarttrend.WINDOW_DAYS, help = 'Days of history to look at (default: ' + str(smarttrend.WINDOW_DAYS) + ')')
+parser.add_argument('--recent', metavar = '<days>', type = int, default = smarttrend.RECENT_DAYS, help = 'Days that count as recent (default: ' + str(smarttrend.RECENT_DAYS) + ')')
+
+args = parser.parse_args()
+
+History = SmartHistory(args.root)
+
+for f in smarttrend.Analyze(History, Window_Days = args.window, Recent_Days = args.recent):
+	printFinding(History.info(f.Drive), f.Message)
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+
+"""
+ridindex - One shared index of the RIDs on this depot.
+
+RID_Create labels partition 1 of a drive "rid-md-<RID>" and partition 2
+"rid-data-<RID>", so /dev/disk/by-label is the authoritative list of RIDs.
+Instead of every caller listing and realpath()ing that directory on its own,
+RidIndex walks it once and maps in every direction:
+
+    RID <-> whole disk <-> md/data partitions <-> WWN
+
+The index is shared by everything in the process.  It's rebuilt only when the
+mtime of /dev/disk/by-label (or /dev/disk/by-id, for the WWNs) changes, which
+udev bumps whenever a label appears or disappears.
+"""
+
+import os
+import re
+import threading
+
+BY_LABEL_DIR = "/dev/disk/by-label"
+BY_ID_DIR = "/dev/disk/by-id"
+
+
+def _dir_mtime(path):
+
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _link_target(path):
+    """
+    Resolve a /dev/disk/by-* symlink.  These are always a single relative hop
+    ("../../sdb2"), so a readlink is enough and saves a realpath per entry.
+    """
+
+    try:
+        target = os.readlink(path)
+    except OSError:
+        return os.path.realpath(path)
+
+    return os.path.normpath(os.path.join(os.path.dirname(path), target))
+
+
+def _whole_disk(dev):
+    """
+    Return the whole disk a partition lives on (/dev/sdb2 -> /dev/sdb,
+    /dev/nvme0n1p2 -> /dev/nvme0n1).
+    """
+
+    sysfs = "/sys/class/block/" + os.path.basename(dev)
+
+    if os.path.exists(sysfs + "/partition"):
+        return "/dev/" + os.path.basename(os.path.dirname(os.path.realpath(sysfs)))
+
+    if os.path.exists(sysfs):
+        return dev
+
+    return re.sub("[0-9]*$", "", dev)
+
+
+class RidIndex(object):
+    """
+    A snapshot of which RID lives on which device.  Build it with Get_Rid_Index()
+    rather than directly so it is shared.
+    """
+
+    def __init__(self):
+
+        # Take the stamp before scanning, so a change made while we scan
+        # leaves this index already stale.
+        self.stamp = RidIndex.current_stamp()
+
+        self.rid_to_disk = {}     # RID -> /dev/sdb
+        self.rid_to_data = {}     # RID -> /dev/sdb2
+        self.rid_to_md = {}       # RID -> /dev/sdb1
+        self.disk_to_rid = {}     # /dev/sdb -> RID
+        self.part_to_rid = {}     # /dev/sdb1, /dev/sdb2 -> RID
+        self.wwn_to_disk = {}     # 5000c500a1b2c3d4 -> /dev/sdb (every drive, not just RIDs)
+        self.disk_to_wwn = {}     # /dev/sdb -> 5000c500a1b2c3d4
+        self.rid_to_wwn = {}      # RID -> 5000c500a1b2c3d4
+        self.wwn_to_rid = {}      # 5000c500a1b2c3d4 -> RID
+
+        self._scan_labels()
+        self._scan_wwns()
+
+    @staticmethod
+    def current_stamp():
+        return (_dir_mtime(BY_LABEL_DIR), _dir_mtime(BY_ID_DIR))
+
+    def _scan_labels(self):
+
+        try:
+            entries = list(os.scandir(BY_LABEL_DIR))
+        except OSError:
+            return
+
+        for entry in entries:
+
+            if entry.name.startswith("rid-data-"):
+                kind = "data"
+            elif entry.name.startswith("rid-md-"):
+                kind = "md"
+            else:
+                continue
+
+            rid = entry.name.split("-")[2]
+            part = _link_target(entry.path)
+            disk = _whole_disk(part)
+
+            self.part_to_rid[part] = rid
+
+            if kind == "md":
+                self.rid_to_md[rid] = part
+                continue
+
+            self.rid_to_data[rid] = part
+            self.rid_to_disk[rid] = disk
+            self.disk_to_rid[disk] = rid
+
+    def _scan_wwns(self):
+
+        try:
+            entries = list(os.scandir(BY_ID_DIR))
+        except OSError:
+            return
+
+        for entry in entries:
+
+            if not entry.name.startswith("wwn-0x") or "-part" in entry.name:
+                continue
+
+            wwn = entry.name[len("wwn-0x"):].lower()
+            disk = _link_target(entry.path)
+
+            self.wwn_to_disk[wwn] = disk
+            self.disk_to_wwn[disk] = wwn
+
+            rid = self.disk_to_rid.get(disk)
+            if rid is not None:
+                self.rid_to_wwn[rid] = wwn
+                self.wwn_to_rid[wwn] = rid
+
+    def is_stale(self):
+        return self.stamp != RidIndex.current_stamp()
+
+    def rids(self):
+        """
+        Return a sorted list of every RID on this depot.
+        """
+
+        return sorted(self.rid_to_disk)
+
+    def disk(self, rid):
+        return self.rid_to_disk.get(str(rid))
+
+    def data_partition(self, rid):
+        return self.rid_to_data.get(str(rid))
+
+    def md_partition(self, rid):
+        """
+        Return the metadata partition of a RID.  Old-style RIDs don't always
+        have an md label, so fall back to partition 1 of the disk.
+        """
+
+        rid = str(rid)
+        if rid in self.rid_to_md:
+            return self.rid_to_md[rid]
+        if rid in self.rid_to_disk:
+            return self.rid_to_disk[rid] + "1"
+        return None
+
+    def rid_of(self, dev):
+        """
+        Return the RID on a whole disk or one of its partitions, or None.
+        """
+
+        if dev in self.disk_to_rid:
+            return self.disk_to_rid[dev]
+        if dev in self.part_to_rid:
+            return self.part_to_rid[dev]
+
+        dev = os.path.realpath(dev)
+        return self.disk_to_rid.get(dev, self.part_to_rid.get(dev))
+
+
+_Index_Lock = threading.Lock()
+_Index = None
+
+
+def Get_Rid_Index(refresh=False):
+    """
+    Return the shared RidIndex, rebuilding it first if /dev/disk/by-label has
+    changed since it was built (or if refresh is set).
+    """
+
+    global _Index
+
+    with _Index_Lock:
+        if refresh or _Index is None or _Index.is_stale():
+            _Index = RidIndex()
+        return _Index
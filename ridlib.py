@@ -23,92 +23,205 @@ import collections
 import configparser
 import multiprocessing
 import shlex
+import functools
+import threading
 
 from pathlib import Path
 from subprocess import Popen, PIPE, STDOUT, call, check_output
 from time import gmtime, strftime, sleep
 from typing import Union
 
+from extentindex import ExtentIndex, Write_Report, INDEX_DIR
+from fiemap import Count_Extents, Scan_Extents, Scan_Roots
+from mounttable import MountTable, Mount_Table
+from quarantine import Probe, Probe_Devices, Quarantine, Default_Quarantine, TIMED_OUT, QUARANTINED
+from ridindex import RidIndex, Get_Rid_Index
+from ridsched import TopologyScheduler, Device_Topology
+from smartjson import Smart_Record, Attribute_Table, SELF_TEST_IN_PROGRESS
+from superblock import Read_Superblock, Fsck_Reason, Describe_Clean
+from sysexec import SysExec, SysExecUncached
+
 depot_dir = "/depot"  # This was originally shared via the depot_common file.
 
-CacheDataArray = {}
-CacheTimeArray = {}
+###################################################################################
+# RID operations raise a RidError when they fail rather than calling sys.exit(),
+# so they can be run in-process (and in parallel) by the bulk tools.  Each error
+# carries the exit code the command line wrappers have always exited with; use
+# RID_Command() in a wrapper to turn an error back into that exit code.
+###################################################################################
 
-def SysExec(cmd):
+class RidError(Exception):
     """
-    Run the given command and return the output
+    Base class for every failed RID operation.
     """
 
-    # Cache the output of the command for 20 seconds
-    Cache_Expires = 20
+    exit_code = 1
+
+    def __init__(self, Rid, Message, exit_code=None):
+        super().__init__(Message)
+        self.Rid = Rid
+        if exit_code is not None:
+            self.exit_code = exit_code
 
-    # Computed once, used twice
-    Cache_Keys = list(CacheDataArray.keys())
-    if cmd in Cache_Keys:
-        Cache_Age = time.time() - CacheTimeArray[cmd]
-    else:
-        Cache_Age = 0
 
-    Return_Val = "ERROR"
+class RidNotFound(RidError):
+    """
+    The RID isn't on this depot.
+    """
 
-    # If we have valid data cached, return it
-    if cmd in Cache_Keys and Cache_Age < Cache_Expires:
-        Return_Val = CacheDataArray[cmd]
 
-    # If the cmd is "cat", use fopen/fread/fclose to open it and
-    # cache it as we go
-    elif not cmd in Cache_Keys and cmd.split()[0] == "cat":
-        try:
-            f = open(cmd.split()[1], "r")
-            CacheDataArray[cmd] = f.read()
-            CacheTimeArray[cmd] = time.time()
-            f.close()
-            Return_Val = CacheDataArray[cmd]
-        except IOError:
-            print("ERROR:  File " + cmd.split()[1] + " not accessible")
-            sys.exit(2)
+class RidAlreadyMounted(RidError):
+    """
+    The RID is already mounted under depot_dir.
+    """
+
+    exit_code = 2
+
+
+class RidNotMounted(RidError):
+    """
+    The RID needs to be mounted for this operation and isn't.
+    """
+
+
+class RidBusy(RidError):
+    """
+    Files on the RID are in use according to lsof.
+    """
+
+
+class RidSequestered(RidError):
+    """
+    The RID is sequestered and must not be mounted.
+    """
+
+
+class RidMetadataError(RidError):
+    """
+    The RID's metadata (rid.settings, rid.info, import state) is missing or bad.
+    """
+
+
+class RidMountError(RidError):
+    """
+    Mounting or umounting one of the RID's partitions failed.
+    """
+
+    exit_code = 3
+
+
+class RidCommandError(RidError):
+    """
+    An external command (fsck, mkfs.resource, ...) failed.
+    """
+
+
+# The outcome of one operation on one RID, as returned by RID_Run/RID_Run_All
+RidResult = collections.namedtuple("RidResult", ["Rid", "Operation", "Ok", "Message", "Exit_Code", "Elapsed"])
+
+
+def RID_Command(Operation, *args, **kwargs):
+    """
+    Run a RID operation on behalf of a command line wrapper.  Returns whatever
+    the operation returns, or logs the error and exits with its exit code.
+    """
+
+    try:
+        return Operation(*args, **kwargs)
+    except RidError as e:
+        logging.error(str(e))
+        sys.exit(e.exit_code)
+
 
-    # If we don't have cached data, or it's too old, regenerate it
-    elif not cmd in Cache_Keys or Cache_Age > Cache_Expires:
-        CacheDataArray[cmd] = Popen(cmd.split(), stdout=PIPE, stderr=STDOUT).communicate()[0]
-        CacheTimeArray[cmd] = time.time()
-        Return_Val = CacheDataArray[cmd]
+def RID_Run(Operation, Rid, *args, **kwargs):
+    """
+    Run Operation(Rid, *args, **kwargs) and return a RidResult instead of raising.
+    """
+
+    Start = time.time()
+
+    try:
+        Message = Operation(Rid, *args, **kwargs)
+        Ok = True
+        Exit_Code = 0
+    except RidError as e:
+        logging.error(str(e))
+        Message = str(e)
+        Ok = False
+        Exit_Code = e.exit_code
+    except Exception as e:
+        logging.exception(Operation.__name__ + ":: Unexpected error on Rid " + str(Rid))
+        Message = type(e).__name__ + ": " + str(e)
+        Ok = False
+        Exit_Code = 1
+
+    if Message is None:
+        Message = ""
+
+    return RidResult(str(Rid), Operation.__name__, Ok, str(Message).strip(), Exit_Code, time.time() - Start)
+
+
+def RID_Run_All(Operation, Rids, *args, Workers=8, Limits=None, **kwargs):
+    """
+    Run Operation on every RID in Rids on at most Workers threads, and at most
+    Limits[group] at a time on any one controller, SCSI host or enclosure (see
+    ridsched.DEFAULT_LIMITS).  Returns a list of RidResults in the same order as Rids.
+    """
+
+    Rids = list(Rids)
+    if not Rids:
+        return []
+
+    Index = Get_Rid_Index()
 
-    if isinstance(Return_Val, bytes):
-        Return_Val = Return_Val.decode("utf-8")
+    Jobs = []
+    for Rid in Rids:
+        Dev = Index.disk(Rid)
+        Groups = Device_Topology(Dev) if Dev else []
+        logging.debug("RID_Run_All:: Rid " + str(Rid) + " on " + str(Dev) + " groups = " + str(Groups))
+        Jobs.append((Groups, functools.partial(RID_Run, Operation, Rid, *args, **kwargs)))
 
-    return Return_Val
+    Scheduler = TopologyScheduler(Max_Workers=Workers, Limits=Limits)
 
+    logging.debug("RID_Run_All:: Running " + Operation.__name__ + " on " + str(len(Rids)) + " rids with " + str(Scheduler.Max_Workers) + " workers and limits " + str(Scheduler.Limits))
 
-def SysExecUncached(cmd):
+    return Scheduler.run(Jobs)
+
+
+def Print_RID_Results(Results):
     """
-    Run the given command and return the output.  This command will *not* cache the output
-    of commands it has run recently.   You should use SysExec whenever possible as it is
-    faster.
+    Print a per-RID summary of RID_Run_All results and return the exit code for
+    the whole run (0 if every RID succeeded, otherwise the largest exit code).
     """
 
-    output = Popen(cmd.split(), stdout=PIPE, stderr=STDOUT).communicate()[0]
+    Exit_Code = 0
 
-    if isinstance(output, bytes):
-        output = output.decode("utf-8")
+    print("")
+    print('{:8s} {:20s} {:6s} {:>9s}  {}'.format("Rid", "Operation", "Status", "Time", "Message"))
+    for r in Results:
+        Status = "OK" if r.Ok else "FAILED"
+        print('{:8s} {:20s} {:6s} {:>8.1f}s  {}'.format(r.Rid, r.Operation, Status, r.Elapsed, r.Message.splitlines()[-1] if r.Message else ""))
+        Exit_Code = max(Exit_Code, r.Exit_Code)
 
-    return output
+    Failed = len([r for r in Results if not r.Ok])
+    print("")
+    print(str(len(Results) - Failed) + " succeeded, " + str(Failed) + " failed")
 
+    return Exit_Code
 
 ###################################################################################
 
 def _read_proc_mounts():
     """Return a list of (dev, mp) tuples from /proc/mounts."""
-    with open("/proc/mounts", "r", encoding="utf-8") as f:
-        return [(line.split()[0], line.split()[1]) for line in f if line.strip()]
+    return [(dev, mp) for dev, mp, _ in Mount_Table.entries()]
 
 def _is_device_mounted(dev):
     """True if *dev* appears as the first field in /proc/mounts."""
-    return any(dev == d for d, _ in _read_proc_mounts())
+    return Mount_Table.is_device_mounted(dev)
 
 def _is_mpoint_mounted(mpoint):
     """True if *mpoint* appears as the second field in /proc/mounts."""
-    return any(mpoint == mp for _, mp in _read_proc_mounts())
+    return Mount_Table.is_mounted(mpoint)
 
 def _run_cmd(cmd_list, **kwargs):
     """
@@ -227,13 +340,9 @@ def mount_unix(device: str,
     # 4️⃣ double‑check that the *expected* device really appears at the mount point
     # -----------------------------------------------------------------
     for _ in range(6):
-        if _is_mpoint_mounted(str(mp_dir)):
-            with open("/proc/mounts") as f:
-                for line in f:
-                    dev, mp = line.split()[:2]
-                    if mp == str(mp_dir) and dev == dev_path:
-                        logging.debug("mount_unix: %s successfully mounted on %s", dev_path, mp_path)
-                        return 0
+        if Mount_Table.device_at(str(mp_dir)) == dev_path:
+            logging.debug("mount_unix: %s successfully mounted on %s", dev_path, mp_path)
+            return 0
         sleep(0.2)
 
     logging.error("mount_unix: %s not present in /proc/mounts after mount", mp_path)
@@ -388,54 +497,27 @@ def find_tcmalloc():
 ###################################################################################
 
 def Generate_Rid_Dict():
+    """
+    Return a list of every RID on this depot.
+    """
 
-    Rid_Dict = []
-
-    for line in os.listdir("/dev/disk/by-label"):
-
-        if not re.search("rid-data", line):
-            continue
-
-        Rid_Dict.append(line.split("-")[2])
-
-    return Rid_Dict
+    return Get_Rid_Index().rids()
 
 
 def Generate_Rid_to_Dev_Dict():
+    """
+    Return a dict mapping RID -> whole disk (/dev/sdX).
+    """
 
-    Dict_Rid_to_Dev = {}
-
-    if os.path.isdir("/dev/disk/by-label"):
-
-        for line in os.listdir("/dev/disk/by-label"):
-            if not re.search("rid-data", line):
-                continue
-
-            rid = line.split("-")[2]
-            dev = os.path.realpath("/dev/disk/by-label/" + line)
-            dev = re.sub("[0-9]*$", "", dev)
-
-            Dict_Rid_to_Dev[rid] = dev
-
-    return Dict_Rid_to_Dev
+    return dict(Get_Rid_Index().rid_to_disk)
 
 
 def Generate_Dev_to_Rid_Dict():
+    """
+    Return a dict mapping whole disk (/dev/sdX) -> RID.
+    """
 
-    Dict_Dev_to_Rid = {}
-
-    for line in os.listdir("/dev/disk/by-label"):
-
-        if not re.search("rid-data", line):
-            continue
-
-        rid = line.split("-")[2]
-        dev = os.path.realpath("/dev/disk/by-label/" + line)
-        dev = re.sub("[0-9]*$", "", dev)
-
-        Dict_Dev_to_Rid[dev] = rid
-
-    return Dict_Dev_to_Rid
+    return dict(Get_Rid_Index().disk_to_rid)
 
 
 def is_rid_visible_to_os(rid):
@@ -472,14 +554,7 @@ def is_path_mounted(path):
     """
     Return True if *path* appears as a mount point in /proc/mounts.
     """
-    path = os.path.abspath(path)
-    with open("/proc/mounts") as f:
-        for line in f:
-            # /proc/mounts format: <dev> <mountpoint> <fs> <options> <dump> <pass>
-            parts = line.split()
-            if len(parts) >= 2 and os.path.abspath(parts[1]) == path:
-                return True
-    return False
+    return Mount_Table.is_mounted(path)
 
 
 def is_rid_mounted(rid):
@@ -662,8 +737,9 @@ def LocateMetadata(Rid):
     else:
 
         logging.debug("LocateMetadata::  Old style (metadata on data disk)")
-        Dict_Rid_To_Dev = Generate_Rid_to_Dev_Dict()
-        Metadata_Path = "BLOCKDEV:" + Dict_Rid_To_Dev[Rid]
+        Dev = Get_Rid_Index().disk(Rid)
+        if Dev is not None:
+            Metadata_Path = "BLOCKDEV:" + Dev
 
     logging.debug("LocateMetadata::  Metadata_Path = " + Metadata_Path)
 
@@ -828,23 +904,20 @@ def RID_Mount(Rid):
     rname = depot_dir + "/rid-" + Rid
 
     if os.path.isdir(rname):
-        logging.error("RID_Mount:: Looks like resource " + Rid + " is already mounted (" + rname + ")!")
-        sys.exit(2)
+        raise RidAlreadyMounted(Rid, "RID_Mount:: Looks like resource " + Rid + " is already mounted (" + rname + ")!")
 
-    Dict_Rid_to_Dev = Generate_Rid_to_Dev_Dict()
+    Index = Get_Rid_Index()
 
-    if Rid not in Dict_Rid_to_Dev:
-        logging.error("RID_Mount:: Rid " + Rid + " does not appear to be a valid rid.  Exiting.")
-        sys.exit(1)
+    if Index.disk(Rid) is None:
+        raise RidNotFound(Rid, "RID_Mount:: Rid " + Rid + " does not appear to be a valid rid.  Exiting.")
 
     Sequester_status = RID_Check_Sequester(Rid)
-    if RID_Check_Sequester(Rid).split()[0] == "SEQUESTERED":
-        logging.error("RID_Mount:: Rid " + Rid + " is sequestered and will not be mounted.  Exiting.")
-        sys.exit(1)
+    if Sequester_status.split()[0] == "SEQUESTERED":
+        raise RidSequestered(Rid, "RID_Mount:: Rid " + Rid + " is sequestered and will not be mounted.  Exiting.")
 
-    Dev = Dict_Rid_to_Dev[Rid]
-    md_dev = Dev + "1"
-    data_dev = Dev + "2"
+    Dev = Index.disk(Rid)
+    md_dev = Index.md_partition(Rid)
+    data_dev = Index.data_partition(Rid)
 
     logging.debug("RID_Mount:: md_dev = " + md_dev + " and data_dev = " + data_dev)
 
@@ -852,7 +925,7 @@ def RID_Mount(Rid):
     temp_dir = tempfile.mkdtemp()
     logging.debug("RID_Mount:: temp_dir = " + temp_dir)
     logging.debug("RID_Mount:: mounting " + md_dev + " at mountpoint " + temp_dir)
-    SysExec("mount " + md_dev + " " + temp_dir)
+    SysExecUncached("mount " + md_dev + " " + temp_dir)
 
     # See if rid.settings exists with the "rid-" defined
     # If not, consider rid.settings to be missing and die.
@@ -860,7 +933,7 @@ def RID_Mount(Rid):
 
     rid_line_found = False
     if os.path.isfile(ridsettings_file):
-        for line in SysExec("cat " + ridsettings_file).splitlines():
+        for line in SysExecUncached("cat " + ridsettings_file).splitlines():
             if re.search("^rid", line):
                 rid_line_found = True
                 break
@@ -868,10 +941,9 @@ def RID_Mount(Rid):
     logging.debug("RID_Mount:: rid_line_found = " + str(rid_line_found))
 
     if not os.path.isfile(ridsettings_file) or not rid_line_found:
-        logging.error("RID_Mount:: Missing rid.settings!")
         umount_unix(temp_dir)
         os.rmdir(temp_dir)
-        sys.exit(1)
+        raise RidMetadataError(Rid, "RID_Mount:: Missing rid.settings!")
 
     # Get the import info from the file
     import_state = ""
@@ -881,7 +953,7 @@ def RID_Mount(Rid):
         logging.debug("RID_Mount:: import_file = " + import_file)
 
         if os.path.isfile(import_file):
-            import_state = SysExec("cat " + import_file).strip()
+            import_state = SysExecUncached("cat " + import_file).strip()
 
     umount_unix(temp_dir)
     os.rmdir(temp_dir)
@@ -914,13 +986,13 @@ def RID_Mount(Rid):
             logging.debug("RID_Mount: mounting metadata %s → %s", md_dev, rname + "/md")
             rc = mount_unix(md_dev, rname + "/md", mount_opts)
             if rc:
-                sys.exit(3)
+                raise RidMountError(Rid, "RID_Mount:: Failed mounting " + md_dev + " on " + rname + "/md")
 
         if not is_path_mounted(rname + "/data"):
             logging.debug("RID_Mount: mounting data %s → %s", data_dev, rname + "/data")
             rc = mount_unix(data_dev, rname + "/data", mount_opts)
             if rc:
-                sys.exit(3)
+                raise RidMountError(Rid, "RID_Mount:: Failed mounting " + data_dev + " on " + rname + "/data")
 
         is_metadata = os.path.ismount(rname + "/md")
         is_data = os.path.ismount(rname + "/data")
@@ -932,7 +1004,7 @@ def RID_Mount(Rid):
             umount_unix(rname + "/data")
             os.rmdir(rname + "/md")
             os.rmdir(rname + "/data")
-            sys.exit(3)
+            raise RidMountError(Rid, "RID_Mount:: Failed mounting partitions of Rid " + Rid)
 
     else:
 
@@ -947,7 +1019,7 @@ def RID_Mount(Rid):
             umount_unix(rname + "/data")
             os.rmdir(rname + "/data")
             os.rmdir(rname)
-            sys.exit(4)
+            raise RidMountError(Rid, "RID_Mount:: Failed mounting imported Rid " + Rid, exit_code=4)
 
         import_state = ":" + import_state
 
@@ -957,6 +1029,8 @@ def RID_Mount(Rid):
     f.write("dev:" + md_dev + ":" + data_dev + import_state + "\n")
     f.close()
 
+    return "Mounted dev:" + md_dev + ":" + data_dev + import_state
+
 
 def RID_Umount(Rid):
 
@@ -972,28 +1046,25 @@ def RID_Umount(Rid):
 
     # If the rid doesn't appear to be mounted, fail.
     if not os.path.isdir(rname):
-        logging.info("RID_Umount:: Rid " + Rid + " does not appear to be mounted.  No rid directory " + rname + " exists.")
-        sys.exit(1)
+        raise RidNotMounted(Rid, "RID_Umount:: Rid " + Rid + " does not appear to be mounted.  No rid directory " + rname + " exists.")
 
     if not os.path.isfile(rinfo):
-        logging.info("RID_Umount:: Rid " + Rid + " does not appear to be mounted.  No rid.info file at " + rname + ".")
-        sys.exit(1)
+        raise RidNotMounted(Rid, "RID_Umount:: Rid " + Rid + " does not appear to be mounted.  No rid.info file at " + rname + ".")
 
     # See if lsof sees any files on this rid being used.   If so, fail.
     lsof_md = ""
     lsof_data = ""
 
     if os.path.isdir("/depot/import/md-" + str(Rid)):
-        lsof_md = SysExec("lsof /depot/import/md-" + str(Rid))
+        lsof_md = SysExecUncached("lsof /depot/import/md-" + str(Rid))
 
     if os.path.isdir("/depot/rid-" + str(Rid) + "/data"):
-        lsof_data = SysExec("lsof /depot/rid-" + str(Rid) + "/data")
+        lsof_data = SysExecUncached("lsof /depot/rid-" + str(Rid) + "/data")
 
     if len(lsof_md) > 0 or len(lsof_data) > 0:
-        logging.error("RID_Umount:: Can't umount RID.  Appears to be in use according to 'lsof'!")
-        sys.exit(1)
+        raise RidBusy(Rid, "RID_Umount:: Can't umount RID.  Appears to be in use according to 'lsof'!")
 
-    RInfo = SysExec("cat " + rinfo).strip()
+    RInfo = SysExecUncached("cat " + rinfo).strip()
 
     logging.debug("RInfo = " + RInfo)
 
@@ -1010,8 +1081,7 @@ def RID_Umount(Rid):
     print("Umounting rid " + Rid)
 
     if dtype != "dev" and dtype != "dir":
-        logging.error("RID_Umount:: Missing or unknown device type(" + dtype + ")!")
-        sys.exit(2)
+        raise RidMetadataError(Rid, "RID_Umount:: Missing or unknown device type(" + dtype + ")!", exit_code=2)
 
     if dtype == "dev":
 
@@ -1064,6 +1134,8 @@ def RID_Umount(Rid):
     if os.path.isdir(rname):
         os.rmdir(rname)
 
+    return "Umounted " + rname
+
 
 def RID_Sequester(Rid, Msg):
 
@@ -1079,17 +1151,14 @@ def RID_Sequester(Rid, Msg):
     Metadata_Location = LocateMetadata(Rid)
 
     if re.search("^UNKNOWN", Metadata_Location):
-        logging.error("RID_Sequester:: Path to Rid metadata cannot be determined.  Exiting.")
-        sys.exit(1)
+        raise RidMetadataError(Rid, "RID_Sequester:: Path to Rid metadata cannot be determined.  Exiting.")
 
     if re.search("^PATH", Metadata_Location):
         Metadata_Path = Metadata_Location.split(":")[1]
 
     if re.search("^BLOCKDEV", Metadata_Location):
-        Rid_to_Dev = Generate_Rid_to_Dev_Dict()
-        Dev = Rid_to_Dev[Rid]
         Metadata_Path = tempfile.mkdtemp()
-        mount_unix(Dev + "1", Metadata_Path)
+        mount_unix(Get_Rid_Index().md_partition(Rid), Metadata_Path)
         Unmount_Later = 1
 
     Sequester_file = Metadata_Path + "/SEQUESTER_STATUS"
@@ -1100,7 +1169,7 @@ def RID_Sequester(Rid, Msg):
     last_line = LastLine(Sequester_file).strip()
 
     if re.search("^SEQUESTERED", last_line):
-        print("Rid " + Rid + " is already sequestered.")
+        Result = "Rid " + Rid + " is already sequestered."
     else:
 
         now = strftime("%a %b %d %T %Z %Y", gmtime())
@@ -1110,13 +1179,14 @@ def RID_Sequester(Rid, Msg):
         with open(Sequester_file, "a") as f:
             f.write(Status)
         f.close()
-        print("Rid " + Rid + " is now sequestered.")
+        Result = "Rid " + Rid + " is now sequestered."
 
     if Unmount_Later == 1:
         umount_unix(Metadata_Path)
         os.rmdir(Metadata_Path)
 
-    sys.exit(0)
+    print(Result)
+    return Result
 
 
 def RID_Unsequester(Rid, Msg):
@@ -1133,17 +1203,14 @@ def RID_Unsequester(Rid, Msg):
     Metadata_Location = LocateMetadata(Rid)
 
     if re.search("^UNKNOWN", Metadata_Location):
-        logging.error("RID_Unsequester:: Path to Rid metadata cannot be determined.  Exiting.")
-        sys.exit(1)
+        raise RidMetadataError(Rid, "RID_Unsequester:: Path to Rid metadata cannot be determined.  Exiting.")
 
     if re.search("^PATH", Metadata_Location):
         Metadata_Path = Metadata_Location.split(":")[1]
 
     if re.search("^BLOCKDEV", Metadata_Location):
-        Rid_to_Dev = Generate_Rid_to_Dev_Dict()
-        Dev = Rid_to_Dev[Rid]
         Metadata_Path = tempfile.mkdtemp()
-        mount_unix(Dev + "1", Metadata_Path)
+        mount_unix(Get_Rid_Index().md_partition(Rid), Metadata_Path)
         Unmount_Later = 1
 
     Sequester_file = Metadata_Path + "/SEQUESTER_STATUS"
@@ -1154,7 +1221,7 @@ def RID_Unsequester(Rid, Msg):
     last_line = LastLine(Sequester_file)
 
     if re.search("^NOT_SEQUESTERED", last_line):
-        print("Rid " + Rid + " is already unsequestered.")
+        Result = "Rid " + Rid + " is already unsequestered."
     else:
 
         now = strftime("%a %b %d %T %Z %Y", gmtime())
@@ -1164,13 +1231,14 @@ def RID_Unsequester(Rid, Msg):
         with open(Sequester_file, "a") as f:
             f.write(Status)
         f.close()
-        print("Rid " + Rid + " is now unsequestered.")
+        Result = "Rid " + Rid + " is now unsequestered."
 
     if Unmount_Later == 1:
         umount_unix(Metadata_Path)
         os.rmdir(Metadata_Path)
 
-    sys.exit(0)
+    print(Result)
+    return Result
 
 
 def IBP_Server_Status():
@@ -1497,30 +1565,22 @@ def RID_Check_Sequester(Rid):
     logging.debug("RID_Check_Sequester::  Metadata_Location = " + Metadata_Location)
 
     if re.search("^UNKNOWN", Metadata_Location):
-        logging.error("RID_Check_Sequester:: Path to Rid metadata cannot be determined.  Exiting.")
-        sys.exit(1)
+        raise RidMetadataError(Rid, "RID_Check_Sequester:: Path to Rid metadata cannot be determined.  Exiting.")
 
     if re.search("^PATH", Metadata_Location):
         Metadata_Path = Metadata_Location.split(":")[1]
 
     if re.search("^BLOCKDEV", Metadata_Location):
-        MD_Partition = Metadata_Location.split(":")[1] + "1"
+        MD_Partition = Get_Rid_Index().md_partition(Rid)
         logging.debug("RID_Check_Sequester:: Metadata Partition = " + MD_Partition)
 
-        Dict_Rid_To_Dev = Generate_Rid_to_Dev_Dict()
-        Dev = Dict_Rid_To_Dev[Rid]
-
         if not is_partition_mounted(MD_Partition):
             logging.debug("RID_Check_Sequester:: Metadata partition is unmounted.  Mounting to check import...")
             Metadata_Path = tempfile.mkdtemp()
-            mount_unix(Dev + "1", Metadata_Path)
+            mount_unix(MD_Partition, Metadata_Path)
         else:
             logging.debug("RID_Check_Sequester:: Metadata partition is mounted.  Checking import and then leaving mounted.")
-            mounts = SysExecUncached("mount")
-            for line in mounts.splitlines():
-                if re.search(MD_Partition + " ", line):
-                    Metadata_Path = line.split(" ")[2]
-                    break
+            Metadata_Path = Mount_Table.mountpoint_of(MD_Partition)
             Unmount_Later = 1
 
     logging.debug("RID_Check_Sequester:: Metadata_Path = " + Metadata_Path)
@@ -1600,207 +1660,222 @@ def is_partition_mounted(partition):
     """
     Returns True if the partition has been mounted
     """
-    with open("/proc/mounts") as f:
-        return any(partition == line.split()[0] for line in f)
+    return Mount_Table.is_device_mounted(partition)
 #    return any(partition in line for line in SysExec("mount").splitlines())
 
 
-def RID_Fsck(Rid):
+def List_Partitions(Dev):
+    """
+    Return the partitions of a whole disk (/dev/sdb -> [/dev/sdb1, /dev/sdb2]),
+    in partition order, from /sys/block/<dev>/.
+    """
 
-    Rid_to_Dev = Generate_Rid_to_Dev_Dict()
+    Name = os.path.basename(Dev)
+    Partitions = []
+
+    try:
+        Entries = list(os.scandir("/sys/block/" + Name))
+    except OSError:
+        return []
+
+    for Entry in Entries:
+        if not Entry.name.startswith(Name):
+            continue
+        try:
+            with open(Entry.path + "/partition") as f:
+                Number = int(f.read().strip())
+        except (OSError, ValueError):
+            continue
+        Partitions.append((Number, "/dev/" + Entry.name))
+
+    return [Part for _, Part in sorted(Partitions)]
 
-    if Rid not in Rid_to_Dev:
-        print("ERROR:  Could not determine the block device associated with RID " + Rid)
-        sys.exit(1)
 
-    Dev = Rid_to_Dev[Rid]
+def RID_Fsck(Rid, Force=False):
+
+    Dev = Get_Rid_Index().disk(Rid)
+
+    if Dev is None:
+        raise RidNotFound(Rid, "ERROR:  Could not determine the block device associated with RID " + Rid)
 
     logging.debug("RID_Fsck::  Rid " + Rid + " belongs to Dev " + Dev)
 
-    Partitions = []
-    for i in range(0, 255):
-        if partition_exists(Dev + str(i)):
-            Partitions.append(Dev + str(i))
+    Partitions = List_Partitions(Dev)
 
     logging.debug("RID_Fsck::  Partitions = " + str(Partitions))
 
+    Checked = []
+    Skipped = []
+    Failed = []
+
     for part in Partitions:
 
         if is_partition_mounted(part):
             logging.debug("RID_Fsck::  Partition " + part + " is mounted, skipping fsck...")
+            Skipped.append(part + " (mounted)")
+            continue
+
+        # Don't bother with filesystems the superblock says are clean and
+        # recently checked, unless we're forced to.
+        Superblock = Read_Superblock(part)
+        Reason = Fsck_Reason(Superblock)
+
+        if Reason is None and not Force:
+            logging.info("RID_Fsck::  Partition " + part + " is " + Describe_Clean(Superblock) + ", skipping fsck...")
+            Skipped.append(part + " (" + Describe_Clean(Superblock) + ")")
             continue
 
-        logging.debug("RID_Fsck::  Partition " + part + " is unmounted, commensing fsck...")
+        if Reason is None:
+            Reason = "forced"
+
+        logging.info("RID_Fsck::  Partition " + part + " needs fsck (" + Reason + "), commensing fsck...")
+
+        # fsck can run for hours on a big drive, so no timeout and no cache here.
+        # Exit codes 1 and 2 mean errors were found and corrected.
+        rc = subprocess.call(["fsck", "-y", part], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        logging.debug("RID_Fsck::  fsck of " + part + " returned " + str(rc))
+
+        if rc & ~3:
+            Failed.append(part + " (exit " + str(rc) + ")")
+        else:
+            Checked.append(part + " (" + Reason + ")")
 
-        SysExec("fsck -y " + part)
+    if Failed:
+        raise RidCommandError(Rid, "RID_Fsck:: fsck failed on " + ", ".join(Failed))
 
+    return "Checked " + (", ".join(Checked) if Checked else "nothing") + "; skipped " + (", ".join(Skipped) if Skipped else "nothing")
 
-def RID_Defrag(Rid, LogDir, Extent_Threshold=3):
+
+def RID_Defrag(Rid, LogDir, Extent_Threshold=3, Scan_Workers=4, IndexDir=INDEX_DIR, Budget=None):
 
     if not os.path.isdir(LogDir):
         logging.debug("RID_Defrag:: LogDir " + LogDir + " doesn't exist, so creating...")
-        os.mkdir(LogDir)
-
-    # Create an array of "valid" characters so I can filter out bad ones
-    # There is almost certainly a better way to do this, but it's quick
-    # and allows me to test some things.
-    ValidChars = [
-        "a", "b", "c", "d", "e", "f", "g", "h", "i", "j",
-        "k", "l", "m", "n", "o", "p", "q", "r", "s", "t",
-        "u", "v", "w", "x", "y", "z", "A", "B", "C", "D",
-        "E", "F", "G", "H", "I", "J", "K", "L", "M", "N",
-        "O", "P", "Q", "R", "S", "T", "U", "V", "W", "X",
-        "Y", "Z", "0", "1", "2", "3", "4", "5", "6", "7",
-        "8", "9", " ", "-", ":"]
-
-    # We don't want any from these folders
-    SkipMe = ["./deleted_trash", "./expired_trash", "./lost+found"]
+        os.makedirs(LogDir, exist_ok=True)
 
     # I should add a bit of code to detect where the RID Data partition is mounted
     # but until then...
     if not os.path.isdir("/depot/rid-" + Rid):
-        logging.error("RID_Defrag:: ERROR: RID " + Rid + " either doesn't exist or isn't mounted properly.  Please check.")
-        sys.exit(1)
+        raise RidNotMounted(Rid, "RID_Defrag:: ERROR: RID " + Rid + " either doesn't exist or isn't mounted properly.  Please check.")
 
     Logfile = LogDir + "/extents-rid-" + Rid + ".log"
-    if os.path.isfile(Logfile):
-        os.remove(Logfile)
 
     Now = strftime("%a %b %d %T %Z %Y", gmtime())
 
     logging.debug("RID_Defrag:: Starting defrag of RID " + Rid + " at " + Now)
 
-    f = open(Logfile, "w")
-
-    f.write("# TIME START RID " + Rid + " SCAN - " + Now + "\n")
-    f.write("##################################################################\n")
+    # Extents are counted in-process with FIEMAP and kept in a per-RID index,
+    # so only new or changed files are measured again.  deleted_trash,
+    # expired_trash and lost+found are never descended into.
+    Index = ExtentIndex(Rid, IndexDir)
 
-    for i in range(0, 256):
-        Dir = "/depot/rid-" + str(Rid) + "/data/" + str(i)
-        for dirname, subdirname, filenames in os.walk(Dir):
-            for filename in filenames:
-                for skip in SkipMe:
-                    if dirname == skip:
-                        continue
-                Filename = os.path.join(dirname, filename)
-                Filesize = os.path.getsize(Filename)
-                NumExtents = SysExec("filefrag " + Filename).split(" ")[1]
-
-                # It's an arbitrary threshold, but the vast majority of files have
-                # <= 3 extents, so only defrag files that have more.
-                if int(NumExtents) <= Extent_Threshold:
-                    continue
+    # An IOBudget (see iobudget.py) rate limits e4defrag, runs it in the idle
+    # I/O class, and pauses while the disk is busy or outside the time window.
+    Throttle = Budget.for_rid(Rid, Get_Rid_Index().disk(Rid)) if Budget else None
 
-                Extents_After = check_output(["e4defrag", "-v", Filename])
+    try:
+        Roots = ["/depot/rid-" + str(Rid) + "/data/" + str(i) for i in range(0, 256)]
+        Roots = Index.pending_roots([Root for Root in Roots if os.path.isdir(Root)])
 
-                # Filter out the nasty non-numeric characters and then
-                # pluck out the "after" extents
-                Extents_After = "".join([c for c in Extents_After if c in ValidChars])
-                Extents_After = Extents_After[::-1]
-                Extents_After = Extents_After.split("-")[0]
-                Extents_After = Extents_After[::-1]
-                Extents_After = Extents_After.split(" ")[1]
+        logging.debug("RID_Defrag:: RID " + Rid + " pass " + str(Index.current_pass()) + ", " + str(len(Roots)) + " directories to go")
 
-                Output = "Rid = " + Rid + " and Filename = " + Filename + " and Filesize = " + \
-                    str(Filesize) + " and Extents Before = " + \
-                    NumExtents + " and Extents after = " + Extents_After
+        Scanned = 0
+        Measured = 0
+        Defragged = 0
+        Failed = 0
 
-                f.write(Output + "\n")
-                logging.debug(Output)
+        for Root, Records in Scan_Roots(Roots, Threshold=Extent_Threshold, Workers=Scan_Workers, Known=Index.known):
 
-    Now = strftime("%a %b %d %T %Z %Y", gmtime())
+            Results = {}
+            Retry = []
 
-    logging.debug("RID_Defrag:: Finished defrag of Rid " + Rid + " at " + Now)
+            if Throttle:
+                Throttle.wait()
 
-    f.write("##################################################################\n")
-    f.write("# TIME END RID " + Rid + " SCAN - " + Now + "\n")
+            for Record in Records:
 
-    f.close()
+                Scanned += 1
 
+                # Unchanged files were already dealt with by an earlier run
+                if not Record.Changed:
+                    continue
 
-def Smart_Attributes(Dev):
-
-    # If Dev doesn't exist, bail out now...
-    f = open("/sys/block/" + Dev.split("/")[-1] + "/device/model")
-    Model = f.read().strip()
-    f.close()
+                Measured += 1
 
-    # How to determine if a drive is SATA or SAS.  At some point we need to improve this...
-    SAS = 0
-    SAS_Transport = SysExec("sudo smartctl -i " + Dev)
-    for line in SAS_Transport.splitlines():
-        if re.search("^Transport protocol", line):
-            if re.search("SAS", line):
-                SAS = 1
-                break
+                # It's an arbitrary threshold, but the vast majority of files have
+                # <= 3 extents, so only defrag files that have more.
+                if Record.Extents <= Extent_Threshold:
+                    continue
 
-    Drive_Attributes = {}
+                Cmd = ["e4defrag", Record.Path]
+                if Throttle:
+                    Throttle.wait(Record.Size)
+                    Cmd = Budget.command(Cmd)
+
+                rc = subprocess.call(Cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                if rc != 0:
+                    # Leave it out of the index so the next pass tries it again
+                    logging.debug("RID_Defrag:: e4defrag exited " + str(rc) + " on " + Record.Path + ", will retry next pass")
+                    Failed += 1
+                    Retry.append(Record.Path)
+                    continue
 
-    if SAS == 1:
+                Defragged += 1
 
-        Attr = SysExec("sudo smartctl -a " + Dev)
+                Extents_After = Count_Extents(Record.Path, Extent_Threshold)
+                Results[Record.Path] = (Record.Extents, Extents_After)
 
-        for line in Attr.splitlines():
+                logging.debug("Rid = " + Rid + " and Filename = " + Record.Path + " and Filesize = " + \
+                    str(Record.Size) + " and Extents Before = " + \
+                    str(Record.Extents) + " and Extents after = " + str(Extents_After))
 
-            # Some SAS attributes can be mapped to corresponding SATA attributes
-            if re.search("^Accumulated start-stop cycles", line):
-                t = line.split(":")[1].strip()
-                Drive_Attributes[4] = "4_Start_Stop_Count " + t + " 0 0 " + t
+            # Checkpoint: this directory is done for this pass
+            Index.update_root(Root, Records, Results, Retry)
 
-            if re.search("number of hours powered up", line):
-                t = line.split("=")[1].strip().split(".")[0]
-                Drive_Attributes[9] = "9_Power_On_Hours " + t + " 0 0 " + t
+        Index.finish_pass()
 
-            if re.search("Current Drive Temperature", line):
-                t = line.split(":")[1]
-                t = re.sub("C", "", t).strip()
-                Drive_Attributes[194] = "194_Temperature_Celsius " + t + " " + t + " 0 " + t
+        Write_Report(Index, Logfile, Extent_Threshold)
 
-            # Others we'll create unique SAS attributes for
-            if re.search("^Elements in grown defect list", line):
-                t = line.split(":")[1].strip()
-                Drive_Attributes[9000] = "9000_SAS_Grown_Defect_List " + t + " 0 0 " + t
+    finally:
+        Index.close()
 
-            if re.search("^Manufactured in", line):
-                t = re.sub("Manufactured in ", "", line)
-                t = re.sub(" of year ", "_", t)
-                t = re.sub(" ", "_", t)
-                Drive_Attributes[9001] = "9001_SAS_Manufacture_Date 0 0 0 " + t
+    Now = strftime("%a %b %d %T %Z %Y", gmtime())
 
-            if re.search("^read:", line):
-                t = ' '.join(line.split())
-                t = t.split(" ")[6].split(".")[0]
-                Drive_Attributes[9002] = "9002_SAS_Gigabytes_Read " + t + " 0 0 " + t
+    logging.debug("RID_Defrag:: Finished defrag of Rid " + Rid + " at " + Now)
 
-            if re.search("^write:", line):
-                t = ' '.join(line.split())
-                t = t.split(" ")[6].split(".")[0]
-                Drive_Attributes[9003] = "9003_SAS_Gigabytes_Write " + t + " 0 0 " + t
+    Message = "Scanned " + str(Scanned) + " files, measured " + str(Measured) + ", defragged " + str(Defragged)
+    if Failed:
+        Message += ", failed " + str(Failed)
+    if Throttle and Throttle.Paused:
+        Message += ", throttled " + str(int(Throttle.Paused)) + "s"
 
-    else:
+    return Message + "; report in " + Logfile
 
-        Attr = SysExec("sudo smartctl --attributes " + Dev)
 
-        for line in Attr.splitlines():
+def Smart_Attributes(Dev, timeout=None):
 
-            line = line.lstrip()
+    # If Dev doesn't exist, bail out now...
+    f = open("/sys/block/" + Dev.split("/")[-1] + "/device/model")
+    Model = f.read().strip()
+    f.close()
 
-            if not re.search("^[0-9]", line):
-                continue
+    # Everything comes from a single "smartctl -x --json" (see smartjson.py)
+    Record = Smart_Record(Dev, timeout=timeout)
 
-            line = ' '.join(line.split())
+    Drive_Attributes = {}
 
-            Num = line.split(" ")[0]
-            Txt = line.split(" ")[1]
-            Val = line.split(" ")[3]
-            Worst = line.split(" ")[4]
-            Thresh = line.split(" ")[5]
-            Raw = line.split(" ")[9]
+    # SAS counters come back mapped onto ATA-style ids (see Attribute_Table)
+    for Attr in Attribute_Table(Record).values():
 
-            key = int(Num)
-            val = Num + "_" + Txt + " " + Val + " " + Worst + " " + Thresh + " " + Raw
+        # Same fields "smartctl --attributes" prints, with the first word of the raw value
+        Raw = Attr.Raw_String.split()[0] if Attr.Raw_String.split() else "0"
 
-            Drive_Attributes[key] = val
+        if Record.Protocol == "SAS":
+            Drive_Attributes[Attr.Id] = str(Attr.Id) + "_" + Attr.Name + " " + str(Attr.Value) + " " + \
+                str(Attr.Worst) + " " + str(Attr.Thresh) + " " + Raw
+        else:
+            Drive_Attributes[Attr.Id] = str(Attr.Id) + "_" + Attr.Name + " " + "%03d" % (Attr.Value or 0) + " " + \
+                "%03d" % (Attr.Worst or 0) + " " + "%03d" % (Attr.Thresh or 0) + " " + Raw
 
     return collections.OrderedDict(Drive_Attributes.items())
 
@@ -1839,11 +1914,41 @@ def Smart_Attributes(Dev):
         print(FORMAT % (Attr, Value, Worst, Thresh, Raw))
 
 
-def Query_Drives_Smart_Attributes(Query):
+def _Match_Smart_Attribute(Attributes, Query):
+    """
+    Return the Smart_Attributes() entry matching Query (an attribute name or
+    ID#), or None.
+    """
+
+    Attr = None
 
-    Output_Dict = {}
+    # If the input is a Smart Attribute name, go this way...
+    if re.search("_", Query):
+        for Key in Attributes:
+            Val = Attributes[Key]
+            Name = Val.split()[0]
+
+            if re.search(Query, Name):
+                Attr = Val
+
+    # If the input is a Smart ID#, go this way...
+    if re.search("^[0-9]+$", Query):
+        if int(Query) in Attributes:
+            Attr = Attributes[int(Query)]
+
+    return Attr
 
-    for line in os.listdir("/sys/block"):
+
+def Query_Drives_Smart_Attributes(Query, Workers=16, Deadline=30):
+    """
+    Query one SMART attribute on every drive, on at most Workers threads.  A
+    drive that hasn't answered Deadline seconds after its query started is
+    reported as TIMEOUT instead of holding up the rest, and quarantined so
+    later runs report it as QUARANTINED without waiting on it again.
+    """
+
+    Devs = []
+    for line in sorted(os.listdir("/sys/block")):
 
         if re.search("^loop", line):
             continue
@@ -1857,26 +1962,27 @@ def Query_Drives_Smart_Attributes(Query):
         if re.search("^dm-", line):
             continue
 
-        Dev = "/dev/" + line
-        Attributes = Smart_Attributes(Dev)
+        Devs.append("/dev/" + line)
 
-        Attr = "None"
+    Results, Unavailable = Probe_Devices(Devs, lambda Dev: Smart_Attributes(Dev, timeout=Deadline), Workers=Workers, Deadline=Deadline, What="smartctl")
 
-        # If the input is a Smart Attribute name, go this way...
-        if re.search("_", Query):
-            for Key in Attributes:
-                Val = Attributes[Key]
-                Name = Val.split()[0]
+    Output_Dict = {}
 
-                if re.search(Query, Name):
-                    Attr = Val
+    for Dev in Devs:
 
-        # If the input is a Smart ID#, go this way...
-        if re.search("^[0-9]+$", Query):
-            if int(Query) in Attributes:
-                Attr = Attributes[int(Query)]
+        if Dev in Unavailable:
+            Output_Dict[Dev] = (Dev, Unavailable[Dev], "-", "-", "-", "-")
+            continue
 
-        if Attr == "None":
+        Attributes = Results.get(Dev)
+
+        # Not a drive smartctl can talk to (no /sys/block/<dev>/device, ...)
+        if isinstance(Attributes, Exception):
+            continue
+
+        Attr = _Match_Smart_Attribute(Attributes, Query)
+
+        if Attr is None:
             continue
 
         Name = Attr.split()[0]
@@ -1928,20 +2034,12 @@ def Print_Query_Drives_Smart_Attributes(Output_Dict):
 def Determine_Drive_Protocol(Dev):
     """
     Return the protocol the drive uses (SATA, SAS, etc)
-    There may be a better way to do this, but not that I've found...
     """
 
-    Protocol = "UNKNOWN"
-
-    for line in SysExec("sudo smartctl -i " + Dev).splitlines():
-
-        if re.search("Transport protocol", line) and re.search("SAS", line):
-            Protocol = "SAS"
-            break
+    Protocol = Smart_Record(Dev).Protocol
 
-        if re.search("ATA Version", line) or re.search("SATA", line):
-            Protocol = "SATA"
-            break
+    if Protocol not in ("SATA", "SAS"):
+        Protocol = "UNKNOWN"
 
     print("Determine_Drive_Protocol::  Protocol = " + Protocol)
 
@@ -1953,38 +2051,34 @@ def RID_Run_SmartTest(Rid, TestType="short"):
     logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(message)s')
 
     if TestType != "short" and TestType != "long":
-        print("ERROR:  You requested a " + TestType + " SMART test which isn't supported.")
-        sys.exit(1)
+        raise RidError(Rid, "ERROR:  You requested a " + TestType + " SMART test which isn't supported.")
 
     # Just promote it to a string here...
     Rid = str(Rid)
 
-    Rid_to_Dev = Generate_Rid_to_Dev_Dict()
+    Dev = Get_Rid_Index().disk(Rid)
 
-    if Rid not in Rid_to_Dev:
-        print("ERROR:  Could not find Rid " + Rid + " on this system.")
-        sys.exit(1)
-
-    Dev = Rid_to_Dev[Rid]
+    if Dev is None:
+        raise RidNotFound(Rid, "ERROR:  Could not find Rid " + Rid + " on this system.")
 
     logging.debug("Dev = " + Dev)
 
     # I want to check and see if there's already a SMART test running before
     # spawning another.   Unfortunately, this test only works on SATA drives.
-    Drive_Protocol = Determine_Drive_Protocol(Dev)
+    # Ask for fresh data, a cached record could predate a test started since.
+    Record = Smart_Record(Dev, ttl=0)
 
-    if Drive_Protocol == "SATA":
+    if Record.Protocol == "SATA":
 
-        Test_in_Progress = False
-        for line in SysExec("sudo smartctl -c " + Dev).splitlines():
-            if re.search("Self-test routine in progress", line):
-                Test_in_Progress = True
-                break
+        Test_in_Progress = Record.Self_Test is not None and Record.Self_Test.Value is not None and \
+            Record.Self_Test.Value >> 4 == SELF_TEST_IN_PROGRESS
 
         logging.debug("Test_in_Progress = " + str(Test_in_Progress))
 
     # Start a SMART test...
-    SysExec("sudo smartctl -t " + TestType + " " + Dev)
+    SysExecUncached("sudo smartctl -t " + TestType + " " + Dev)
+
+    return "Started " + TestType + " SMART test on " + Dev
 
 
 def HumanFriendlyBytes(bytes, scale, decimals):
@@ -2069,14 +2163,12 @@ def Parted_Return_Next_Available_Sector(Dev):
 def RID_Create(Rid, Dev, AssumeYes=False):
 
     if not partition_exists(Dev):
-        logging.error("RID_Create:: ERROR:  Could not find block device " + Dev + ".  Exiting...")
-        return 1
+        raise RidError(Rid, "RID_Create:: ERROR:  Could not find block device " + Dev + ".  Exiting...")
 
     Rname = depot_dir + "/rid-" + Rid
 
     if os.path.isdir(Rname):
-        print("ERROR:  Looks like a resource is already mounted using RID " + Rid + "!")
-        return 1
+        raise RidAlreadyMounted(Rid, "ERROR:  Looks like a resource is already mounted using RID " + Rid + "!", exit_code=1)
 
     # See if there are any partitions on the drive
     logging.info("RID_Create:: Seeing if any existing partitions on drive " + Dev)
@@ -2115,13 +2207,11 @@ def RID_Create(Rid, Dev, AssumeYes=False):
         Answer = query_yes_no(Question, default="no")
 
         if not Answer:
-            logging.info("RID_Create:: Ok, exiting...")
-            sys.exit(1)
+            raise RidError(Rid, "RID_Create:: Ok, exiting...")
 
     # Unmount any existing partitions belonging to this drive
-    for line in SysExec("mount").splitlines():
-        if re.search("^" + Dev + "[0-9]", line):
-            part = line.split()[0]
+    for part, _, _ in Mount_Table.entries():
+        if re.search("^" + Dev + "[0-9]", part):
             logging.info("RID_Create:: Detected mounted partition " + part + ".  Attempting to umount...")
             SysExec("umount -f " + part)
 
@@ -2217,6 +2307,8 @@ def RID_Create(Rid, Dev, AssumeYes=False):
 
     logging.info("RID_Create:: Configuration stored in " + Rname + "/md/rid.settings")
 
+    return "Created on " + Dev
+
 
 def copyfolder(src, dst, symlinks=False, ignore=None):
     logging.debug("copyfolder:: src = " + src + " and dst = " + dst)
@@ -2267,26 +2359,23 @@ def RID_Import(Rid, MD_Dir, Snap = False):
     logging.debug("RID_Import:: Rid_Folder = " + Rid_Folder)
 
     if os.path.isfile(Rid_Folder + "/md/import"):
-        logging.info("ERROR:  It appears that Rid " + Rid + " is already imported.")
-        sys.exit(1)
+        raise RidMetadataError(Rid, "ERROR:  It appears that Rid " + Rid + " is already imported.")
 
     Rid_Info = Rid_Folder + "/rid.info"
     logging.debug("RID_Import:: Rid_Info = " + Rid_Info)
 
     if not os.path.isfile(Rid_Info):
-        logging.info("RID_Import:: Missing " + Rid_Info + " file!")
-        sys.exit(2)
+        raise RidNotMounted(Rid, "RID_Import:: Missing " + Rid_Info + " file!", exit_code=2)
 
-    Rid_Info_String = SysExec("cat " + Rid_Info).strip()
+    Rid_Info_String = SysExecUncached("cat " + Rid_Info).strip()
     logging.debug("RID_Import:: Rid_Info_String = " + Rid_Info_String)
 
     Depot_Type = Rid_Info_String.split(":")[0]
     logging.debug("RID_Import:: Depot_Type = " + str(Depot_Type))
 
-    lsof_rid = SysExec("lsof " + Rid_Folder)
+    lsof_rid = SysExecUncached("lsof " + Rid_Folder)
     if len(lsof_rid) > 0:
-        logging.error("RID_Import:: Can't umount RID.  Appears to be in use according to 'lsof'!")
-        sys.exit(3)
+        raise RidBusy(Rid, "RID_Import:: Can't umount RID.  Appears to be in use according to 'lsof'!", exit_code=3)
 
     md_new = MD_Dir + "/md-" + Rid
     logging.debug("RID_Import:: md_dir = " +
@@ -2304,8 +2393,7 @@ def RID_Import(Rid, MD_Dir, Snap = False):
         raise RuntimeError(f"Metadata source directory {Src} missing")
 
     if not os.path.isdir(Src) or os.path.islink(Src):
-        print("ERROR:  Metadata source directory " + Src + " doesn't appear to exist!")
-        sys.exit(1)
+        raise RidMetadataError(Rid, "ERROR:  Metadata source directory " + Src + " doesn't appear to exist!")
 
     logging.debug("RID_Import:: Copying metadata from " + Src + " to " + Dst)
     for i in SyncFiles:
@@ -2340,6 +2428,8 @@ def RID_Import(Rid, MD_Dir, Snap = False):
     RID_Umount(Rid)
     RID_Mount(Rid)
 
+    return "Imported to " + md_new
+
 
 def RID_Export(Rid, MD_Dir = "", Snap = False):
 
@@ -2374,7 +2464,7 @@ def RID_Export(Rid, MD_Dir = "", Snap = False):
     Rid_Info_File = Rid_Folder + "/rid.info"
     logging.debug("RID_Export:: Rid_Info_File = " + Rid_Info_File)
 
-    Rid_Info_String = SysExec("cat " + Rid_Info_File).strip()
+    Rid_Info_String = SysExecUncached("cat " + Rid_Info_File).strip()
     logging.debug("RID_Export:: Rid_Info_String = " + Rid_Info_String)
 
     Rid_Info = Rid_Info_String.split(":")
@@ -2385,16 +2475,14 @@ def RID_Export(Rid, MD_Dir = "", Snap = False):
     logging.debug("RID_Export:: Depot_Type = " + str(Depot_Type))
 
     if len(Rid_Info) != 4:
-        logging.info("ERROR:  It does not appear that Rid " + Rid + " is currently imported.")
-        return 1
+        raise RidMetadataError(Rid, "ERROR:  It does not appear that Rid " + Rid + " is currently imported.")
 
     MD_Export_Dev = Rid_Info[1]
     MD_Import_Folder = Rid_Info[3]
     logging.debug("RID_Export:: MD_Export_Dev = " + MD_Export_Dev + " and MD_Import_Folder = " + MD_Import_Folder)
 
     if not MD_Import_Folder:
-        logging.error("RID_Export:: RID not imported!")
-        return 1
+        raise RidMetadataError(Rid, "RID_Export:: RID not imported!")
 
     MD_Export_Folder = None
     if Depot_Type == "dev":
@@ -2452,6 +2540,8 @@ def RID_Export(Rid, MD_Dir = "", Snap = False):
     if os.path.isdir(MD_Import_Folder):
         shutil.rmtree(MD_Import_Folder)
 
+    return "Exported from " + MD_Import_Folder
+
 
 def RID_Detach(Rid, Hostname, Port = "6714", Msg = "Detaching Rid"):
     SysExec(f"ibp_detach_rid {Hostname} {Port} {Rid} 1 \"{Msg}\"")
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+"""
+ridsched - A topology-aware job scheduler for bulk RID operations.
+
+Running fsck or e4defrag on every RID of a 90 drive depot at once just
+thrashes the HBA and the backplanes they share.  This scheduler groups jobs by
+the hardware their drive hangs off, read from sysfs:
+
+    controller  - the PCI function of the HBA (0000:02:00.0)
+    host        - the SCSI host on that controller (host0)
+    enclosure   - the SES enclosure / SAS expander the drive sits behind
+
+and never runs more than the configured number of jobs per group, nor more
+than Max_Workers in total.  Groups without a limit are not capped.
+"""
+
+import glob
+import logging
+import os
+import re
+import threading
+
+# Default per-group concurrency limits.  Callers can override any of these.
+DEFAULT_LIMITS = {
+    "controller": 8,
+    "host": 8,
+    "enclosure": 4,
+}
+
+PCI_RE = re.compile(r"^[0-9a-f]{4}:[0-9a-f]{2}:[0-9a-f]{2}\.[0-9a-f]$")
+HOST_RE = re.compile(r"^host[0-9]+$")
+
+
+def Device_Topology(Dev):
+    """
+    Return a list of (group, id) tuples describing where a block device lives,
+    e.g. [("controller", "0000:02:00.0"), ("host", "host0"), ("enclosure", "0:0:24:0")].
+    Unknown parts are simply left out.
+    """
+
+    Name = os.path.basename(Dev)
+    Sysfs = os.path.realpath("/sys/block/" + Name)
+
+    if not os.path.isdir(Sysfs):
+        return []
+
+    Parts = Sysfs.split("/")
+    Groups = []
+
+    # The controller is the last PCI function before the SCSI host (or nvme).
+    Host_Index = None
+    for i, Part in enumerate(Parts):
+        if HOST_RE.match(Part) or Part == "nvme":
+            Host_Index = i
+            break
+
+    if Host_Index is not None:
+        for Part in reversed(Parts[:Host_Index]):
+            if PCI_RE.match(Part):
+                Groups.append(("controller", Part))
+                break
+        if Parts[Host_Index] != "nvme":
+            Groups.append(("host", Parts[Host_Index]))
+
+    # Prefer the SES enclosure the kernel associated with the drive, and fall
+    # back to the SAS expander it's attached through.
+    Enclosure = None
+    for Link in glob.glob(Sysfs + "/device/enclosure_device:*"):
+        Target = os.path.realpath(Link).split("/")
+        if "enclosure" in Target:
+            Enclosure = Target[Target.index("enclosure") + 1]
+            break
+
+    if Enclosure is None:
+        for Part in Parts:
+            if Part.startswith("expander-"):
+                Enclosure = Part
+
+    if Enclosure is not None:
+        Groups.append(("enclosure", Enclosure))
+
+    return Groups
+
+
+class TopologyScheduler(object):
+    """
+    Run jobs on threads while respecting per-group and global concurrency caps.
+    """
+
+    def __init__(self, Max_Workers=16, Limits=None):
+
+        self.Max_Workers = max(1, Max_Workers)
+
+        self.Limits = dict(DEFAULT_LIMITS)
+        if Limits:
+            self.Limits.update(Limits)
+
+    def _fits(self, Groups, Running):
+
+        for Group in Groups:
+            Limit = self.Limits.get(Group[0])
+            if Limit and Running.get(Group, 0) >= Limit:
+                return False
+        return True
+
+    def run(self, Jobs):
+        """
+        Jobs is a list of (Groups, Callable) pairs, where Groups comes from
+        Device_Topology().  Returns the callables' return values in the same
+        order as Jobs.  Every worker is joined before returning.
+        """
+
+        Results = [None] * len(Jobs)
+        Pending = list(range(len(Jobs)))
+        Running = {}          # (group, id) -> number of running jobs
+        Threads = []
+        Active = [0]
+        Cond = threading.Condition()
+
+        def Worker(i):
+            Groups, Job = Jobs[i]
+            try:
+                Results[i] = Job()
+            finally:
+                with Cond:
+                    for Group in Groups:
+                        Running[Group] -= 1
+                    Active[0] -= 1
+                    Cond.notify_all()
+
+        with Cond:
+            while Pending:
+
+                Started = False
+
+                for i in list(Pending):
+
+                    if Active[0] >= self.Max_Workers:
+                        break
+
+                    Groups = Jobs[i][0]
+                    if not self._fits(Groups, Running):
+                        continue
+
+                    Pending.remove(i)
+                    for Group in Groups:
+                        Running[Group] = Running.get(Group, 0) + 1
+                    Active[0] += 1
+
+                    logging.debug("TopologyScheduler:: starting job " + str(i) + " in groups " + str(Groups))
+
+                    t = threading.Thread(target=Worker, args=(i,))
+                    t.start()
+                    Threads.append(t)
+                    Started = True
+
+                if Pending and not Started:
+                    Cond.wait()
+
+        for t in Threads:
+            t.join()
+
+        return Results
@@ -0,0 +1,803 @@
+#!/usr/bin/env python3
+
+"""
+ses - Read and decode SCSI Enclosure Services (SES) diagnostic pages.
+
+lsbackplane, lsslot, lsenclosure, light_slot and power_slot all forked
+sg_ses and regex-parsed its human-readable output, which changes between
+sg3_utils releases.  lsbackplane ran it twice per enclosure, and lsslot and
+lsenclosure fetched the same additional element status page again.  This
+module sends RECEIVE DIAGNOSTIC RESULTS / SEND DIAGNOSTIC to the enclosure's
+/dev/sg* node with the SG_IO ioctl and decodes:
+
+    0x01  configuration                 Parse_Configuration()
+    0x02  enclosure status (/control)   Parse_Status()
+    0x07  element descriptor            Parse_Element_Descriptors()
+    0x0a  additional element status     Parse_Additional_Status()
+
+into namedtuples.  Get_Enclosure() hands back one Enclosure per device for
+the whole run, which fetches each page at most once.
+
+Every element is identified by its Type, its Index among the individual
+elements of that type (None for the overall element) and its Element_Index,
+the position among all individual elements that the additional element
+status page refers to.  A drive slot is the Index of an element of the
+first Array device slot (or Device slot) type, which is how "sg_ses -I"
+counts slots.
+
+For offline tests, Replay(Directory) makes every Enclosure read its pages
+from files written by Capture() (<sg name>.<page>.bin, e.g. sg3.0a.bin)
+instead of the hardware.  Setting SES_REPLAY_DIR does the same for a whole
+tool, e.g. "SES_REPLAY_DIR=/tmp/pages lsslot".
+"""
+
+import collections
+import ctypes
+import fcntl
+import logging
+import os
+import threading
+
+# SG_IO interface (<scsi/sg.h>)
+SG_IO = 0x2285
+SG_INTERFACE_ID = ord('S')
+SG_DXFER_TO_DEV = -2
+SG_DXFER_FROM_DEV = -3
+
+RECEIVE_DIAGNOSTIC_RESULTS = 0x1c
+SEND_DIAGNOSTIC = 0x1d
+
+# Seconds an enclosure may take to answer one command
+TIMEOUT = 30
+
+MAX_PAGE_LENGTH = 65532
+SENSE_LENGTH = 32
+
+CONFIGURATION_PAGE = 0x01
+STATUS_PAGE = 0x02
+CONTROL_PAGE = 0x02
+ELEMENT_DESCRIPTOR_PAGE = 0x07
+ADDITIONAL_STATUS_PAGE = 0x0a
+
+# Element types
+DEVICE_SLOT = 0x01
+POWER_SUPPLY = 0x02
+COOLING = 0x03
+TEMPERATURE_SENSOR = 0x04
+DOOR = 0x05
+ESCE = 0x07
+ENCLOSURE = 0x0e
+ARRAY_DEVICE_SLOT = 0x17
+SAS_EXPANDER = 0x18
+SAS_CONNECTOR = 0x19
+
+ELEMENT_TYPES = {
+    0x00: "Unspecified",
+    DEVICE_SLOT: "Device slot",
+    POWER_SUPPLY: "Power supply",
+    COOLING: "Cooling",
+    TEMPERATURE_SENSOR: "Temperature sensor",
+    DOOR: "Door",
+    0x06: "Audible alarm",
+    ESCE: "Enclosure services controller electronics",
+    0x08: "SCC controller electronics",
+    0x09: "Nonvolatile cache",
+    0x0a: "Invalid operation reason",
+    0x0b: "Uninterruptible power supply",
+    0x0c: "Display",
+    0x0d: "Key pad entry",
+    ENCLOSURE: "Enclosure",
+    0x0f: "SCSI port/transceiver",
+    0x10: "Language",
+    0x11: "Communication port",
+    0x12: "Voltage sensor",
+    0x13: "Current sensor",
+    0x14: "SCSI target port",
+    0x15: "SCSI initiator port",
+    0x16: "Simple subenclosure",
+    ARRAY_DEVICE_SLOT: "Array device slot",
+    SAS_EXPANDER: "SAS expander",
+    SAS_CONNECTOR: "SAS connector",
+}
+
+SLOT_TYPES = (ARRAY_DEVICE_SLOT, DEVICE_SLOT)
+
+# Types whose IDENT bit is bit 7 of byte 1
+_IDENT_BYTE1 = (POWER_SUPPLY, COOLING, TEMPERATURE_SENSOR, DOOR, ESCE, ENCLOSURE, SAS_EXPANDER, SAS_CONNECTOR)
+
+STATUS_CODES = ["Unsupported", "OK", "Critical", "Noncritical", "Unrecoverable",
+                "Not installed", "Unknown", "Not available", "No access allowed"]
+
+# Which bits of a slot's status element carry over into its control element
+# when we change one thing about it (the same masks sg_ses uses)
+_CONTROL_MASK = {
+    ARRAY_DEVICE_SLOT: (0x40, 0xff, 0x4e, 0x3c),
+    DEVICE_SLOT: (0x40, 0x00, 0x4e, 0x3c),
+}
+
+SAS_PROTOCOL = 0x6
+
+EnclosureDescriptor = collections.namedtuple("EnclosureDescriptor", [
+    "Subenclosure",
+    "Logical_Id",           # the enclosure's SAS address, lower case hex, no 0x
+    "Vendor",
+    "Product",
+    "Revision",
+])
+
+TypeHeader = collections.namedtuple("TypeHeader", [
+    "Type",                 # element type code
+    "Count",                # number of possible elements
+    "Subenclosure",
+    "Text",                 # type descriptor text, e.g. "ArrayDevicesInSubEnclsr0"
+])
+
+Configuration = collections.namedtuple("Configuration", [
+    "Generation",
+    "Enclosures",           # [ EnclosureDescriptor ], primary first
+    "Types",                # [ TypeHeader ] in the order every other page follows
+])
+
+StatusElement = collections.namedtuple("StatusElement", [
+    "Type",
+    "Index",                # among the elements of this type, None for the overall element
+    "Element_Index",        # among all individual elements, None for the overall element
+    "Subenclosure",
+    "Code",                 # element status code
+    "Status",               # ... as text
+    "Predicted_Failure",
+    "Disabled",
+    "Swap",
+    "Ident",                # locate LED, None where the type has no IDENT bit
+    "Fault",                # None where not decoded
+    "Device_Off",           # slots only
+    "Raw",                  # the 4 bytes
+])
+
+EnclosureStatus = collections.namedtuple("EnclosureStatus", [
+    "Generation",
+    "Invop",
+    "Info",
+    "Non_Critical",
+    "Critical",
+    "Unrecoverable",
+    "Elements",             # [ StatusElement ], overall elements included
+])
+
+ElementDescriptor = collections.namedtuple("ElementDescriptor", [
+    "Type",
+    "Index",
+    "Element_Index",
+    "Subenclosure",
+    "Text",
+])
+
+Phy = collections.namedtuple("Phy", [
+    "Phy_Id",
+    "Device_Type",          # 0 none, 1 end device, 2/3 expander
+    "Sas_Address",          # lower case hex, no 0x; None if zero
+    "Attached_Sas_Address",
+    "Sata",
+    "Initiator",            # SSP/STP/SMP initiator port bits
+    "Target",               # SSP/STP/SMP target port bits
+])
+
+AdditionalStatus = collections.namedtuple("AdditionalStatus", [
+    "Type",
+    "Index",
+    "Element_Index",
+    "Subenclosure",
+    "Protocol",             # SAS_PROTOCOL, ...
+    "Invalid",
+    "Slot_Number",          # device slot number, where reported
+    "Sas_Address",          # a slot's first phy, or an expander's own address
+    "Phys",                 # [ Phy ]
+    "Raw",
+])
+
+
+class SesError(Exception):
+    pass
+
+
+#############################################################################
+# SG_IO
+#############################################################################
+
+class _SgIoHdr(ctypes.Structure):
+    _fields_ = [
+        ("interface_id", ctypes.c_int),
+        ("dxfer_direction", ctypes.c_int),
+        ("cmd_len", ctypes.c_ubyte),
+        ("mx_sb_len", ctypes.c_ubyte),
+        ("iovec_count", ctypes.c_ushort),
+        ("dxfer_len", ctypes.c_uint),
+        ("dxferp", ctypes.c_void_p),
+        ("cmdp", ctypes.c_void_p),
+        ("sbp", ctypes.c_void_p),
+        ("timeout", ctypes.c_uint),
+        ("flags", ctypes.c_uint),
+        ("pack_id", ctypes.c_int),
+        ("usr_ptr", ctypes.c_void_p),
+        ("status", ctypes.c_ubyte),
+        ("masked_status", ctypes.c_ubyte),
+        ("msg_status", ctypes.c_ubyte),
+        ("sb_len_wr", ctypes.c_ubyte),
+        ("host_status", ctypes.c_ushort),
+        ("driver_status", ctypes.c_ushort),
+        ("resid", ctypes.c_int),
+        ("duration", ctypes.c_uint),
+        ("info", ctypes.c_uint),
+    ]
+
+
+def _sg_io(SG_Dev, Cdb, Direction, Buffer, Timeout):
+    """
+    Issue one SCSI command.  Returns the number of bytes transferred.
+    """
+
+    Cdb = ctypes.create_string_buffer(bytes(Cdb), len(Cdb))
+    Sense = ctypes.create_string_buffer(SENSE_LENGTH)
+
+    Hdr = _SgIoHdr()
+    Hdr.interface_id = SG_INTERFACE_ID
+    Hdr.dxfer_direction = Direction
+    Hdr.cmd_len = len(Cdb)
+    Hdr.mx_sb_len = SENSE_LENGTH
+    Hdr.dxfer_len = len(Buffer)
+    Hdr.dxferp = ctypes.addressof(Buffer)
+    Hdr.cmdp = ctypes.addressof(Cdb)
+    Hdr.sbp = ctypes.addressof(Sense)
+    Hdr.timeout = int(Timeout * 1000)
+
+    try:
+        Fd = os.open(SG_Dev, os.O_RDWR | os.O_NONBLOCK)
+    except OSError as e:
+        raise SesError(SG_Dev + ": " + e.strerror)
+
+    try:
+        fcntl.ioctl(Fd, SG_IO, Hdr)
+    except OSError as e:
+        raise SesError(SG_Dev + ": SG_IO: " + e.strerror)
+    finally:
+        os.close(Fd)
+
+    if Hdr.status or Hdr.host_status or (Hdr.driver_status & 0x0f):
+        Sense_Key = Sense.raw[2] & 0x0f if Hdr.sb_len_wr > 2 else None
+        raise SesError(SG_Dev + ": command 0x%02x failed: status 0x%x host 0x%x driver 0x%x sense key %s" %
+                       (Cdb.raw[0], Hdr.status, Hdr.host_status, Hdr.driver_status, Sense_Key))
+
+    return len(Buffer) - Hdr.resid
+
+
+def Receive_Diagnostic(SG_Dev, Page, Timeout=TIMEOUT):
+    """
+    Return diagnostic page Page of SG_Dev (RECEIVE DIAGNOSTIC RESULTS with
+    PCV=1) as bytes.  Raises SesError.
+    """
+
+    Buffer = ctypes.create_string_buffer(MAX_PAGE_LENGTH)
+    Cdb = [RECEIVE_DIAGNOSTIC_RESULTS, 0x01, Page, MAX_PAGE_LENGTH >> 8, MAX_PAGE_LENGTH & 0xff, 0]
+
+    Length = _sg_io(SG_Dev, Cdb, SG_DXFER_FROM_DEV, Buffer, Timeout)
+    Data = Buffer.raw[:Length]
+
+    if len(Data) < 4 or Data[0] != Page:
+        raise SesError(SG_Dev + ": no diagnostic page 0x%02x" % Page)
+
+    return Data[:4 + int.from_bytes(Data[2:4], "big")]
+
+
+def Send_Diagnostic(SG_Dev, Data, Timeout=TIMEOUT):
+    """
+    Send a diagnostic (control) page to SG_Dev (SEND DIAGNOSTIC with PF=1).
+    Raises SesError.
+    """
+
+    Buffer = ctypes.create_string_buffer(bytes(Data), len(Data))
+    Cdb = [SEND_DIAGNOSTIC, 0x10, 0, len(Data) >> 8, len(Data) & 0xff, 0]
+
+    _sg_io(SG_Dev, Cdb, SG_DXFER_TO_DEV, Buffer, Timeout)
+
+
+#############################################################################
+# Decoders
+#############################################################################
+
+def _hex(Data):
+
+    Value = Data.hex()
+    return Value if Value.strip("0") else None
+
+
+def _text(Data):
+    return Data.decode("ascii", "replace").strip("\x00 ")
+
+
+def _check(Data, Page):
+
+    if not Data or len(Data) < 8 or Data[0] != Page:
+        raise SesError("not a diagnostic page 0x%02x" % Page)
+
+    if len(Data) < 4 + int.from_bytes(Data[2:4], "big"):
+        raise SesError("diagnostic page 0x%02x is truncated" % Page)
+
+
+def Parse_Configuration(Data):
+    """
+    Decode a configuration page into a Configuration.
+    """
+
+    _check(Data, CONFIGURATION_PAGE)
+
+    Generation = int.from_bytes(Data[4:8], "big")
+
+    Enclosures = []
+    Offset = 8
+    Num_Types = 0
+
+    # One enclosure descriptor per subenclosure.  Byte 2 is the number of
+    # type headers it contributes, byte 3 the length of the rest of it.
+    for _ in range(Data[1] + 1):
+        if Offset + 4 > len(Data):
+            raise SesError("configuration page is truncated")
+        Descriptor = Data[Offset:Offset + 4 + Data[Offset + 3]]
+        Enclosures.append(EnclosureDescriptor(
+            Subenclosure=Descriptor[1],
+            Logical_Id=_hex(Descriptor[4:12]),
+            Vendor=_text(Descriptor[12:20]),
+            Product=_text(Descriptor[20:36]),
+            Revision=_text(Descriptor[36:40]),
+        ))
+        Num_Types += Descriptor[2]
+        Offset += len(Descriptor)
+
+    Types = []
+    Text_Offset = Offset + 4 * Num_Types
+
+    if Text_Offset > len(Data):
+        raise SesError("configuration page is truncated")
+
+    for i in range(Num_Types):
+        Type, Count, Subenclosure, Text_Length = Data[Offset:Offset + 4]
+        Types.append(TypeHeader(Type, Count, Subenclosure, _text(Data[Text_Offset:Text_Offset + Text_Length])))
+        Offset += 4
+        Text_Offset += Text_Length
+
+    return Configuration(Generation, Enclosures, Types)
+
+
+def _elements(Config):
+    """
+    Yield (TypeHeader, Index, Element_Index) for every element in page
+    order: each type's overall element (Index None) and then its
+    individual elements.
+    """
+
+    Element_Index = 0
+    for Header in Config.Types:
+        yield Header, None, None
+        for Index in range(Header.Count):
+            yield Header, Index, Element_Index
+            Element_Index += 1
+
+
+def _decode_status(Header, Index, Element_Index, Raw):
+
+    Type = Header.Type
+    Code = Raw[0] & 0x0f
+
+    Ident = Fault = Device_Off = None
+
+    if Type in SLOT_TYPES:
+        Ident = bool(Raw[2] & 0x02)
+        Fault = bool(Raw[3] & 0x60)
+        Device_Off = bool(Raw[3] & 0x10)
+    elif Type in _IDENT_BYTE1:
+        Ident = bool(Raw[1] & 0x80)
+        if Type in (POWER_SUPPLY, COOLING):
+            Fault = bool(Raw[3] & 0x40)
+
+    return StatusElement(
+        Type=Type,
+        Index=Index,
+        Element_Index=Element_Index,
+        Subenclosure=Header.Subenclosure,
+        Code=Code,
+        Status=STATUS_CODES[Code] if Code < len(STATUS_CODES) else "Reserved",
+        Predicted_Failure=bool(Raw[0] & 0x40),
+        Disabled=bool(Raw[0] & 0x20),
+        Swap=bool(Raw[0] & 0x10),
+        Ident=Ident,
+        Fault=Fault,
+        Device_Off=Device_Off,
+        Raw=bytes(Raw),
+    )
+
+
+def Parse_Status(Config, Data):
+    """
+    Decode an enclosure status page into an EnclosureStatus.
+    """
+
+    _check(Data, STATUS_PAGE)
+
+    Elements = []
+    Offset = 8
+
+    for Header, Index, Element_Index in _elements(Config):
+        if Offset + 4 > len(Data):
+            raise SesError("status page is shorter than the configuration says")
+        Elements.append(_decode_status(Header, Index, Element_Index, Data[Offset:Offset + 4]))
+        Offset += 4
+
+    return EnclosureStatus(
+        Generation=int.from_bytes(Data[4:8], "big"),
+        Invop=bool(Data[1] & 0x10),
+        Info=bool(Data[1] & 0x08),
+        Non_Critical=bool(Data[1] & 0x04),
+        Critical=bool(Data[1] & 0x02),
+        Unrecoverable=bool(Data[1] & 0x01),
+        Elements=Elements,
+    )
+
+
+def Parse_Element_Descriptors(Config, Data):
+    """
+    Decode an element descriptor page into [ ElementDescriptor ], overall
+    elements included.
+    """
+
+    _check(Data, ELEMENT_DESCRIPTOR_PAGE)
+
+    Descriptors = []
+    Offset = 8
+
+    for Header, Index, Element_Index in _elements(Config):
+        if Offset + 4 > len(Data):
+            break
+        Length = int.from_bytes(Data[Offset + 2:Offset + 4], "big")
+        Descriptors.append(ElementDescriptor(Header.Type, Index, Element_Index, Header.Subenclosure,
+                                             _text(Data[Offset + 4:Offset + 4 + Length])))
+        Offset += 4 + Length
+
+    return Descriptors
+
+
+def _parse_phy(Data):
+
+    return Phy(
+        Phy_Id=Data[20],
+        Device_Type=(Data[0] >> 4) & 0x07,
+        Sas_Address=_hex(Data[12:20]),
+        Attached_Sas_Address=_hex(Data[4:12]),
+        Sata=bool(Data[3] & 0x01),
+        Initiator=Data[2] & 0x0e,
+        Target=Data[3] & 0x0e,
+    )
+
+
+# Element types that have additional element status descriptors, for
+# descriptors that don't say which element they belong to
+_AES_TYPES = (DEVICE_SLOT, ESCE, 0x14, 0x15, ARRAY_DEVICE_SLOT, SAS_EXPANDER)
+
+
+def Parse_Additional_Status(Config, Data):
+    """
+    Decode an additional element status page into [ AdditionalStatus ].
+    Only SAS descriptors have their phys decoded.
+    """
+
+    _check(Data, ADDITIONAL_STATUS_PAGE)
+
+    Individual = [(Header, Index, Element_Index) for Header, Index, Element_Index in _elements(Config) if Index is not None]
+    With_Overall = list(_elements(Config))
+    Positional = iter([Element for Element in Individual if Element[0].Type in _AES_TYPES])
+
+    Result = []
+    Offset = 8
+    End = 4 + int.from_bytes(Data[2:4], "big")
+
+    while Offset + 2 <= End:
+
+        Descriptor = Data[Offset:Offset + 2 + Data[Offset + 1]]
+        Offset += len(Descriptor)
+
+        Invalid = bool(Descriptor[0] & 0x80)
+        Eip = bool(Descriptor[0] & 0x10)
+        Protocol = Descriptor[0] & 0x0f
+
+        # With EIP the descriptor names its element, counting overall
+        # elements too if EIIOE is set; without it they come in order.
+        if Eip and len(Descriptor) >= 4:
+            Table = With_Overall if Descriptor[2] & 0x01 else Individual
+            Element = Table[Descriptor[3]] if Descriptor[3] < len(Table) else None
+            Specific = Descriptor[4:]
+        else:
+            Element = next(Positional, None)
+            Specific = Descriptor[2:]
+
+        if Element is None or Element[1] is None:
+            logging.debug("ses:: additional element status descriptor for an unknown element")
+            continue
+
+        Header, Index, Element_Index = Element
+
+        Slot_Number = None
+        Sas_Address = None
+        Phys = []
+
+        if Protocol == SAS_PROTOCOL and len(Specific) >= 2:
+
+            Descriptor_Type = Specific[1] >> 6
+
+            if Descriptor_Type == 0:
+                # Device slot: with EIP there are two more bytes, the
+                # second being the slot number
+                if Eip:
+                    Slot_Number = Specific[3] if len(Specific) >= 4 else None
+                    Phy_Offset = 4
+                else:
+                    Phy_Offset = 2
+                for i in range(Specific[0]):
+                    Phy_Data = Specific[Phy_Offset + 28 * i:Phy_Offset + 28 * (i + 1)]
+                    if len(Phy_Data) == 28:
+                        Phys.append(_parse_phy(Phy_Data))
+                if Phys:
+                    Sas_Address = Phys[0].Sas_Address
+
+            elif Descriptor_Type == 1:
+                Sas_Address = _hex(Specific[4:12])
+
+        Result.append(AdditionalStatus(
+            Type=Header.Type,
+            Index=Index,
+            Element_Index=Element_Index,
+            Subenclosure=Header.Subenclosure,
+            Protocol=Protocol,
+            Invalid=Invalid,
+            Slot_Number=Slot_Number,
+            Sas_Address=Sas_Address,
+            Phys=Phys,
+            Raw=bytes(Descriptor),
+        ))
+
+    return Result
+
+
+#############################################################################
+# Enclosures
+#############################################################################
+
+_Replay_Dir = os.environ.get("SES_REPLAY_DIR") or None
+
+
+def Page_File(Directory, SG_Dev, Page):
+    return os.path.join(Directory, os.path.basename(SG_Dev) + ".%02x.bin" % Page)
+
+
+def Replay(Directory):
+    """
+    Read pages from files saved by Capture() in Directory from now on,
+    instead of asking the hardware.  Replay(None) switches back.
+    """
+
+    global _Replay_Dir
+
+    _Replay_Dir = Directory
+    with _Enclosures_Lock:
+        _Enclosures.clear()
+
+
+def Capture(SG_Dev, Directory, Pages=(CONFIGURATION_PAGE, STATUS_PAGE, ELEMENT_DESCRIPTOR_PAGE, ADDITIONAL_STATUS_PAGE)):
+    """
+    Save the given pages of SG_Dev in Directory for Replay().  Pages the
+    enclosure doesn't support are skipped.  Returns the files written.
+    """
+
+    os.makedirs(Directory, exist_ok=True)
+
+    Written = []
+    for Page in Pages:
+        try:
+            Data = Receive_Diagnostic(SG_Dev, Page)
+        except SesError as e:
+            logging.debug("Capture:: " + str(e))
+            continue
+        Path = Page_File(Directory, SG_Dev, Page)
+        with open(Path, "wb") as f:
+            f.write(Data)
+        Written.append(Path)
+
+    return Written
+
+
+class Enclosure(object):
+    """
+    One SES device.  Each page is read the first time it's needed and then
+    kept; refresh() forgets them.  Methods raise SesError.
+    """
+
+    def __init__(self, SG_Dev, Timeout=TIMEOUT, Replay_Dir=None):
+
+        self.SG_Dev = SG_Dev
+        self.Timeout = Timeout
+        self.Replay_Dir = Replay_Dir
+
+        self._lock = threading.RLock()
+        self._pages = {}
+        self._decoded = {}
+
+    def page(self, Page):
+        """
+        Return the raw bytes of a diagnostic page.
+        """
+
+        with self._lock:
+            if Page not in self._pages:
+                if self.Replay_Dir:
+                    try:
+                        with open(Page_File(self.Replay_Dir, self.SG_Dev, Page), "rb") as f:
+                            self._pages[Page] = f.read()
+                    except OSError as e:
+                        raise SesError(self.SG_Dev + ": no captured page 0x%02x: %s" % (Page, e.strerror))
+                else:
+                    self._pages[Page] = Receive_Diagnostic(self.SG_Dev, Page, self.Timeout)
+            return self._pages[Page]
+
+    def _decode(self, Page, Parse):
+
+        with self._lock:
+            if Page not in self._decoded:
+                if Page == CONFIGURATION_PAGE:
+                    self._decoded[Page] = Parse(self.page(Page))
+                else:
+                    self._decoded[Page] = Parse(self.configuration(), self.page(Page))
+            return self._decoded[Page]
+
+    def refresh(self):
+
+        with self._lock:
+            self._pages.clear()
+            self._decoded.clear()
+
+    def configuration(self):
+        return self._decode(CONFIGURATION_PAGE, Parse_Configuration)
+
+    def status(self):
+        return self._decode(STATUS_PAGE, Parse_Status)
+
+    def descriptors(self):
+        return self._decode(ELEMENT_DESCRIPTOR_PAGE, Parse_Element_Descriptors)
+
+    def additional_status(self):
+        return self._decode(ADDITIONAL_STATUS_PAGE, Parse_Additional_Status)
+
+    def logical_id(self):
+        """
+        The primary enclosure's logical identifier (its SAS address).
+        """
+
+        return self.configuration().Enclosures[0].Logical_Id
+
+    def slot_type(self):
+        """
+        The TypeHeader slots are counted in, or None.
+        """
+
+        for Header in self.configuration().Types:
+            if Header.Type in SLOT_TYPES:
+                return Header
+        return None
+
+    def _is_slot(self, Element):
+
+        Header = self.slot_type()
+        return Header is not None and Element.Index is not None and \
+            Element.Type == Header.Type and Element.Subenclosure == Header.Subenclosure
+
+    def num_slots(self):
+
+        Header = self.slot_type()
+        return Header.Count if Header else 0
+
+    def slots(self):
+        """
+        Return { slot: StatusElement } for every drive slot.
+        """
+
+        Slots = {}
+        for Element in self.status().Elements:
+            if self._is_slot(Element) and Element.Index not in Slots:
+                Slots[Element.Index] = Element
+        return Slots
+
+    def slot_additional_status(self):
+        """
+        Return { slot: AdditionalStatus } for every drive slot the
+        enclosure reports additional status for.
+        """
+
+        Slots = {}
+        for Element in self.additional_status():
+            if self._is_slot(Element) and Element.Index not in Slots:
+                Slots[Element.Index] = Element
+        return Slots
+
+    def locate_leds(self):
+        """
+        Return { slot: True/False } with the locate LED of every slot.
+        """
+
+        return dict((Slot, Element.Ident) for Slot, Element in self.slots().items())
+
+    def set_slot(self, Slot, Ident=None, Fault=None, Device_Off=None):
+        """
+        Turn a slot's locate LED, fault LED or power on/off (None leaves it
+        alone), like "sg_ses -I <slot> --set/--clear=ident|fault|devoff".
+        """
+
+        if self.Replay_Dir:
+            raise SesError(self.SG_Dev + ": can't change a replayed enclosure")
+
+        with self._lock:
+
+            Config = self.configuration()
+            Status = self.page(STATUS_PAGE)
+            Header = self.slot_type()
+
+            if Header is None or not 0 <= int(Slot) < Header.Count:
+                raise SesError(self.SG_Dev + ": no slot " + str(Slot))
+
+            Offset = 8
+            for Element_Header, Index, Element_Index in _elements(Config):
+                if Element_Header is Header and Index == int(Slot):
+                    break
+                Offset += 4
+
+            Control = bytearray(len(Status))
+            Control[0] = CONTROL_PAGE
+            Control[2:8] = Status[2:8]          # page length, expected generation code
+
+            Element = bytearray(a & m for a, m in zip(Status[Offset:Offset + 4], _CONTROL_MASK[Header.Type]))
+            Element[0] |= 0x80                  # SELECT
+
+            for Value, Byte, Bit in ((Ident, 2, 0x02), (Fault, 3, 0x20), (Device_Off, 3, 0x10)):
+                if Value is not None:
+                    Element[Byte] = (Element[Byte] | Bit) if Value else (Element[Byte] & ~Bit)
+
+            Control[Offset:Offset + 4] = Element
+
+            try:
+                Send_Diagnostic(self.SG_Dev, Control, self.Timeout)
+            finally:
+                # The status has changed (or the generation code was stale)
+                self.refresh()
+
+
+_Enclosures = {}
+_Enclosures_Lock = threading.Lock()
+
+
+def Get_Enclosure(SG_Dev):
+    """
+    The Enclosure for SG_Dev shared by everything in this run.
+    """
+
+    with _Enclosures_Lock:
+        if SG_Dev not in _Enclosures:
+            _Enclosures[SG_Dev] = Enclosure(SG_Dev, Replay_Dir=_Replay_Dir)
+        return _Enclosures[SG_Dev]
+
+
+def Locate_LEDs(SG_Dev):
+    """
+    Return { slot: True/False } with the locate LED of every slot of
+    enclosure SG_Dev, or None if it can't be read.
+    """
+
+    try:
+        return Get_Enclosure(SG_Dev).locate_leds()
+    except SesError as e:
+        logging.debug("Locate_LEDs:: " + str(e))
+        return None
@@ -5,44 +5,119 @@ import re
 import sys
 import time
 import math
-import threading
 import socket
+import argparse
+import collections
 
 from subprocess import Popen, PIPE, STDOUT, call, check_output
 from time import gmtime, strftime, sleep
 
-# Arrays for SysExec caching
-CacheDataArray = {}
-CacheTimeArray = {}
+from ridindex import Get_Rid_Index
+from smartjson import Smart_Record, SELF_TEST_ELEMENT_FAILED, SELF_TEST_READ_FAILED
+from storcli import Storcli_Drives, Drive_Errors
+from quarantine import Probe_Devices, TIMED_OUT, DEADLINE
+from sysexec import SysExec as _SysExec
 
 # Set "True" to print debugging info
 Print_Debug = False
 
-# Do we want to be "Picky" or "Practical".
-# "Picky" sets reporting thresholds to 0, so a single error will report a message
-# "Practical" sets reporting thresholds to minimize minor messages
-Reports = "Practical"
-#Reports = "Picky"
-
-if Reports == "Picky":
-	Thresh_197 = 0
-	Grown_Defect_Thresh = 0
-	Smart_Attribute_Thresh = 0
-	total_read_thresh = 0
-	total_write_thresh = 0
-	read_correction_thresh = 0
-	write_correction_thresh = 0
-	blocks_reassigned_thresh = 0
-
-elif Reports == "Practical":
-	Thresh_197 = 500
-	Grown_Defect_Thresh = 10
-	Smart_Attribute_Thresh = 10
-	total_read_thresh = 10
-	total_write_thresh = 10
-	read_correction_thresh = 10
-	write_correction_thresh = 10
-	blocks_reassigned_thresh = 2
+# Reporting thresholds, selected with --profile.
+# "picky" sets reporting thresholds to 0, so a single error will report a message
+# "practical" sets reporting thresholds to minimize minor messages
+PROFILES = {
+	"picky": {
+		"Thresh_197":               0,
+		"Grown_Defect_Thresh":      0,
+		"Smart_Attribute_Thresh":   0,
+		"total_read_thresh":        0,
+		"total_write_thresh":       0,
+		"read_correction_thresh":   0,
+		"write_correction_thresh":  0,
+		"blocks_reassigned_thresh": 0,
+	},
+	"practical": {
+		"Thresh_197":               500,
+		"Grown_Defect_Thresh":      10,
+		"Smart_Attribute_Thresh":   10,
+		"total_read_thresh":        10,
+		"total_write_thresh":       10,
+		"read_correction_thresh":   10,
+		"write_correction_thresh":  10,
+		"blocks_reassigned_thresh": 2,
+	},
+}
+
+DEFAULT_PROFILE = "practical"
+
+# The rules every drive is checked against.  Each rule is
+#
+#	( attribute, transport, model, field, comparator, threshold, message[, extra conditions] )
+#
+# attribute   SMART attribute id, "*" for every attribute, or None for a drive-level field
+# transport   "SATA", "SAS" or "*"
+# model       regex searched for in smartctl's model name (e.g. "INTEL SSDSA2M040G2GC"), or None
+# field       for attributes: value, worst, thresh, raw or delta (value - thresh);
+#             otherwise one of the drive-level fields built by Drive_Metrics()
+# threshold   a number/string, or the name of a threshold in the selected profile
+# message     printed for the drive; {value} (the first field's) and {threshold} are filled in,
+#             and so is any other field of the drive or attribute, e.g. {id} or {name}.
+#             None makes this a "skip" rule: a matching attribute is ignored by every other rule.
+# extra       more (field, comparator, threshold) conditions that must all hold too
+#
+# Rules on one attribute id only cost anything for drives that have that attribute.
+RULES = [
+
+	# This is a corner case where value, worst and thresh are all 0.  There's no good way
+	# to know if the drive is actually failing, or if this test is screwy.  Just skip.
+	( "*", "SATA", None, "value", "==", 0, None, [ ("worst", "==", 0), ("thresh", "==", 0) ] ),
+
+	# One Intel SSD model has a buggy 233 Media_Wearout_Indicator, so ignore that special case
+	( 233, "SATA", "SSDSA2M040G2GC", "value", "any", None, None ),
+
+	# If the drive has a size of 0 bytes, it's fubar
+	( None, "*", None, "size", "==", 0, "Disk size = 0 bytes, apparent media failure" ),
+
+	( None, "SATA", None, "inquiry_failed", "==", True, "failed smartctl inquiry" ),
+
+	# This is a drive with a large number of failed sectors that isn't yet failing SMART
+	( 197, "SATA", None, "raw", ">", "Thresh_197", "197 Current_Pending_Sector value over {threshold}" ),
+
+	# Don't report "9 Power_On_Hours" errors, we're gonna use them until they die...
+	( "*", "SATA", None, "delta", "<=", 0, "failing on SMART attribute {id} {name}", [ ("id", "!=", 9) ] ),
+	( "*", "SATA", None, "delta", "<", "Smart_Attribute_Thresh", "marginal on SMART attribute {id} {name}",
+		[ ("id", "!=", 9), ("delta", ">", 0), ("thresh", "<", 50) ] ),
+
+	( None, "SATA", None, "self_test", "==", SELF_TEST_READ_FAILED, "failing a read-element test." ),
+	( None, "SATA", None, "self_test", "==", SELF_TEST_ELEMENT_FAILED, "failing a test-element test." ),
+
+	( None, "SAS", None, "health_passed", "==", False, "non-OK smart status {health}" ),
+	( None, "SAS", None, "blocks_reassigned", ">", "blocks_reassigned_thresh", "Total New blocks reassigned = {value}" ),
+	( None, "SAS", None, "grown_defects", ">", 50, "critically-high number of defects ({value} defects)" ),
+	( None, "SAS", None, "grown_defects", ">", "Grown_Defect_Thresh", "non-zero number of defects ({value} defects)",
+		[ ("grown_defects", "<=", 50) ] ),
+
+	# This shows the error count due to non-medium problems like bad HBA, bad cable, etc.
+	# Disabled by default, but enable if you're trying to debug depots
+	#
+#	( None, "SAS", None, "non_medium_errors", ">", 0, "non-zero number of Non-medium errors ({value} errors)" ),
+
+	( None, "SAS", None, "mandatory_failed", "==", True, "failing mandatory SMART commands" ),
+	( None, "SAS", None, "read_uncorrected", ">", "total_read_thresh", "total read uncorrected errors > {threshold} ({value} errors)" ),
+	( None, "SAS", None, "read_algorithm", ">", "read_correction_thresh", "read correction algorithm invocations greater than > {threshold} ({value} invocations)" ),
+	( None, "SAS", None, "write_uncorrected", ">", "total_write_thresh", "total write uncorrected errors > {threshold} ({value} errors)" ),
+	( None, "SAS", None, "write_algorithm", ">", "write_correction_thresh", "write correction algorithm invocations greater than > {threshold} ({value} invocations)" ),
+	( None, "SAS", None, "segment_failed", "==", True, "SMART test failed in segment errors" ),
+]
+
+COMPARATORS = {
+	"==":  lambda a, b: a == b,
+	"!=":  lambda a, b: a != b,
+	">":   lambda a, b: a > b,
+	">=":  lambda a, b: a >= b,
+	"<":   lambda a, b: a < b,
+	"<=":  lambda a, b: a <= b,
+	"any": lambda a, b: True,
+}
 
 def Debug(text):
 
@@ -57,44 +132,19 @@ def Debug(text):
 def SysExec(cmd):
 
         """
-        Run the given command and return the output
+        Run the given command and return the output.  The scan takes a while on a full
+        depot, so keep smartctl output around for 60 seconds rather than the default.
         """
 
-        # Cache the output of the command for the given number of seconds
-        Cache_Expires = 60
-
-        # Computed once, used twice
-        Cache_Keys = list(CacheDataArray.keys())
-        if cmd in Cache_Keys:
-                Cache_Age  = time.time() - CacheTimeArray[cmd]
-        else:
-                Cache_Age  = 0
-
-        Return_Val = "ERROR"
-
-        # If we have valid data cached, return it
-        if cmd in Cache_Keys and Cache_Age < Cache_Expires:
-                Return_Val = CacheDataArray[cmd]
+        return _SysExec(cmd, ttl = 60)
 
-        # If the cmd is "cat", use fopen/fread/fclose to open it and
-        # cache it as we go
-        elif not cmd in Cache_Keys and cmd.split()[0] == "cat":
-                f = open(cmd.split()[1], "r")
-                CacheDataArray[cmd] = f.read()
-                CacheTimeArray[cmd] = time.time()
-                f.close()
-                Return_Val = CacheDataArray[cmd]
+def Smart(Dev):
 
-        # If we don't have cached data, or it's too old, regenerate it
-        elif not cmd in Cache_Keys or Cache_Age > Cache_Expires:
-                CacheDataArray[cmd] = Popen(cmd.split(), stdout=PIPE, stderr=STDOUT).communicate()[0]
-                CacheTimeArray[cmd] = time.time()
-                Return_Val = CacheDataArray[cmd]
-
-        if str(type(Return_Val)) == "<class 'bytes'>":
-                Return_Val = Return_Val.decode("utf-8")
+        """
+        Return the SmartRecord of Dev (one "smartctl -x --json"), cached the same way.
+        """
 
-        return(Return_Val)
+        return Smart_Record(Dev, ttl = 60)
 
 
 def ComputerFriendlyBytes(bytes, scale, units, optional_scale = None):
@@ -181,32 +231,16 @@ def findRawSize(SD_Device):
 	
 	if re.search("^/c", SD_Device):
 
-		f = SysExec("storcli64 " + SD_Device + " show all")
-
-		for l in f.splitlines():
-
-			if not re.search("^Raw", l):
-				continue
+		Drive = Storcli_Drives().get(SD_Device)
+		if Drive is not None and Drive.Size is not None:
+			return Drive.Size
 
-			size = l.split("=")[1].split("[")[0].strip().split(" ")
-			return ComputerFriendlyBytes(float(size[0]), 1024, size[1], 1000)
+		return 0
 
 
 def map_dev_to_rid():
 
-	Dict_Dev_to_Rid = {}
-
-	if os.path.isdir("/dev/disk/by-label"):
-
-		for line in os.listdir("/dev/disk/by-label"):
-			if not re.search("rid-data", line):
-				continue
-
-			rid = line.split("-")[2]
-			dev = os.path.realpath("/dev/disk/by-label/" + line)
-			dev = re.sub("[0-9]*$", "", dev)
-
-			Dict_Dev_to_Rid[dev] = rid
+	Dict_Dev_to_Rid = dict(Get_Rid_Index().disk_to_rid)
 
 	Debug("map_dev_to_rid():: map = " + str(Dict_Dev_to_Rid))
 
@@ -222,13 +256,6 @@ def findVendor(SD_Device):
 
 	return(vendor.strip())
 
-def findMBVendor():
-	file = "/sys/devices/virtual/dmi/id/board_vendor"
-	f = open(file, "r")
-	vendor = f.read()
-	f.close()
-	return(vendor.strip())
-
 def findModel(SD_Device):
 
 	file = "/sys/block/" + SD_Device.split("/")[-1] + "/device/model"
@@ -250,39 +277,82 @@ def findSerial(SD_Device):
 
 	return(serial.strip())
 
-def printDev(Dev, Str):
+# What printDev reports about a drive, gathered once per scan by Drive_Identities()
+DeviceIdentity = collections.namedtuple("DeviceIdentity", [ "Dev", "Vendor", "Model", "Serial", "Size", "Rid", "Host" ])
 
-	Debug("printDev::Dev = " + str(Dev))
-	Debug("printDev::Str = " + str(Str))
+Identities = {}
+
+def Drive_Identity(Dev, Dev_To_Rid, Host, Record = None):
+
+	"""
+	Build the DeviceIdentity of one drive.  Drives without the usual sysfs
+	files (NVMe, some SATA) fall back to what smartctl reported.
+	"""
+
+	def sysfs(find):
+		try:
+			return find(Dev)
+		except (OSError, UnicodeDecodeError):
+			return None
+
+	Vendor = sysfs(findVendor)
+	Model = sysfs(findModel)
+	Serial = sysfs(findSerial)
 
-	Vendor = findVendor(Dev)
-	Model = findModel(Dev)
-	Serial = findSerial(Dev)
+	if Record is not None:
+		Vendor = Vendor or Record.Vendor
+		Model = Model or Record.Model
+		Serial = Serial or Record.Serial
 
-	rid_dev_map = map_dev_to_rid()
+	Vendor = Vendor or ""
+	Model = Model or ""
+	Serial = Serial or ""
 
 	if Vendor == "SEAGATE":
 		Serial = Serial[0:8]
 
-	Ridstr = ""
-	if Dev in rid_dev_map:
-		Rid = rid_dev_map[Dev]
-		Ridstr = str(Rid)
+	Rid = str(Dev_To_Rid[Dev]) if Dev in Dev_To_Rid else ""
+
+	return DeviceIdentity(Dev, Vendor, Model, Serial, findRawSize(Dev), Rid, Host)
+
+
+def Drive_Identities(Devs, Records = None):
+
+	"""
+	Build the DeviceIdentity of every drive in Devs, with one RID map and one
+	hostname lookup for the whole scan.  Records optionally maps Dev -> SmartRecord.
+	"""
+
+	Dev_To_Rid = map_dev_to_rid()
+	Host = socket.gethostname()
+
+	return dict((Dev, Drive_Identity(Dev, Dev_To_Rid, Host, (Records or {}).get(Dev))) for Dev in Devs)
+
+
+def printDev(Dev, Str):
 
-	Size = HumanFriendlyBytes(findRawSize(Dev), 1000, 0)
+	Debug("printDev::Dev = " + str(Dev))
+	Debug("printDev::Str = " + str(Str))
+
+	if Dev not in Identities:
+		Identities.update(Drive_Identities([ Dev ]))
+
+	Id = Identities[Dev]
+
+	Size = HumanFriendlyBytes(Id.Size, 1000, 0)
 	Size = re.sub("\\.0", "", Size)
 	Size = re.sub(" ", "", Size)
 
-	print('{:20s}|{:4s}|{:15s}|{:7s}|{:2s}|{:22s}|{:4s}|{:30s}' . format(socket.gethostname(), Ridstr, Serial, " ", " ", Vendor + " " + Model, Size, Str))
+	print('{:20s}|{:4s}|{:15s}|{:7s}|{:2s}|{:22s}|{:4s}|{:30s}' . format(Id.Host, Id.Rid, Id.Serial, " ", " ", Id.Vendor + " " + Id.Model, Size, Str))
 
 
-def printDevVirt_storcli(Dev, Vendor, Model, Serial, Str):
+def printDevVirt_storcli(Dev, Vendor, Model, Serial, Bytes, Str):
 
 	if Vendor == "SEAGATE":
 		if Serial:
 			Serial = Serial[0:8]
 
-	Size = HumanFriendlyBytes(findRawSize(Dev), 1000, 0)
+	Size = HumanFriendlyBytes(Bytes, 1000, 0)
 	Size = re.sub("\\.0", "", Size)
 	Size = re.sub(" ", "", Size)
 
@@ -341,344 +411,249 @@ def Get_SASController():
 def get_errors_from_storcli():
 
 	"""
-	Return a reduced output of errors found for any virtual disks attached
-	to a LSI controller that uses storcli64
+	Report the error counters of any drives attached to a LSI controller that
+	uses storcli64 (or perccli64), from one "show all J" of every controller.
 	"""
 
-	if re.search("Dell", findMBVendor()):
-		STORCLI_Bin = "/opt/MegaRAID/perccli/perccli64"
-	else:
-		STORCLI_Bin = "storcli64"
-
-	Debug("get_errors_from_storcli():: STORCLI_Bin = " + str(STORCLI_Bin))
-
-	output = SysExec(STORCLI_Bin + " /cALL/eALL/sALL show all")
-
-	for line in output.splitlines():
-
-		if not re.search("^Drive|Shield Counter|Error Count|Failure Count|S.M.A.R.T.|^SN|^Manufacturer|^Model", line):
-			continue
-
-		if re.search("Drive position|Policies/Settings|Device attributes|Detailed Information|State|Temperature", line):
-			continue
-
-		# If we have Drive (first line) and Model (last line), assume we've completed one pass through
-		if "Drive" in locals() and "Model" in locals():
-			if Drive is not None and Model is not None:
-
-				Debug(str(Drive) + " " + str(Vendor) + " " + str(Model) + " " + str(Serial) + " " + str(Shield_Counter) + " " + str(Media_Error_Count) + " " + str(Other_Error_Count) + " " + str(Predictive_Failure_Count) + " " + str(SMART_alert))
-
-				if Shield_Counter != 0 and Shield_Counter != "N/A":
-					printDevVirt_storcli(Drive, Vendor, Model, Serial, "Shield Counter = " + str(Shield_Counter))
-				Shield_Counter = None
-
-				if Media_Error_Count != 0 and Media_Error_Count != "N/A":
-					printDevVirt_storcli(Drive, Vendor, Model, Serial, "Media Error Count = " + str(Media_Error_Count))
-				Media_Error_Count = None
-
-				if Other_Error_Count != 0 and Other_Error_Count != "N/A":
-					printDevVirt_storcli(Drive, Vendor, Model, Serial, "Other Error Count = " + str(Other_Error_Count))
-				Other_Error_Count = None
-
-				if Predictive_Failure_Count != 0 and Predictive_Failure_Count != "N/A":
-					printDevVirt_storcli(Drive, Vendor, Model, Serial, "Predictive Failure Count = " + str(Predictive_Failure_Count))
-				Predictive_Failure_Count = None
-
-				if SMART_alert != "No" and SMART_alert != "N/A":
-					printDevVirt_storcli(Drive, Vendor, Model, Serial, "SMART alert flagged by drive = " + str(SMART_alert))
-				SMART_alert = None
+	Drives = Storcli_Drives()
 
-				Drive = None
-				Serial = None
-				Vendor = None
-				Model = None
+	Debug("get_errors_from_storcli():: " + str(len(Drives)) + " drives")
 
-		if re.search("Drive", line):
-			Drive = line.split()[1]
+	for Drive in Drives.values():
 
-		if re.search("Shield Counter", line):
-			if re.search("N/A", line):
-				Shield_Counter = "N/A"
-			else:
-				Shield_Counter = int(line.split("=")[1].strip())
+		Debug(str(Drive.Path) + " " + str(Drive.Vendor) + " " + str(Drive.Model) + " " + str(Drive.Serial) + " " + str(Drive_Errors(Drive)))
 
-		if re.search("Media Error Count", line):
-			if re.search("N/A", line):
-				Media_Error_Count = "N/A"
-			else:
-				Media_Error_Count = int(line.split("=")[1].strip())
-
-		if re.search("Other Error Count", line):
-			if re.search("N/A", line):
-				Other_Error_Count = "N/A"
-			else:
-				Other_Error_Count = int(line.split("=")[1].strip())
-
-		if re.search("Predictive Failure Count", line):
-			if re.search("N/A", line):
-				Predictive_Failure_Count = "N/A"
-			else:
-				Predictive_Failure_Count = int(line.split("=")[1].strip())
-
-		if re.search("S.M.A.R.T alert flagged by drive", line):
-			SMART_alert = line.split("=")[1].strip()
-
-		if re.search("^SN", line):
-			Serial = line.split("=")[1].strip()
-
-		if re.search("^Manufacturer", line):
-			Vendor = line.split("=")[1].strip()
-
-		if re.search("^Model Number", line):
-			Model = line.split("=")[1].strip()
+		for Name, Value in Drive_Errors(Drive):
+			printDevVirt_storcli(Drive.Path, Drive.Vendor or "", Drive.Model or "", Drive.Serial or "", Drive.Size or 0, Name + " = " + str(Value))
 
 
 
 ################################################################################
-# Main()::
+# Rules engine
 ################################################################################
 
-# Get a list of block devices
-Devs = []
-Output = os.listdir("/sys/block")
-for line in Output:
+Rule = collections.namedtuple("Rule", [ "Attribute", "Transport", "Model", "Conditions", "Message" ])
 
-	# Skip various non-block devices
-	if re.search("^loop|^ram|^dm|^zram|^md|^zd|^sr", line):
-		continue
+def Compile_Rules(Rules, Profile):
 
-	Devs.append("/dev/" + line)
+	"""
+	Resolve profile thresholds and comparators once, and index the rules by
+	transport and attribute so a drive is only checked against rules that can
+	apply to it.  Returns { transport: { "skip": {id: [Rule]}, "attr": {id: [Rule]}, "drive": [Rule] } },
+	where transport "*" holds the rules for every transport and id "*" the
+	rules for every attribute.
+	"""
 
-Debug("Block devices found: " + str(Devs))
+	Compiled = {}
 
-# SysExec() caches the output of all commands it runs.  Run "smartctl -a " on
-# all drives in parallel then wait for them to complete to speed up access later
-jobs = []
-for Dev in Devs:
-	Debug("Spawning SysExec 'sudo smartctl -x' process on Dev " + Dev)
-	p = threading.Thread(target = SysExec, args = ("sudo smartctl -x " + Dev, ))
-	jobs.append(p)
-	p.start()
+	for Entry in Rules:
 
-Debug("Waiting for SysExec() jobs to complete...")
-for job in jobs:
-	job.join(30)
+		Attribute, Transport, Model, Field, Comparator, Threshold, Message = Entry[:7]
+		Extra = Entry[7] if len(Entry) > 7 else []
 
-# Determine the drive transport (SAS, SAS, NVME, Virtual) for each disk
-Drive_Transport = {}
-for Dev in Devs:
+		Conditions = []
+		for F, C, T in [ (Field, Comparator, Threshold) ] + list(Extra):
+			if isinstance(T, str) and T in Profile:
+				T = Profile[T]
+			Conditions.append((F, COMPARATORS[C], T))
 
-	HD_Size  = findRawSize(Dev)
-	HD_Model = findModel(Dev)
-	HD_Capacity = HumanFriendlyBytes(HD_Size, 1000, 0)
+		r = Rule(Attribute, Transport, re.compile(Model) if Model else None, Conditions, Message)
 
-	# If the drive has a size of 0 bytes, it's fubar
-	if HD_Size == 0:
-		printDev(Dev, "Disk size = 0 bytes, apparent media failure")
+		Table = Compiled.setdefault(Transport, { "skip": {}, "attr": {}, "drive": [] })
+		if Attribute is None:
+			Table["drive"].append(r)
+		else:
+			Table["skip" if Message is None else "attr"].setdefault(Attribute, []).append(r)
 
-	# Find out if the drive is SATA or SAS
-	Drive_Transport[Dev] = "SATA"   # By default
-	for line in SysExec("sudo smartctl -x " + Dev).splitlines():
+	return Compiled
 
 
-		# Dell firmware is a lying SOB...
-		if re.search("PERC", line):
-			Drive_Transport[Dev] = "Virtual"
-			break
+def Drive_Metrics(Identity, Record):
 
-		if re.search("DELL or MegaRaid controller, please try adding", line):
-			Drive_Transport[Dev] = "Virtual"
-			break
+	"""
+	Flatten a drive's DeviceIdentity and SmartRecord into the drive-level fields the rules use.  Fields
+	the drive didn't report are None, and rules on them never fire.
+	"""
 
-		# This line appears to be standard on SAS drives
-		if re.search("Transport protocol", line) and re.search("SAS", line):
-			Drive_Transport[Dev] = "SAS"
-			break
+	Read = Record.Error_Counters.get("read")
+	Write = Record.Error_Counters.get("write")
 
-		# Detect NVME flash drives
-		if re.search(" NVM ", line):
-			Drive_Transport[Dev] = "NVME"
-			break
+	return {
+		"size":              Identity.Size,
+		"inquiry_failed":    not Record.Ok or any(re.search("INQUIRY failed", m) for m in Record.Messages),
+		"self_test":         Record.Self_Test.Value >> 4 if Record.Self_Test is not None and Record.Self_Test.Value is not None else None,
+		"health":            Record.Health_Status,
+		"health_passed":     Record.Health_Passed,
+		"blocks_reassigned": Record.Blocks_Reassigned,
+		"grown_defects":     Record.Grown_Defects,
+		"non_medium_errors": Record.Non_Medium_Errors,
+		"mandatory_failed":  any(re.search("A mandatory SMART command failed", m) for m in Record.Messages),
+		"read_uncorrected":  Read.Total_Uncorrected if Read else None,
+		"read_algorithm":    Read.Algorithm_Invocations if Read else None,
+		"write_uncorrected": Write.Total_Uncorrected if Write else None,
+		"write_algorithm":   Write.Algorithm_Invocations if Write else None,
+		"segment_failed":    any(Entry.Result_String and re.search("Failed in segment", Entry.Result_String) for Entry in Record.Self_Test_Log),
+	}
 
-		# Used by the virtual disks exported by our LSI HBA's
-		if re.search("Vendor:", line) and re.search("AVAGO", line):
-			Drive_Transport[Dev] = "Virtual"
-			break
 
-#	Debug("Drive transport for " + Dev + " is " + Drive_Transport[Dev])
-# Debug("Drive_Transports = " + str(Drive_Transport))
+def Attribute_Metrics(Attr):
 
-# Start iterating over Devs and searching for errors
-smart_attributes_headers = [ "id", "attribute_name", "flags", "value", "worst", "thresh", "fail", "raw_value" ]
+	return {
+		"id":     Attr.Id,
+		"name":   Attr.Name,
+		"value":  Attr.Value,
+		"worst":  Attr.Worst,
+		"thresh": Attr.Thresh,
+		"raw":    Attr.Raw,
+		"delta":  Attr.Value - Attr.Thresh if Attr.Value is not None and Attr.Thresh is not None else None,
+	}
 
-# Report any virtual drives, then remove any drives whose Drive_Transport == "Virtual" from Devs:
-if "Virtual" in Drive_Transport.values():
 
-	Debug("Virtual disks detected")
-	SAS_Controller = Get_SASController()
-	Debug("SAS_Controller = " + str(SAS_Controller))
+def Matches(r, Model, Metrics):
 
-	if "LSI_Invader" in SAS_Controller or "LSI_Trimode" in SAS_Controller or "LSI_Thunderbolt" in SAS_Controller:
-		get_errors_from_storcli()
+	if r.Model is not None and not r.Model.search(Model or ""):
+		return False
 
+	for Field, Compare, Threshold in r.Conditions:
+		Value = Metrics.get(Field)
+		if Value is None:
+			return False
+		if not Compare(Value, Threshold):
+			return False
 
-for Dev in Devs:
+	return True
 
-	Debug("Scanning drive " + str(Dev) + "...")
 
-	Debug("Drive Transport for " + str(Dev) + " is " + str(Drive_Transport[Dev]))
+def Format_Message(r, Metrics):
 
-	if Drive_Transport[Dev] == "SATA":
+	Field, Compare, Threshold = r.Conditions[0]
+	Values = collections.defaultdict(lambda: None, Metrics, value = Metrics.get(Field), threshold = Threshold)
+	return r.Message.format_map(Values)
 
-		# Pass 1:  SMART attribute values
-		for line in SysExec("sudo smartctl -x " + Dev).splitlines():
 
-			line = line.strip() # Remove leading spaces
+def Evaluate(Compiled, Transport, Identity, Record):
 
-			Debug("line = " + str(line))
+	"""
+	Check one drive against the compiled rules and return the messages to report.
+	"""
 
-			if re.search("INQUIRY failed", line):
-				printDev(Dev, "failed smartctl inquiry")
-				continue
+	Tables = [ Compiled[t] for t in ("*", Transport) if t in Compiled ]
 
-			# SMART attribute lines all start with numbers (after stripping leading spaces)
-			if not re.search("^[0-9]", line):
-				continue
-			# ...but other unwanted lines also start with numbers, so filter them out
-			if re.search("^0x", line):
-				continue
+	Messages = []
+	Model = Record.Model
 
-			if re.search("[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]", line):
-				continue
+	Metrics = Drive_Metrics(Identity, Record)
+	for Table in Tables:
+		for r in Table["drive"]:
+			if Matches(r, Model, Metrics):
+				Messages.append(Format_Message(r, Metrics))
 
-			if re.search("Not_testing|Read_scanning|% of test|failed self-tests are outdated", line):
-				continue
+	Skips = {}
+	Rules = {}
+	for Table in Tables:
+		for Id, r in Table["skip"].items():
+			Skips.setdefault(Id, []).extend(r)
+		for Id, r in Table["attr"].items():
+			Rules.setdefault(Id, []).extend(r)
 
-			if re.search("[0-9a-f][0-9a-f] [0-9a-f][0-9a-f] [0-9a-f][0-9a-f]", line):
-				continue
+	All_Skips = Skips.get("*", [])
+	All_Rules = Rules.get("*", [])
 
-			# At this point, the only thing left should be actual SMART attributes, so pluck them out
-			smart_attributes = dict(zip(smart_attributes_headers, line.split()))
-#			Debug("Dev " + Dev + " smart_attributes = " + str(smart_attributes))
+	for Attr in Record.Attributes.values():
 
-			# This is a corner case where value, worst and thresh are all 0.  Just ignore
-			if smart_attributes["value"] == "000" and smart_attributes["worst"] == "000" and smart_attributes["thresh"] == "000":
-				# There's no good way to know if the drive is actually failing, or if this test is screwy.  Just skip.
-				continue
+		Metrics = Attribute_Metrics(Attr)
 
-			# One Intel SSD model has a buggy 233 Media_Wearout_Indicator, so ignore that special case
-			if smart_attributes["id"] == "233" and findModel(Dev) == "SSDSA2M040G2GC":
-				continue
+		if any(Matches(r, Model, Metrics) for r in Skips.get(Attr.Id, []) + All_Skips):
+			continue
 
-			# Now test for bad drives
+		for r in Rules.get(Attr.Id, []) + All_Rules:
+			if Matches(r, Model, Metrics):
+				Messages.append(Format_Message(r, Metrics))
 
-			# This is a drive with a large number of failed sectors that isn't yet failing SMART
-			if smart_attributes["id"] == "197":
-				if int(smart_attributes["raw_value"]) > Thresh_197:
-					printDev(Dev, "197 Current_Pending_Sector value over " + str(Thresh_197))
+	return Messages
 
-			# Don't report "9 Power_On_Hours" errors, we're gonna use them until they die...
-			if smart_attributes["id"] == "9":
-				continue
 
-			if not smart_attributes["value"].isnumeric():
-				printDev(Dev, "value is not numeric: ", smart_attributes["value"])
+################################################################################
+# Main()::
+################################################################################
 
-			if not smart_attributes["thresh"].isnumeric():
-				printDev(Dev, "thresh is not numeric: ", smart_attributes["thresh"])
+def main(argv = None):
 
-			Delta = int(smart_attributes["value"]) - int(smart_attributes["thresh"])
+	global Print_Debug
 
-			if Delta <= 0:
-				printDev(Dev, "failing on SMART attribute " + smart_attributes["id"] + " " + smart_attributes["attribute_name"])
+	parser = argparse.ArgumentParser(description = ' - Report drives in this depot that are failing or likely to fail')
+	parser.add_argument('--profile', choices = sorted(PROFILES), default = DEFAULT_PROFILE, help = 'Reporting thresholds to use (default: ' + DEFAULT_PROFILE + ')')
+	parser.add_argument('--timeout', metavar = '<seconds>', type = float, default = DEADLINE, help = 'Skip and quarantine a drive whose smartctl takes longer than this (default: ' + str(DEADLINE) + ')')
+	parser.add_argument('--debug', action = 'store_true', help = 'Print debugging info')
 
-			if Delta < Smart_Attribute_Thresh and Delta > 0 and int(smart_attributes["thresh"]) < 50:
-				printDev(Dev, "marginal on SMART attribute " + smart_attributes["id"] + " " + smart_attributes["attribute_name"])
+	args = parser.parse_args(argv)
 
+	if args.debug:
+		Print_Debug = True
 
-		# Pass 2:  Scan smartctl output for "Self-test execution status:"
-		out_array = enumerate(SysExec("sudo smartctl -x " + Dev).splitlines())
-		for i, line in out_array:
-			if re.search("Self-test execution status:", line):
-				msg = line.split(")")[1]
-				msg_finished = False
-				while not msg_finished:
-					line = next(out_array)[1]
-					if re.search("^[a-zA-Z]", line):
-						msg_finished = True
-						msg = ' '.join(msg.split())
-					else:
-						msg = msg + line
+	Compiled = Compile_Rules(RULES, PROFILES[args.profile])
 
-				Debug("Self-test execution status: " + msg)
+	# Get a list of block devices
+	Devs = []
+	Output = os.listdir("/sys/block")
+	for line in Output:
 
-				if re.search("The previous self-test completed having the read element of the test failed", msg):
-					printDev(Dev, "failing a read-element test.")
+		# Skip various non-block devices
+		if re.search("^loop|^ram|^dm|^zram|^md|^zd|^sr", line):
+			continue
 
-				if re.search("The previous self-test completed having a test element that failed", msg):
-					printDev(Dev, "failing a test-element test.")
+		Devs.append("/dev/" + line)
 
+	Debug("Block devices found: " + str(Devs))
 
-	elif Drive_Transport[Dev] == "SAS":
+	# Smart() caches the output of all commands it runs.  Run "smartctl -x --json" on
+	# all drives in parallel to speed up access later.  A drive that hangs past the
+	# deadline is quarantined, and it and any drive already in quarantine are skipped
+	# so they can't stall this run (or the next few).
+	Debug("Running 'sudo smartctl -x --json' on all drives...")
+	Records, Unavailable = Probe_Devices(Devs, Smart, Workers = max(1, len(Devs)), Deadline = args.timeout, What = "smartctl")
 
-		Defects = 0
-		Non_Medium_Errors = 0
-		Smart_Failing_Cmd = 0
+	# Everything printDev reports about each drive, looked up once for the scan
+	Identities.update(Drive_Identities(Devs, dict((Dev, Record) for Dev, Record in Records.items() if not isinstance(Record, Exception))))
 
-		for line in SysExec("sudo smartctl -x " + Dev).splitlines():
+	for Dev in Devs:
+		if Unavailable.get(Dev) == TIMED_OUT:
+			printDev(Dev, "smartctl timed out after " + "%g" % args.timeout + "s, quarantined")
+		elif Dev in Unavailable:
+			printDev(Dev, "quarantined after a smartctl timeout, skipped")
 
-			if re.search("^SMART Health Status:", line):
-				smart_health_status = line.split(":")[1].strip()
-				if smart_health_status != "OK":
-					printDev(Dev, "non-OK smart status " + smart_health_status)
+	Devs = [ Dev for Dev in Devs if Dev in Records and not isinstance(Records[Dev], Exception) ]
 
-			if re.search("^Total new blocks reassigned", line):
-				blocks_reassigned = re.sub("Total new blocks reassigned", "", line)
-				blocks_reassigned = re.sub("<not available>", "0", blocks_reassigned)
-				blocks_reassigned = re.sub("=", "", blocks_reassigned)
-				blocks_reassigned = int(blocks_reassigned.strip())
-				if blocks_reassigned > blocks_reassigned_thresh:
-					printDev(Dev, "Total New blocks reassigned = " + str(blocks_reassigned))
+	# Determine the drive transport (SAS, SAS, NVME, Virtual) for each disk
+	Drive_Transport = {}
+	for Dev in Devs:
 
-			if re.search("Elements in grown defect list", line):
-				Defects = int(line.split(":")[1].strip())
+		# Find out if the drive is SATA or SAS
+		Drive_Transport[Dev] = "SATA"   # By default
+		if Records[Dev].Protocol in ("SAS", "NVME", "Virtual"):
+			Drive_Transport[Dev] = Records[Dev].Protocol
 
-				if Defects > 50:
-					printDev(Dev, "critically-high number of defects (" + str(Defects) + " defects)")
-				elif Defects > Grown_Defect_Thresh and Defects <= 50:
-					printDev(Dev, "non-zero number of defects (" + str(Defects) + " defects)")
+	Debug("Drive_Transports = " + str(Drive_Transport))
 
-			# This shows the error count due to non-medium problems like bad HBA, bad cable, etc.
-			# Disabled by default, but enable if you're trying to debug depots
-			#
-#			if re.search("^Non-medium error count", line):
-#				Non_Medium_Errors = int(line.split(":")[1].strip())
-#				if Non_Medium_Errors > 0:
-#					printDev(Dev, "non-zero number of Non-medium errors (" + str(Non_Medium_Errors) + " errors)")
+	# Report any virtual drives through the controller instead
+	if "Virtual" in Drive_Transport.values():
 
-			if re.search("A mandatory SMART command failed", line):
-				printDev(Dev, "failing mandatory SMART commands")
+		Debug("Virtual disks detected")
+		SAS_Controller = Get_SASController()
+		Debug("SAS_Controller = " + str(SAS_Controller))
 
-			if re.search("^read:", line):
-				total_read_uncorrected_errors = int(line.split()[-1])
+		if "LSI_Invader" in SAS_Controller or "LSI_Trimode" in SAS_Controller or "LSI_Thunderbolt" in SAS_Controller:
+			get_errors_from_storcli()
 
-				if total_read_uncorrected_errors > total_read_thresh:
-					printDev(Dev, "total read uncorrected errors > " + str(total_read_thresh) + " (" + str(total_read_uncorrected_errors) + " errors)")
+	for Dev in Devs:
 
-				read_correction_algorithm_invocations = int(line.split()[-3])
-				if read_correction_algorithm_invocations > read_correction_thresh:
-					printDev(Dev, "read correction algorithm invocations greater than > " + str(read_correction_thresh) + " (" + str(read_correction_algorithm_invocations) + " invocations)")
+		Debug("Scanning drive " + str(Dev) + "...")
 
-			if re.search("^write:", line):
-				total_write_uncorrected_errors = int(line.split()[-1])
+		Debug("Drive Transport for " + str(Dev) + " is " + str(Drive_Transport[Dev]))
 
-				if total_write_uncorrected_errors > total_write_thresh:
-					printDev(Dev, "total write uncorrected errors > " + str(total_write_thresh) + " (" + str(total_write_uncorrected_errors) + " errors)")
+		for Message in Evaluate(Compiled, Drive_Transport[Dev], Identities[Dev], Records[Dev]):
+			printDev(Dev, Message)
 
-				write_correction_algorithm_invocations = int(line.split()[-3])
-				if write_correction_algorithm_invocations > write_correction_thresh:
-					printDev(Dev, "write correction algorithm invocations greater than > " + str(write_correction_thresh) + " (" + str(write_correction_algorithm_invocations) + " invocations)")
 
-			if re.search("Failed in segment", line) and not "smart_segment" in globals():
-				printDev(Dev, "SMART test failed in segment errors")
-				smart_segment = True
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+
+"""
+smarthist - A compact per-drive history of SMART attributes.
+
+log_smart_attributes.sh used to append a text line per attribute per drive
+per hour to one CSV that grows forever; asking "how has 5 Reallocated_Sector_Ct
+moved on every drive since March" meant reading and splitting all of it.
+
+SmartHistory keeps one directory per drive, keyed by WWN (or serial when the
+drive doesn't report one) so the history follows the drive rather than the
+slot or /dev name, and one file per attribute in that directory:
+
+    <root>/<drive>/meta.json        serial, wwn, model, last host/rid/dev, attribute names
+    <root>/<drive>/<id>.smh         the samples of attribute <id>
+
+A .smh file is a sequence of blocks.  Each block is a small header followed
+by its columns, stored one after the other:
+
+    "SMHB" <count:u32>  ts[count]:u32  value[count]:u16  worst[count]:u16  raw[count]:i64
+
+Recording a sample appends a one-row block (24 bytes of data), so writers
+never rewrite anything.  compact(), run daily from cron, merges all the
+blocks of a file into one, downsamples anything older than Hourly_Days to one
+sample per day and drops anything older than Retention_Days.  Reads load
+whole columns with array.frombytes() and binary-search the timestamps, so a
+query over a year of hourly samples for every drive in a depot takes
+milliseconds.
+"""
+
+import array
+import bisect
+import collections
+import fcntl
+import json
+import os
+import re
+import struct
+import sys
+import time
+
+HISTORY_DIR = "/var/lib/depot-tools/smart"
+
+# Keep hourly samples this long, then one a day until Retention_Days.
+HOURLY_DAYS = 90
+RETENTION_DAYS = 5 * 365
+
+_BLOCK_MAGIC = b"SMHB"
+_BLOCK_HEADER = struct.Struct("<4sI")
+
+# (typecode, bytes per item) of each column, in file order
+_COLUMNS = (("I", 4), ("H", 2), ("H", 2), ("q", 8))
+_ROW_SIZE = sum(Size for _, Size in _COLUMNS)
+
+Series = collections.namedtuple("Series", ["Times", "Values", "Worsts", "Raws"])
+
+
+def _new_column(Typecode, Size):
+
+    Column = array.array(Typecode)
+    if Column.itemsize != Size:
+        # 'I' is 4 bytes and 'q' 8 everywhere we run, but check anyway
+        raise RuntimeError("array('" + Typecode + "') is " + str(Column.itemsize) + " bytes, expected " + str(Size))
+    return Column
+
+
+def _empty_series():
+    return Series(*[_new_column(t, s) for t, s in _COLUMNS])
+
+
+def _clamp(Value, Low, High):
+
+    if Value is None:
+        return 0
+    return max(Low, min(High, int(Value)))
+
+
+def _encode_block(Rows):
+    """
+    Rows is a list of (ts, value, worst, raw) tuples.
+    """
+
+    Columns = [_new_column(t, s) for t, s in _COLUMNS]
+    for Row in Rows:
+        for Column, Item in zip(Columns, Row):
+            Column.append(Item)
+
+    if sys.byteorder != "little":
+        for Column in Columns:
+            Column.byteswap()
+
+    return _BLOCK_HEADER.pack(_BLOCK_MAGIC, len(Rows)) + b"".join(Column.tobytes() for Column in Columns)
+
+
+def _read_series(Path):
+    """
+    Load every block of Path into one Series, sorted by time.
+    """
+
+    Result = _empty_series()
+
+    try:
+        with open(Path, "rb") as f:
+            Data = f.read()
+    except FileNotFoundError:
+        return Result
+
+    Offset = 0
+    Sorted = True
+
+    while Offset + _BLOCK_HEADER.size <= len(Data):
+
+        Magic, Count = _BLOCK_HEADER.unpack_from(Data, Offset)
+        End = Offset + _BLOCK_HEADER.size + Count * _ROW_SIZE
+
+        # A torn write at the end of the file; ignore it
+        if Magic != _BLOCK_MAGIC or End > len(Data):
+            break
+
+        Offset += _BLOCK_HEADER.size
+
+        First = len(Result.Times)
+        for Column, (Typecode, Size) in zip(Result, _COLUMNS):
+            Part = _new_column(Typecode, Size)
+            Part.frombytes(Data[Offset:Offset + Count * Size])
+            if sys.byteorder != "little":
+                Part.byteswap()
+            Column.extend(Part)
+            Offset += Count * Size
+
+        if First and Count and Result.Times[First] < Result.Times[First - 1]:
+            Sorted = False
+
+    if not Sorted:
+        Order = sorted(range(len(Result.Times)), key=Result.Times.__getitem__)
+        Result = Series(*[array.array(Column.typecode, (Column[i] for i in Order)) for Column in Result])
+
+    return Result
+
+
+def _slice(Data, Since=None, Until=None):
+
+    Start = 0 if Since is None else bisect.bisect_left(Data.Times, int(Since))
+    End = len(Data.Times) if Until is None else bisect.bisect_right(Data.Times, int(Until))
+
+    if Start == 0 and End == len(Data.Times):
+        return Data
+
+    return Series(*[Column[Start:End] for Column in Data])
+
+
+def Drive_Key(Record):
+    """
+    The directory name a drive's history is kept under: its WWN if it has
+    one, otherwise its serial number.
+    """
+
+    Key = Record.Wwn or Record.Serial
+    if not Key:
+        return None
+
+    return re.sub("[^A-Za-z0-9_.-]", "_", Key.strip())
+
+
+class SmartHistory(object):
+
+    def __init__(self, Root=HISTORY_DIR):
+        self.Root = Root
+
+    def _dir(self, Drive):
+        return os.path.join(self.Root, Drive)
+
+    def _file(self, Drive, Attr):
+        return os.path.join(self.Root, Drive, str(Attr) + ".smh")
+
+    def drives(self):
+        """
+        Return the keys of every drive with a history.
+        """
+
+        try:
+            return sorted(d for d in os.listdir(self.Root) if os.path.isfile(os.path.join(self.Root, d, "meta.json")))
+        except FileNotFoundError:
+            return []
+
+    def info(self, Drive):
+        """
+        Return the metadata of a drive (serial, wwn, model, host, rid, dev,
+        first_seen, last_seen and an attribute id -> name map).
+        """
+
+        try:
+            with open(os.path.join(self._dir(Drive), "meta.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_info(self, Drive, Info):
+
+        Path = os.path.join(self._dir(Drive), "meta.json")
+        Tmp = Path + ".tmp"
+        with open(Tmp, "w") as f:
+            json.dump(Info, f, sort_keys=True)
+        os.rename(Tmp, Path)
+
+    def _append(self, Path, Block):
+
+        while True:
+            with open(Path, "ab") as f:
+                fcntl.flock(f, fcntl.LOCK_SH)
+                # compact() may have replaced the file while we waited for the lock
+                try:
+                    Current = os.stat(Path).st_ino
+                except FileNotFoundError:
+                    Current = None
+                if Current == os.fstat(f.fileno()).st_ino:
+                    f.write(Block)
+                    return
+
+    def record(self, Record, Attributes, Rid=None, Host=None, Now=None):
+        """
+        Append one sample of every attribute in Attributes (an id ->
+        AtaAttribute table, see smartjson.Attribute_Table) for the drive in
+        Record.  Returns the drive key, or None if the drive has no identity.
+        """
+
+        Drive = Drive_Key(Record)
+        if Drive is None or not Attributes:
+            return None
+
+        Now = int(time.time() if Now is None else Now)
+
+        os.makedirs(self._dir(Drive), exist_ok=True)
+
+        for Attr in Attributes.values():
+            Block = _encode_block([(Now, _clamp(Attr.Value, 0, 0xFFFF), _clamp(Attr.Worst, 0, 0xFFFF),
+                                    _clamp(Attr.Raw, -(1 << 63), (1 << 63) - 1))])
+            self._append(self._file(Drive, Attr.Id), Block)
+
+        Info = self.info(Drive)
+        Names = Info.get("attributes", {})
+        Names.update((str(Attr.Id), Attr.Name) for Attr in Attributes.values())
+        Thresholds = Info.get("thresholds", {})
+        Thresholds.update((str(Attr.Id), Attr.Thresh) for Attr in Attributes.values() if Attr.Thresh is not None)
+
+        Info.update({
+            "serial": Record.Serial,
+            "wwn": Record.Wwn,
+            "model": Record.Model,
+            "vendor": Record.Vendor,
+            "protocol": Record.Protocol,
+            "capacity": Record.Capacity,
+            "dev": Record.Device,
+            "rid": Rid,
+            "host": Host,
+            "last_seen": Now,
+            "attributes": Names,
+            "thresholds": Thresholds,
+        })
+        Info.setdefault("first_seen", Now)
+
+        self._save_info(Drive, Info)
+
+        return Drive
+
+    def resolve(self, Drive, Attr):
+        """
+        Turn an attribute name (or id) into the id used by this drive.
+        """
+
+        if isinstance(Attr, int) or re.match("^[0-9]+$", str(Attr)):
+            return int(Attr)
+
+        for Id, Name in self.info(Drive).get("attributes", {}).items():
+            if Name == Attr or str(Id) + "_" + Name == Attr:
+                return int(Id)
+
+        return None
+
+    def series(self, Drive, Attr, Since=None, Until=None):
+        """
+        Return the Series of one attribute (id or name) of one drive between
+        Since and Until (epoch seconds, inclusive).
+        """
+
+        Id = self.resolve(Drive, Attr)
+        if Id is None:
+            return _empty_series()
+
+        return _slice(_read_series(self._file(Drive, Id)), Since, Until)
+
+    def query(self, Attr, Since=None, Until=None, Drives=None):
+        """
+        Return {drive: Series} of attribute Attr for every drive (or just
+        Drives) that has samples between Since and Until.
+        """
+
+        Result = {}
+        for Drive in (Drives if Drives is not None else self.drives()):
+            Data = self.series(Drive, Attr, Since, Until)
+            if len(Data.Times):
+                Result[Drive] = Data
+
+        return Result
+
+    def compact(self, Drive, Now=None, Hourly_Days=HOURLY_DAYS, Retention_Days=RETENTION_DAYS):
+        """
+        Rewrite every attribute file of Drive as a single block, keeping one
+        sample per day (the last) for data older than Hourly_Days and
+        dropping data older than Retention_Days.  Returns rows dropped.
+        """
+
+        Now = int(time.time() if Now is None else Now)
+        Hourly_Cutoff = Now - Hourly_Days * 86400
+        Retention_Cutoff = Now - Retention_Days * 86400
+
+        Dropped = 0
+
+        for Name in os.listdir(self._dir(Drive)):
+
+            if not Name.endswith(".smh"):
+                continue
+
+            Path = os.path.join(self._dir(Drive), Name)
+
+            with open(Path, "r+b") as Lock:
+
+                # Appenders take a shared lock, so this waits for them
+                fcntl.flock(Lock, fcntl.LOCK_EX)
+
+                Data = _read_series(Path)
+
+                Rows = []
+                for Row in zip(*Data):
+                    if Row[0] < Retention_Cutoff:
+                        continue
+                    if Row[0] < Hourly_Cutoff and Rows and Rows[-1][0] < Hourly_Cutoff and \
+                            Rows[-1][0] // 86400 == Row[0] // 86400:
+                        Rows[-1] = Row
+                        continue
+                    Rows.append(Row)
+
+                Dropped += len(Data.Times) - len(Rows)
+
+                if not Rows:
+                    os.remove(Path)
+                    continue
+
+                Tmp = Path + ".tmp"
+                with open(Tmp, "wb") as f:
+                    f.write(_encode_block(Rows))
+                os.rename(Tmp, Path)
+
+        return Dropped
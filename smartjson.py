@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+
+"""
+smartjson - Collect everything smartctl knows about a drive with one fork.
+
+Smart_Attributes, Determine_Drive_Protocol, RID_Run_SmartTest and
+smart_failure_scanner each used to run their own mix of "smartctl -i", "-a",
+"-c", "--attributes" and "-x", then regex the text, whose layout changes
+between smartctl releases.  Smart_Record() runs "smartctl -x --json" once per
+device (through the shared SysExec cache) and turns it into a SmartRecord:
+identity, protocol, health, temperature, ATA attributes, SAS error counters
+and the self-test status, with None for anything the drive didn't report.
+
+Requires smartctl 7.0 or newer for --json.
+"""
+
+import collections
+import json
+import logging
+import threading
+
+from sysexec import SysExec, ERROR
+
+SMARTCTL = "sudo smartctl -x --json"
+
+# smartctl's exit status is a bit mask; these bits mean it couldn't talk to
+# the drive at all, as opposed to the drive reporting problems.
+SMARTCTL_CMDLINE_ERROR = 0x01
+SMARTCTL_OPEN_FAILED = 0x02
+SMARTCTL_COMMAND_FAILED = 0x04
+
+# ATA self-test execution status (upper nibble of the status byte)
+SELF_TEST_OK = 0x0
+SELF_TEST_ELEMENT_FAILED = 0x4
+SELF_TEST_READ_FAILED = 0x7
+SELF_TEST_IN_PROGRESS = 0xF
+
+AtaAttribute = collections.namedtuple("AtaAttribute", ["Id", "Name", "Value", "Worst", "Thresh", "Raw", "Raw_String", "When_Failed"])
+
+SelfTestStatus = collections.namedtuple("SelfTestStatus", ["Value", "String", "Passed", "Remaining_Percent"])
+
+SelfTestEntry = collections.namedtuple("SelfTestEntry", ["Type", "Result", "Result_String", "Hours"])
+
+ScsiErrorCounter = collections.namedtuple("ScsiErrorCounter", ["Total_Corrected", "Algorithm_Invocations", "Gigabytes_Processed", "Total_Uncorrected"])
+
+SmartRecord = collections.namedtuple("SmartRecord", [
+    "Device",
+    "Ok",                   # False if smartctl couldn't be run or its output couldn't be parsed
+    "Exit_Status",          # smartctl's exit status bit mask
+    "Messages",             # smartctl's own warnings and errors
+    "Protocol",             # SATA, SAS, NVME, Virtual or UNKNOWN
+    "Vendor",
+    "Model",
+    "Serial",
+    "Wwn",                  # e.g. "5000c500a1b2c3d4", or None
+    "Firmware",
+    "Capacity",             # bytes
+    "Health_Passed",        # True/False, or None if unknown
+    "Health_Status",        # ATA "PASSED"/"FAILED"; SCSI "OK"/"FAILED" or the IE string
+    "Temperature",          # Celsius
+    "Power_On_Hours",
+    "Attributes",           # OrderedDict of ATA attribute id -> AtaAttribute
+    "Self_Test",            # ATA SelfTestStatus
+    "Self_Test_Log",        # [SelfTestEntry, ...], most recent first (SCSI)
+    "Grown_Defects",        # SCSI grown defect list length
+    "Start_Stop_Cycles",
+    "Manufacture_Week",
+    "Manufacture_Year",
+    "Error_Counters",       # {"read"|"write"|"verify": ScsiErrorCounter}
+    "Non_Medium_Errors",
+    "Blocks_Reassigned",
+    "Nvme_Health",          # the raw NVMe health log dict
+    "Raw",                  # the whole JSON document
+])
+
+
+def _get(Doc, *Keys):
+    """
+    Walk nested dicts, returning None as soon as a key is missing.
+    """
+
+    for Key in Keys:
+        if not isinstance(Doc, dict) or Key not in Doc:
+            return None
+        Doc = Doc[Key]
+    return Doc
+
+
+def _int(Value):
+
+    if Value is None:
+        return None
+    try:
+        return int(str(Value).split(".")[0])
+    except ValueError:
+        return None
+
+
+def _protocol(Doc):
+
+    Device_Protocol = (_get(Doc, "device", "protocol") or "").upper()
+    Vendor = (_get(Doc, "scsi_vendor") or "").strip()
+    Model = (_get(Doc, "model_name") or _get(Doc, "scsi_model_name") or _get(Doc, "scsi_product") or "")
+    Messages = " ".join(m.get("string", "") for m in (_get(Doc, "smartctl", "messages") or []))
+
+    # Dell firmware is a lying SOB, and the virtual disks exported by our LSI
+    # HBA's claim to be SCSI disks.
+    if "PERC" in Model or "DELL or MegaRaid controller" in Messages or Vendor == "AVAGO":
+        return "Virtual"
+
+    if Device_Protocol == "ATA":
+        return "SATA"
+
+    if Device_Protocol == "NVME":
+        return "NVME"
+
+    if Device_Protocol == "SCSI":
+        Transport = (_get(Doc, "scsi_transport_protocol", "name") or "").upper()
+        if "SAS" in Transport:
+            return "SAS"
+
+    return "UNKNOWN"
+
+
+def _wwn(Doc):
+
+    Wwn = _get(Doc, "wwn")
+    if isinstance(Wwn, dict) and "naa" in Wwn:
+        return "%x%06x%09x" % (Wwn["naa"], Wwn.get("oui", 0), Wwn.get("id", 0))
+
+    Lun = _get(Doc, "logical_unit_id")
+    if Lun:
+        return str(Lun).lower().replace("0x", "")
+
+    return None
+
+
+def _attributes(Doc):
+
+    Attributes = collections.OrderedDict()
+
+    for Entry in _get(Doc, "ata_smart_attributes", "table") or []:
+
+        Raw_String = str(_get(Entry, "raw", "string") or _get(Entry, "raw", "value") or "0")
+
+        Attributes[Entry["id"]] = AtaAttribute(
+            Entry["id"],
+            Entry.get("name", "Unknown_Attribute"),
+            Entry.get("value"),
+            Entry.get("worst"),
+            Entry.get("thresh"),
+            _int(Raw_String.split()[0] if Raw_String.split() else None),
+            Raw_String,
+            Entry.get("when_failed", ""),
+        )
+
+    return Attributes
+
+
+def _self_test(Doc):
+
+    Status = _get(Doc, "ata_smart_data", "self_test", "status")
+    if not Status:
+        return None
+
+    return SelfTestStatus(Status.get("value"), Status.get("string"), Status.get("passed"), Status.get("remaining_percent"))
+
+
+def _scsi_self_test_log(Doc):
+
+    Log = []
+    for i in range(20):
+        Entry = _get(Doc, "scsi_self_test_" + str(i))
+        if not Entry:
+            break
+        Log.append(SelfTestEntry(
+            _get(Entry, "code", "string"),
+            _get(Entry, "result", "value"),
+            _get(Entry, "result", "string"),
+            _get(Entry, "power_on_time", "hours"),
+        ))
+
+    return Log
+
+
+def _error_counters(Doc):
+
+    Counters = {}
+    for Name, Entry in (_get(Doc, "scsi_error_counter_log") or {}).items():
+        if not isinstance(Entry, dict):
+            continue
+        Counters[Name] = ScsiErrorCounter(
+            _int(Entry.get("total_errors_corrected")),
+            _int(Entry.get("correction_algorithm_invocations")),
+            _int(Entry.get("gigabytes_processed")),
+            _int(Entry.get("total_uncorrected_errors")),
+        )
+
+    return Counters
+
+
+def Parse_Smart_Json(Dev, Text):
+    """
+    Turn the output of "smartctl -x --json" into a SmartRecord.  Never raises;
+    if the output can't be parsed the record has Ok = False.
+    """
+
+    Doc = None
+
+    # sudo and smartctl can both complain on stderr (merged into the output)
+    # before the document starts.
+    if Text and Text != ERROR and "{" in Text:
+        try:
+            Doc = json.JSONDecoder().raw_decode(Text[Text.index("{"):])[0]
+        except ValueError as e:
+            logging.debug("Parse_Smart_Json:: cannot parse smartctl output for " + Dev + ": " + str(e))
+
+    if not isinstance(Doc, dict):
+        return SmartRecord._make([None] * len(SmartRecord._fields))._replace(
+            Device=Dev, Ok=False, Messages=[], Protocol="UNKNOWN", Attributes=collections.OrderedDict(),
+            Self_Test_Log=[], Error_Counters={}, Raw={})
+
+    Exit_Status = _get(Doc, "smartctl", "exit_status") or 0
+    Messages = [m.get("string", "") for m in (_get(Doc, "smartctl", "messages") or [])]
+
+    Health_Passed = _get(Doc, "smart_status", "passed")
+    Health_Status = _get(Doc, "smart_status", "scsi", "ie_string")
+    if Health_Status is None and Health_Passed is not None:
+        # smartctl only reports the IE string for a SCSI drive that has one;
+        # a healthy one just says "passed", which its text output shows as
+        # "SMART Health Status: OK".
+        if (_get(Doc, "device", "protocol") or "").upper() == "SCSI":
+            Health_Status = "OK" if Health_Passed else "FAILED"
+        else:
+            Health_Status = "PASSED" if Health_Passed else "FAILED"
+
+    Start_Stop = _get(Doc, "scsi_start_stop_cycle_counter") or {}
+
+    return SmartRecord(
+        Dev,
+        not Exit_Status & (SMARTCTL_CMDLINE_ERROR | SMARTCTL_OPEN_FAILED),
+        Exit_Status,
+        Messages,
+        _protocol(Doc),
+        _get(Doc, "scsi_vendor"),
+        _get(Doc, "model_name") or _get(Doc, "scsi_model_name") or _get(Doc, "scsi_product"),
+        _get(Doc, "serial_number"),
+        _wwn(Doc),
+        _get(Doc, "firmware_version") or _get(Doc, "scsi_revision"),
+        _get(Doc, "user_capacity", "bytes"),
+        Health_Passed,
+        Health_Status,
+        _get(Doc, "temperature", "current"),
+        _get(Doc, "power_on_time", "hours"),
+        _attributes(Doc),
+        _self_test(Doc),
+        _scsi_self_test_log(Doc),
+        _get(Doc, "scsi_grown_defect_list"),
+        _int(Start_Stop.get("accumulated_start_stop_cycles")),
+        _int(Start_Stop.get("week_of_manufacture")),
+        _int(Start_Stop.get("year_of_manufacture")),
+        _error_counters(Doc),
+        _int(_get(Doc, "scsi_nonmedium_error_count")),
+        _int(_get(Doc, "scsi_format_status", "total_new_blocks_reassigned")),
+        _get(Doc, "nvme_smart_health_information_log"),
+        Doc,
+    )
+
+
+def Attribute_Table(Record):
+    """
+    Return an OrderedDict of attribute id -> AtaAttribute for any drive.  ATA
+    drives report real attributes; for SAS drives the equivalent counters are
+    mapped onto the matching ATA ids where there is one (4, 9, 194), and onto
+    9000+ ids where there isn't.
+    """
+
+    if Record.Protocol != "SAS":
+        return collections.OrderedDict(Record.Attributes)
+
+    Table = collections.OrderedDict()
+
+    def Add(Id, Name, Value, Worst=0, Thresh=0, Raw=None, Raw_String=None):
+        if Raw is None and Raw_String is None:
+            return
+        Table[Id] = AtaAttribute(Id, Name, Value, Worst, Thresh, Raw, Raw_String if Raw_String is not None else str(Raw), "")
+
+    # Some SAS attributes can be mapped to corresponding SATA attributes
+    Add(4, "Start_Stop_Count", Record.Start_Stop_Cycles or 0, Raw=Record.Start_Stop_Cycles)
+    Add(9, "Power_On_Hours", Record.Power_On_Hours or 0, Raw=Record.Power_On_Hours)
+    Add(194, "Temperature_Celsius", Record.Temperature or 0, Record.Temperature or 0, Raw=Record.Temperature)
+
+    # Others we'll create unique SAS attributes for
+    Add(9000, "SAS_Grown_Defect_List", Record.Grown_Defects or 0, Raw=Record.Grown_Defects)
+
+    if Record.Manufacture_Year is not None:
+        Add(9001, "SAS_Manufacture_Date", 0, Raw=Record.Manufacture_Year * 100 + (Record.Manufacture_Week or 0),
+            Raw_String="week_" + str(Record.Manufacture_Week) + "_" + str(Record.Manufacture_Year))
+
+    Counter = Record.Error_Counters.get("read")
+    if Counter is not None:
+        Add(9002, "SAS_Gigabytes_Read", Counter.Gigabytes_Processed or 0, Raw=Counter.Gigabytes_Processed)
+
+    Counter = Record.Error_Counters.get("write")
+    if Counter is not None:
+        Add(9003, "SAS_Gigabytes_Write", Counter.Gigabytes_Processed or 0, Raw=Counter.Gigabytes_Processed)
+
+    return Table
+
+
+# Parsing a -x document isn't free, so keep the last record per device and
+# reuse it as long as SysExec hands back the same (cached) output.
+_Parsed = {}
+_Parsed_Lock = threading.Lock()
+
+
+def Smart_Record(Dev, ttl=None, timeout=None):
+    """
+    Return the SmartRecord of Dev.  The smartctl output is cached by SysExec
+    for ttl seconds like any other command; pass ttl = 0 for fresh data.
+    """
+
+    Text = SysExec(SMARTCTL + " " + Dev, ttl=ttl, timeout=timeout)
+
+    with _Parsed_Lock:
+        Last = _Parsed.get(Dev)
+        if Last is not None and Last[0] is Text:
+            return Last[1]
+
+    Record = Parse_Smart_Json(Dev, Text)
+
+    with _Parsed_Lock:
+        _Parsed[Dev] = (Text, Record)
+
+    return Record
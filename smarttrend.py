@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+
+"""
+smarttrend - Fleet-wide SMART trend analysis over the smarthist store.
+
+smart_failure_scanner only compares one snapshot against fixed thresholds, so
+a drive whose reallocated or pending sector count is climbing stays silent
+until it crosses Thresh_197 or Grown_Defect_Thresh.  This module loads the
+history of a set of attributes for every drive into flat NumPy arrays (one
+entry per sample, tagged with the drive it belongs to) and computes, for all
+drives at once:
+
+    - the least-squares slope per day over the whole window and over the
+      most recent days (from per-drive sums built with np.bincount),
+    - the increase over the recent days,
+    - where the drive's current value sits against other drives of the same
+      model (a per-model percentile baseline of the other drives).
+
+and reports drives that are rising fast, accelerating, or far above their
+peers.  Everything is O(samples) NumPy work, with a Python loop only over
+models, so it scales to tens of thousands of drives.
+
+NumPy is required.
+"""
+
+import collections
+import time
+
+import numpy as np
+
+from smarthist import SmartHistory
+
+# Attributes worth trending, and how much they may rise per day over the
+# recent window before we say something.  The SAS ids come from
+# smartjson.Attribute_Table.
+TREND_ATTRIBUTES = collections.OrderedDict([
+    (5,    ("Reallocated_Sector_Ct",   1.0)),
+    (187,  ("Reported_Uncorrect",      1.0)),
+    (188,  ("Command_Timeout",         5.0)),
+    (197,  ("Current_Pending_Sector",  1.0)),
+    (198,  ("Offline_Uncorrectable",   1.0)),
+    (9000, ("SAS_Grown_Defect_List",   1.0)),
+])
+
+WINDOW_DAYS = 30            # History used for the long-term slope
+RECENT_DAYS = 7             # History used for the recent slope / increase
+ACCELERATION = 3.0          # Recent slope this many times the long-term one is "accelerating"
+MIN_INCREASE = 5            # ... but only if it rose at least this much recently,
+                            # and how far above its model's baseline a drive must be
+PERCENTILE = 99.0           # Per-model baseline percentile
+MIN_MODEL_DRIVES = 10       # Models with fewer drives don't get a baseline
+
+Finding = collections.namedtuple("Finding", ["Drive", "Attr", "Name", "Message"])
+
+FleetData = collections.namedtuple("FleetData", ["Drives", "Index", "Times", "Raws"])
+
+
+def Load_Attribute(History, Attr, Since, Drives=None):
+    """
+    Load one attribute of every drive since Since into flat arrays: Index[i]
+    is the position in Drives of the drive sample i belongs to.  Samples of a
+    drive are contiguous and in time order.
+    """
+
+    Series = History.query(Attr, Since=Since, Drives=Drives)
+
+    Drives = sorted(Series)
+    Counts = np.array([len(Series[d].Times) for d in Drives], dtype=np.int64)
+
+    if not Drives:
+        return FleetData([], np.zeros(0, np.int64), np.zeros(0, np.float64), np.zeros(0, np.float64))
+
+    Times = np.concatenate([np.frombuffer(Series[d].Times, dtype=np.uint32) for d in Drives]).astype(np.float64)
+    Raws = np.concatenate([np.frombuffer(Series[d].Raws, dtype=np.int64) for d in Drives]).astype(np.float64)
+    Index = np.repeat(np.arange(len(Drives)), Counts)
+
+    return FleetData(Drives, Index, Times, Raws)
+
+
+def _slopes(Index, Times, Raws, N, Mask=None):
+    """
+    Per-drive least-squares slope of Raws over Times (per day), for the
+    samples selected by Mask.  Drives with fewer than 2 samples get 0.
+    """
+
+    if Mask is not None:
+        Index, Times, Raws = Index[Mask], Times[Mask], Raws[Mask]
+
+    # Work in days relative to each drive's first sample to keep the sums small
+    Days = Times / 86400.0
+    First = np.full(N, np.inf)
+    np.minimum.at(First, Index, Days)
+    Days = Days - First[Index]
+
+    n = np.bincount(Index, minlength=N).astype(np.float64)
+    St = np.bincount(Index, Days, minlength=N)
+    Sy = np.bincount(Index, Raws, minlength=N)
+    Stt = np.bincount(Index, Days * Days, minlength=N)
+    Sty = np.bincount(Index, Days * Raws, minlength=N)
+
+    Denominator = n * Stt - St * St
+    with np.errstate(divide="ignore", invalid="ignore"):
+        Slope = np.where(Denominator > 0, (n * Sty - St * Sy) / Denominator, 0.0)
+
+    return Slope
+
+
+def _percentile_of_others(Values, Percentile):
+    """
+    For every element of Values, the Percentile (linear interpolation, as
+    np.percentile) of all the other elements.  A drive must not be part of
+    its own baseline: with it included, the top value of any group is always
+    above p99.
+    """
+
+    n = len(Values)
+    Order = np.argsort(Values, kind="stable")
+    Sorted = Values[Order]
+    Rank = np.empty(n, np.int64)
+    Rank[Order] = np.arange(n)
+
+    # Position of the percentile among the n - 1 other values, and the two
+    # neighbours around it with the drive's own rank skipped
+    Position = (n - 2) * Percentile / 100.0
+    Low = int(np.floor(Position))
+    High = min(Low + 1, n - 2)
+    Fraction = Position - Low
+
+    Below = Sorted[Low + (Low >= Rank)]
+    Above = Sorted[High + (High >= Rank)]
+
+    return Below + (Above - Below) * Fraction
+
+
+def Analyze_Attribute(Data, Models, Attr, Name, Max_Rate, Now=None, Recent_Days=RECENT_DAYS):
+    """
+    Return the Findings for one attribute.  Models maps drive -> model.
+    """
+
+    N = len(Data.Drives)
+    if N == 0:
+        return []
+
+    Now = time.time() if Now is None else Now
+
+    # Offsets of each drive's first and last sample (samples are grouped by drive)
+    Counts = np.bincount(Data.Index, minlength=N)
+    Last = np.cumsum(Counts) - 1
+    Current = Data.Raws[Last]
+
+    Recent = Data.Times >= Now - Recent_Days * 86400
+
+    Long_Slope = _slopes(Data.Index, Data.Times, Data.Raws, N)
+    Recent_Slope = _slopes(Data.Index, Data.Times, Data.Raws, N, Recent)
+
+    # Increase over the recent window: current value minus the smallest recent one
+    Recent_Min = np.full(N, np.inf)
+    np.minimum.at(Recent_Min, Data.Index[Recent], Data.Raws[Recent])
+    Has_Recent = np.isfinite(Recent_Min)
+    Increase = np.where(Has_Recent, Current - Recent_Min, 0.0)
+
+    Rising = Has_Recent & (Recent_Slope > Max_Rate)
+    Accelerating = Has_Recent & (Increase >= MIN_INCREASE) & (Recent_Slope > ACCELERATION * np.maximum(Long_Slope, 0.1))
+
+    # Per-model percentile baselines of the current value, each drive
+    # against the other drives of its model
+    Baseline = np.full(N, np.inf)
+    Model_Names = np.array([Models.get(d) or "Unknown" for d in Data.Drives])
+    Unique, Inverse = np.unique(Model_Names, return_inverse=True)
+    for i in range(len(Unique)):
+        Members = Inverse == i
+        if Members.sum() >= MIN_MODEL_DRIVES:
+            Baseline[Members] = _percentile_of_others(Current[Members], PERCENTILE)
+    Outlier = np.isfinite(Baseline) & (Current >= Baseline + MIN_INCREASE)
+
+    Findings = []
+    Label = str(Attr) + " " + Name
+
+    for i in np.flatnonzero(Rising | Accelerating | Outlier):
+
+        if Accelerating[i]:
+            Message = Label + " accelerating, " + "%.1f" % Recent_Slope[i] + "/day (was " + "%.1f" % Long_Slope[i] + "/day)"
+        elif Rising[i]:
+            Message = Label + " rising " + "%.1f" % Recent_Slope[i] + "/day, +" + str(int(Increase[i])) + " in " + str(Recent_Days) + " days"
+        else:
+            Message = Label + " " + str(int(Current[i])) + " above " + Model_Names[i] + " p" + "%g" % PERCENTILE + " " + str(int(Baseline[i]))
+
+        Findings.append(Finding(Data.Drives[i], Attr, Name, Message))
+
+    return Findings
+
+
+def Analyze(History=None, Attributes=TREND_ATTRIBUTES, Window_Days=WINDOW_DAYS, Recent_Days=RECENT_DAYS, Now=None):
+    """
+    Run every attribute in Attributes (id -> (name, max rise per day)) over
+    the last Window_Days of history and return a list of Findings.
+    """
+
+    if History is None:
+        History = SmartHistory()
+
+    Now = time.time() if Now is None else Now
+    Since = Now - Window_Days * 86400
+
+    Drives = History.drives()
+    Models = dict((d, History.info(d).get("model")) for d in Drives)
+
+    Findings = []
+    for Attr, (Name, Max_Rate) in Attributes.items():
+        Data = Load_Attribute(History, Attr, Since, Drives)
+        Findings.extend(Analyze_Attribute(Data, Models, Attr, Name, Max_Rate, Now, Recent_Days))
+
+    return Findings
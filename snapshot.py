@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+"""
+snapshot - A cross-process cache for the hardware inventory.
+
+lsblock and lsslot rebuild the whole inventory (sg_ses, udevadm, smartctl,
+/dev/disk/*) every time they run, and power_slot and the log_depot_data cron
+jobs run them over and over again.  The hardware almost never changes between
+those runs, so the parsed inventory is saved under /run and reused for as
+long as it is still valid.
+
+A snapshot is valid for as long as the key it was saved with still matches:
+
+    * /proc/sys/kernel/random/boot_id changes on every reboot.
+    * /sys/kernel/uevent_seqnum is bumped by the kernel on every uevent, so a
+      drive being added, removed or relabelled invalidates every snapshot.
+
+Only things that change through uevents belong in a snapshot.  Volatile state
+such as locate LEDs and mount status must still be queried on every run.
+
+Snapshots are only written by root (/run isn't writable by anyone else), but
+anybody can read them.
+"""
+
+import json
+import logging
+import os
+import tempfile
+
+SNAPSHOT_DIR = "/run/depot-tools"
+
+BOOT_ID_FILE = "/proc/sys/kernel/random/boot_id"
+UEVENT_SEQNUM_FILE = "/sys/kernel/uevent_seqnum"
+
+
+def _read_first_line(path):
+
+    try:
+        with open(path, "r") as f:
+            return f.readline().strip()
+    except OSError:
+        return ""
+
+
+def Inventory_Key():
+    """
+    Return the key identifying the current hardware state, or None if it can't
+    be determined (in which case snapshots are never used).
+
+    Read the key *before* probing the hardware, so that a uevent which arrives
+    while probing leaves the new snapshot already stale.
+    """
+
+    boot_id = _read_first_line(BOOT_ID_FILE)
+    seqnum = _read_first_line(UEVENT_SEQNUM_FILE)
+
+    if not boot_id or not seqnum:
+        return None
+
+    return boot_id + ":" + seqnum
+
+
+def _snapshot_file(name):
+    return os.path.join(SNAPSHOT_DIR, name + ".json")
+
+
+def Load_Snapshot(name, key, version=1):
+    """
+    Return the data saved under name if it was saved with this key and format
+    version, otherwise None.
+    """
+
+    if key is None:
+        return None
+
+    try:
+        with open(_snapshot_file(name), "r") as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError) as exc:
+        logging.debug("Load_Snapshot:: no usable snapshot for %s: %s", name, exc)
+        return None
+
+    if not isinstance(snapshot, dict):
+        return None
+
+    if snapshot.get("key") != key or snapshot.get("version") != version:
+        logging.debug("Load_Snapshot:: snapshot for %s is stale", name)
+        return None
+
+    logging.debug("Load_Snapshot:: using snapshot for %s", name)
+    return snapshot.get("data")
+
+
+def Save_Snapshot(name, key, data, version=1):
+    """
+    Save data under name.  The file is replaced atomically so concurrent
+    readers only ever see a complete snapshot.  Failing to save (not root,
+    no /run, ...) is not an error; the next run just probes the hardware again.
+    """
+
+    if key is None:
+        return False
+
+    tmp_file = None
+
+    try:
+        os.makedirs(SNAPSHOT_DIR, mode=0o755, exist_ok=True)
+
+        fd, tmp_file = tempfile.mkstemp(prefix="." + name + ".", dir=SNAPSHOT_DIR)
+        with os.fdopen(fd, "w") as f:
+            json.dump({"key": key, "version": version, "data": data}, f, separators=(",", ":"))
+
+        os.chmod(tmp_file, 0o644)
+        os.replace(tmp_file, _snapshot_file(name))
+
+    except (OSError, TypeError, ValueError) as exc:
+        logging.debug("Save_Snapshot:: cannot save snapshot for %s: %s", name, exc)
+        if tmp_file is not None:
+            try:
+                os.unlink(tmp_file)
+            except OSError:
+                pass
+        return False
+
+    return True
+
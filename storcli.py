@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+
+"""
+storcli - Read MegaRAID/PERC controller state from storcli's JSON output.
+
+smart_failure_scanner, afs/scan_lsi_baddrives.sh and the storcli experiments
+in archeology/ each scraped the text of "storcli64 ... show all" with their
+own state machines, and some forked storcli once per drive.  The text layout
+differs between storcli and perccli releases; the JSON ("... show all J")
+doesn't.
+
+Storcli_Drives() runs "storcli64 /call/eall/sall show all J" once (through
+the shared SysExec cache, so repeated calls inside CACHE_TTL cost nothing)
+and returns a StorcliDrive per physical drive on every controller.
+Storcli_Virtual_Drives() does the same for "/call/vall show all J".  On Dell
+boards perccli64 is used instead of storcli64.
+"""
+
+import collections
+import json
+import logging
+import re
+import threading
+
+from sysexec import SysExec, ERROR
+
+STORCLI = "storcli64"
+PERCCLI = "/opt/MegaRAID/perccli/perccli64"
+
+BOARD_VENDOR = "/sys/devices/virtual/dmi/id/board_vendor"
+
+# Controller state changes slowly; a scan asks for it many times.
+CACHE_TTL = 30
+
+StorcliDrive = collections.namedtuple("StorcliDrive", [
+    "Path",                 # "/c0/e8/s1"
+    "Controller",
+    "Enclosure",
+    "Slot",
+    "Eid_Slt",              # "8:1"
+    "Did",
+    "State",                # Onln, UGood, JBOD, ...
+    "Dg",                   # Drive group, or None
+    "Size",                 # bytes
+    "Intf",                 # SAS, SATA
+    "Med",                  # HDD, SSD
+    "Vendor",
+    "Model",
+    "Serial",
+    "Wwn",                  # lower case, no 0x
+    "Firmware",
+    "Temperature",          # Celsius
+    "Shield_Counter",       # None when storcli reports N/A
+    "Media_Error_Count",
+    "Other_Error_Count",
+    "Predictive_Failure_Count",
+    "Smart_Alert",          # "Yes"/"No", or None
+    "Sas_Addresses",        # [ "5000c500a6c97269", ... ] one per port, lower case, no 0x
+    "Raw",                  # the drive's JSON, for anything not above
+])
+
+StorcliVirtualDrive = collections.namedtuple("StorcliVirtualDrive", [
+    "Path",                 # "/c0/v0"
+    "Controller",
+    "Vd",
+    "Dg",
+    "Type",                 # RAID0, RAID1, ...
+    "State",
+    "Size",                 # bytes
+    "Name",
+    "Naa_Id",               # SCSI NAA id, as in /dev/disk/by-id/wwn-0x<Naa_Id>
+    "Drives",               # [ "8:1", ... ] EID:Slt of the member drives
+    "Raw",
+])
+
+# (StorcliDrive field, what storcli calls it) of the counters worth reporting
+ERROR_FIELDS = [
+    ("Shield_Counter", "Shield Counter"),
+    ("Media_Error_Count", "Media Error Count"),
+    ("Other_Error_Count", "Other Error Count"),
+    ("Predictive_Failure_Count", "Predictive Failure Count"),
+    ("Smart_Alert", "SMART alert flagged by drive"),
+]
+
+_UNITS = ["B", "KB", "MB", "GB", "TB", "PB"]
+
+
+def Storcli_Bin():
+    """
+    Return the controller CLI for this host: perccli64 on Dell boards,
+    storcli64 everywhere else.
+    """
+
+    try:
+        with open(BOARD_VENDOR) as f:
+            if re.search("Dell", f.read()):
+                return PERCCLI
+    except OSError:
+        pass
+
+    return STORCLI
+
+
+def _int(Value):
+
+    try:
+        return int(str(Value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def _size(Text):
+    """
+    Turn a storcli size ("10.913 TB", "512B") into bytes.  storcli prints
+    binary multiples with decimal unit names.
+    """
+
+    m = re.match(r"^\s*([0-9.]+)\s*([KMGTP]?B)", str(Text or ""))
+    if not m:
+        return None
+
+    return int(float(m.group(1)) * pow(1024, _UNITS.index(m.group(2))))
+
+
+def _raw_size(Attributes):
+    """
+    The exact size of a drive from "Raw size": "10.914 TB [0x575000000 Sectors]".
+    """
+
+    m = re.search(r"\[0x([0-9a-fA-F]+) Sectors\]", str(Attributes.get("Raw size", "")))
+    Sector = _size(Attributes.get("Logical Sector Size")) or 512
+
+    if m:
+        return int(m.group(1), 16) * Sector
+
+    return _size(Attributes.get("Raw size"))
+
+
+def _hex(Text):
+
+    Text = str(Text or "").strip().lower()
+    if Text.startswith("0x"):
+        Text = Text[2:]
+
+    return Text if Text and Text.strip("0") else None
+
+
+def _controllers(Text):
+    """
+    Yield (controller, Response Data) for every controller in a storcli JSON
+    document that answered successfully.
+    """
+
+    if Text == ERROR:
+        return
+
+    try:
+        Document = json.loads(Text)
+    except ValueError as e:
+        logging.debug("storcli:: can't parse JSON output: " + str(e))
+        return
+
+    for Controller in Document.get("Controllers", []):
+
+        Status = Controller.get("Command Status", {})
+        if Status.get("Status") != "Success":
+            logging.debug("storcli:: controller " + str(Status.get("Controller")) + ": " + str(Status.get("Description")))
+            continue
+
+        yield _int(Status.get("Controller")), Controller.get("Response Data", {})
+
+
+def Parse_Drives_Json(Text):
+    """
+    Parse "storcli64 /call/eall/sall show all J" into an ordered
+    { "/c0/e8/s1": StorcliDrive } map.
+    """
+
+    Drives = collections.OrderedDict()
+
+    for Controller, Data in _controllers(Text):
+
+        for Key, Value in Data.items():
+
+            m = re.match(r"^Drive (/c\d+/e\d+/s\d+)$", Key)
+            if not m or not Value:
+                continue
+
+            Path = m.group(1)
+            Summary = Value[0]
+            Details = Data.get(Key + " - Detailed Information", {})
+
+            State = Details.get(Key + " State", {})
+            Attributes = Details.get(Key + " Device attributes", {})
+            Policies = Details.get(Key + " Policies/Settings", {})
+
+            m = re.search(r"(-?\d+)C", str(State.get("Drive Temperature", "")))
+            Temperature = int(m.group(1)) if m else None
+
+            Ports = Policies.get("Port Information", [])
+            Sas_Addresses = [_hex(Port.get("SAS address")) for Port in Ports]
+
+            Enclosure, Slot = (Summary.get("EID:Slt", ":").split(":") + [""])[:2]
+
+            Drives[Path] = StorcliDrive(
+                Path=Path,
+                Controller=Controller,
+                Enclosure=_int(Enclosure),
+                Slot=_int(Slot),
+                Eid_Slt=Summary.get("EID:Slt"),
+                Did=_int(Summary.get("DID")),
+                State=Summary.get("State"),
+                Dg=_int(Summary.get("DG")),
+                Size=_raw_size(Attributes) or _size(Summary.get("Size")),
+                Intf=Summary.get("Intf"),
+                Med=Summary.get("Med"),
+                Vendor=str(Attributes.get("Manufacturer Id", "")).strip() or None,
+                Model=str(Attributes.get("Model Number", Summary.get("Model", ""))).strip() or None,
+                Serial=str(Attributes.get("SN", "")).strip() or None,
+                Wwn=_hex(Attributes.get("WWN")),
+                Firmware=str(Attributes.get("Firmware Revision", "")).strip() or None,
+                Temperature=Temperature,
+                Shield_Counter=_int(State.get("Shield Counter")),
+                Media_Error_Count=_int(State.get("Media Error Count")),
+                Other_Error_Count=_int(State.get("Other Error Count")),
+                Predictive_Failure_Count=_int(State.get("Predictive Failure Count")),
+                Smart_Alert=State.get("S.M.A.R.T alert flagged by drive"),
+                Sas_Addresses=[a for a in Sas_Addresses if a],
+                Raw={"Summary": Summary, "Details": Details},
+            )
+
+    return Drives
+
+
+def Parse_Virtual_Drives_Json(Text):
+    """
+    Parse "storcli64 /call/vall show all J" into an ordered
+    { "/c0/v0": StorcliVirtualDrive } map.
+    """
+
+    Vds = collections.OrderedDict()
+
+    for Controller, Data in _controllers(Text):
+
+        for Key, Value in Data.items():
+
+            m = re.match(r"^/c(\d+)/v(\d+)$", Key)
+            if not m or not Value:
+                continue
+
+            Vd = int(m.group(2))
+            Summary = Value[0]
+            Properties = Data.get("VD" + str(Vd) + " Properties", {})
+            Members = Data.get("PDs for VD " + str(Vd), [])
+
+            Dg = str(Summary.get("DG/VD", "")).split("/")[0]
+
+            Vds[Key] = StorcliVirtualDrive(
+                Path=Key,
+                Controller=Controller,
+                Vd=Vd,
+                Dg=_int(Dg),
+                Type=Summary.get("TYPE"),
+                State=Summary.get("State"),
+                Size=_size(Summary.get("Size")),
+                Name=Summary.get("Name"),
+                Naa_Id=_hex(Properties.get("SCSI NAA Id")),
+                Drives=[Pd.get("EID:Slt") for Pd in Members],
+                Raw={"Summary": Summary, "Properties": Properties, "Drives": Members},
+            )
+
+    return Vds
+
+
+# Keep the last parse of each command and reuse it as long as SysExec hands
+# back the same (cached) output.
+_Parsed = {}
+_Parsed_Lock = threading.Lock()
+
+
+def _cached_parse(Cmd, Parse, ttl, timeout):
+
+    Text = SysExec(Cmd, ttl=ttl, timeout=timeout)
+
+    with _Parsed_Lock:
+        Last = _Parsed.get(Cmd)
+        if Last is not None and Last[0] is Text:
+            return Last[1]
+
+    Result = Parse(Text)
+
+    with _Parsed_Lock:
+        _Parsed[Cmd] = (Text, Result)
+
+    return Result
+
+
+def Storcli_Drives(ttl=CACHE_TTL, timeout=None, Bin=None):
+    """
+    Return { "/c0/e8/s1": StorcliDrive } for every physical drive behind
+    every controller, from one storcli run.  Empty if there's no controller
+    or storcli isn't installed.
+    """
+
+    return _cached_parse((Bin or Storcli_Bin()) + " /call/eall/sall show all J", Parse_Drives_Json, ttl, timeout)
+
+
+def Storcli_Virtual_Drives(ttl=CACHE_TTL, timeout=None, Bin=None):
+    """
+    Return { "/c0/v0": StorcliVirtualDrive } for every virtual drive on
+    every controller, from one storcli run.
+    """
+
+    return _cached_parse((Bin or Storcli_Bin()) + " /call/vall show all J", Parse_Virtual_Drives_Json, ttl, timeout)
+
+
+def Drive_Errors(Drive):
+    """
+    Return [ (name, value) ] for the error counters of a StorcliDrive that
+    are non-zero (or a SMART alert that isn't "No").  N/A counters are skipped.
+    """
+
+    Errors = []
+
+    for Field, Name in ERROR_FIELDS:
+
+        Value = getattr(Drive, Field)
+        if Value is None or Value == 0 or Value == "No" or Value == "N/A":
+            continue
+
+        Errors.append((Name, Value))
+
+    return Errors
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+"""
+superblock - Read the ext4 superblock of a partition in-process.
+
+Every RID partition is ext4 (see RID_Create), and the superblock already tells
+us whether a filesystem needs checking: whether it was cleanly unmounted,
+whether errors were recorded, whether the journal needs replaying, and how
+many mounts / how long it's been since the last fsck.  Reading 1 KiB from the
+device is a lot cheaper than running fsck on every partition on every restart.
+"""
+
+import collections
+import os
+import struct
+import time
+
+SUPERBLOCK_OFFSET = 1024
+SUPERBLOCK_SIZE = 1024
+
+EXT4_MAGIC = 0xEF53
+
+# s_state flags
+EXT4_VALID_FS = 0x0001      # Unmounted cleanly
+EXT4_ERROR_FS = 0x0002      # Errors detected
+EXT4_ORPHAN_FS = 0x0004     # Orphans being recovered
+
+# s_feature_incompat flags
+EXT4_FEATURE_INCOMPAT_RECOVER = 0x0004     # Journal needs recovery
+
+# (offset, struct format) of the fields we care about
+_FIELDS = (
+    ("mtime",            0x2C, "<I"),
+    ("wtime",            0x30, "<I"),
+    ("mnt_count",        0x34, "<H"),
+    ("max_mnt_count",    0x36, "<h"),
+    ("magic",            0x38, "<H"),
+    ("state",            0x3A, "<H"),
+    ("lastcheck",        0x40, "<I"),
+    ("checkinterval",    0x44, "<I"),
+    ("feature_incompat", 0x60, "<I"),
+    ("error_count",      0x194, "<I"),
+)
+
+Ext4Superblock = collections.namedtuple("Ext4Superblock", [f[0] for f in _FIELDS] + ["label"])
+
+
+def Read_Superblock(Partition):
+    """
+    Return the Ext4Superblock of Partition, or None if it can't be read or
+    isn't ext2/3/4.
+    """
+
+    try:
+        fd = os.open(Partition, os.O_RDONLY)
+        try:
+            Raw = os.pread(fd, SUPERBLOCK_SIZE, SUPERBLOCK_OFFSET)
+        finally:
+            os.close(fd)
+    except OSError:
+        return None
+
+    if len(Raw) < SUPERBLOCK_SIZE:
+        return None
+
+    Values = [struct.unpack_from(fmt, Raw, offset)[0] for _, offset, fmt in _FIELDS]
+    Label = Raw[0x78:0x88].split(b"\0")[0].decode("utf-8", errors="replace")
+
+    Superblock = Ext4Superblock(*(Values + [Label]))
+
+    if Superblock.magic != EXT4_MAGIC:
+        return None
+
+    return Superblock
+
+
+def Fsck_Reason(Superblock, Now=None):
+    """
+    Return why this filesystem needs an fsck, or None if it's clean and has
+    been checked recently enough.  Mirrors the checks e2fsck does with -p.
+    """
+
+    if Superblock is None:
+        return "no ext4 superblock"
+
+    if Now is None:
+        Now = time.time()
+
+    if not Superblock.state & EXT4_VALID_FS:
+        return "not cleanly unmounted"
+
+    if Superblock.state & EXT4_ERROR_FS:
+        return "errors recorded"
+
+    if Superblock.error_count:
+        return str(Superblock.error_count) + " errors recorded"
+
+    if Superblock.state & EXT4_ORPHAN_FS:
+        return "orphan recovery pending"
+
+    if Superblock.feature_incompat & EXT4_FEATURE_INCOMPAT_RECOVER:
+        return "journal needs recovery"
+
+    if Superblock.max_mnt_count > 0 and Superblock.mnt_count >= Superblock.max_mnt_count:
+        return "mounted " + str(Superblock.mnt_count) + " times (max " + str(Superblock.max_mnt_count) + ")"
+
+    if Superblock.checkinterval and Now >= Superblock.lastcheck + Superblock.checkinterval:
+        return "not checked since " + time.strftime("%Y-%m-%d", time.gmtime(Superblock.lastcheck))
+
+    return None
+
+
+def Describe_Clean(Superblock, Now=None):
+    """
+    A short description of a clean filesystem for the skip report.
+    """
+
+    if Now is None:
+        Now = time.time()
+
+    Days = int((Now - Superblock.lastcheck) / 86400) if Superblock.lastcheck else None
+
+    Desc = "clean, " + str(Superblock.mnt_count) + " mounts"
+    if Superblock.max_mnt_count > 0:
+        Desc += " of " + str(Superblock.max_mnt_count)
+    if Days is not None:
+        Desc += ", checked " + str(Days) + " days ago"
+
+    return Desc
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+
+"""
+sysexec - A shared command executor for the depot tools.
+
+Every tool used to carry its own copy of SysExec() with module-global cache
+dicts.  This module replaces all of them with one thread-safe executor:
+
+    * Output is kept in a bounded LRU cache with a per-entry TTL.
+    * Concurrent callers asking for the same command are coalesced, so only
+      the first one forks and the rest wait for its output (single-flight).
+    * Every fork runs under a timeout so a hung tool can't stall a whole run.
+    * Cache hits, misses and forks are counted so a run can be profiled.
+
+"cat <file>" is still special-cased and read in-process instead of forking.
+A string command is split on whitespace; pass a list to quote arguments.
+Like the old implementations, stderr is merged into the output unless the
+caller asks for stdout only with stderr=False.
+"""
+
+import atexit
+import collections
+import logging
+import subprocess
+import threading
+import time
+
+# Defaults shared by every tool.  Callers may override the TTL and timeout
+# on a per-call basis.
+CACHE_EXPIRES = 20
+CACHE_MAX_ENTRIES = 4096
+DEFAULT_TIMEOUT = 120
+
+# Returned when a command can't be run or doesn't finish in time.  This is the
+# same value the old per-tool SysExec() implementations returned.
+ERROR = "ERROR"
+
+
+class _Flight(object):
+    """
+    A command currently being run by one thread that other threads are waiting on.
+    """
+
+    __slots__ = ("done", "output")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.output = ERROR
+
+
+class SysExecutor(object):
+    """
+    Run commands and cache their output.  Safe to share between threads.
+    """
+
+    def __init__(self, ttl=CACHE_EXPIRES, max_entries=CACHE_MAX_ENTRIES, timeout=DEFAULT_TIMEOUT):
+
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._cache = collections.OrderedDict()   # key -> (timestamp, output)
+        self._inflight = {}                       # key -> _Flight
+
+        self.hits = 0
+        self.misses = 0
+        self.forks = 0
+        self.timeouts = 0
+
+    @staticmethod
+    def _key(cmd, stderr=True):
+        # A list is keyed by its arguments, so ["echo", "a b"] and
+        # ["echo", "a", "b"] don't share an entry (or a flight).
+        return (cmd if isinstance(cmd, str) else tuple(cmd), bool(stderr))
+
+    @staticmethod
+    def _argv(cmd):
+        if isinstance(cmd, str):
+            return cmd.split()
+        return list(cmd)
+
+    def _lookup(self, key, ttl):
+        """
+        Return cached output for key, or None.  Must be called with the lock held.
+        """
+
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+
+        if time.time() - entry[0] >= ttl:
+            del self._cache[key]
+            return None
+
+        self._cache.move_to_end(key)
+        return entry[1]
+
+    def _store(self, key, output):
+        """
+        Save output in the cache, evicting the least recently used entries.
+        Must be called with the lock held.
+        """
+
+        self._cache[key] = (time.time(), output)
+        self._cache.move_to_end(key)
+
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def _execute(self, argv, timeout, stderr=True):
+        """
+        Actually run the command (or read the file).  Returns (output, cacheable).
+        """
+
+        if len(argv) == 2 and argv[0] == "cat":
+            try:
+                with open(argv[1], "r", encoding="utf-8", errors="replace") as f:
+                    return f.read(), True
+            except OSError as exc:
+                logging.debug("SysExec:: cannot read %s: %s", argv[1], exc)
+                return ERROR, False
+
+        with self._lock:
+            self.forks += 1
+
+        try:
+            result = subprocess.run(argv, stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT if stderr else subprocess.DEVNULL, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            with self._lock:
+                self.timeouts += 1
+            logging.warning("SysExec:: '%s' did not finish within %ss", " ".join(argv), timeout)
+            return ERROR, False
+        except OSError as exc:
+            logging.debug("SysExec:: cannot run '%s': %s", " ".join(argv), exc)
+            return ERROR, False
+
+        return result.stdout.decode("utf-8", errors="replace"), True
+
+    def run(self, cmd, ttl=None, timeout=None, stderr=True):
+        """
+        Run the given command and return the output, using the cache if possible.
+        With stderr=False only stdout is returned.
+        """
+
+        if ttl is None:
+            ttl = self.ttl
+        if timeout is None:
+            timeout = self.timeout
+
+        key = self._key(cmd, stderr)
+        argv = self._argv(cmd)
+
+        if not argv:
+            return ERROR
+
+        with self._lock:
+            output = self._lookup(key, ttl)
+            if output is not None:
+                self.hits += 1
+                return output
+
+            flight = self._inflight.get(key)
+            if flight is not None:
+                # Somebody else is already running this command, so wait for them.
+                self.hits += 1
+                leader = False
+            else:
+                self.misses += 1
+                flight = _Flight()
+                self._inflight[key] = flight
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            return flight.output
+
+        output = ERROR
+        try:
+            output, cacheable = self._execute(argv, timeout, stderr)
+            if cacheable:
+                with self._lock:
+                    self._store(key, output)
+        finally:
+            flight.output = output
+            with self._lock:
+                del self._inflight[key]
+            flight.done.set()
+
+        return output
+
+    def run_uncached(self, cmd, timeout=None, stderr=True):
+        """
+        Run the given command and return the output, bypassing the cache.
+        Only use this for commands that have side effects or whose output
+        must be fresh.
+        """
+
+        if timeout is None:
+            timeout = self.timeout
+
+        argv = self._argv(cmd)
+        if not argv:
+            return ERROR
+
+        return self._execute(argv, timeout, stderr)[0]
+
+    def invalidate(self, cmd=None):
+        """
+        Drop one command (or everything) from the cache.
+        """
+
+        with self._lock:
+            if cmd is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(self._key(cmd), None)
+                self._cache.pop(self._key(cmd, stderr=False), None)
+
+    def stats(self):
+        """
+        Return a dict of cache statistics.
+        """
+
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "forks": self.forks,
+                "timeouts": self.timeouts,
+                "entries": len(self._cache),
+            }
+
+
+# The executor shared by everything that imports this module.
+Executor = SysExecutor()
+
+
+def SysExec(cmd, ttl=None, timeout=None, stderr=True):
+    """
+    Run the given command and return the output.  Output is cached for
+    CACHE_EXPIRES seconds unless a different ttl is given.
+    """
+
+    return Executor.run(cmd, ttl=ttl, timeout=timeout, stderr=stderr)
+
+
+def SysExecUncached(cmd, timeout=None, stderr=True):
+    """
+    Run the given command and return the output.  This command will *not* cache the output
+    of commands it has run recently.   You should use SysExec whenever possible as it is
+    faster.
+    """
+
+    return Executor.run_uncached(cmd, timeout=timeout, stderr=stderr)
+
+
+def SysExecStats():
+    """
+    Return the hit/miss/fork counters of the shared executor.
+    """
+
+    return Executor.stats()
+
+
+@atexit.register
+def _log_stats():
+    logging.debug("SysExec:: stats = " + str(Executor.stats()))
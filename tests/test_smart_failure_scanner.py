@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+import smart_failure_scanner as scanner
+from smartjson import Parse_Smart_Json
+
+# What "smartctl -x --json" says about a healthy SAS drive: just "passed", with
+# no IE string, and clean error counters.
+HEALTHY_SAS_DRIVE = {
+    "device": {"protocol": "SCSI"},
+    "scsi_transport_protocol": {"name": "SAS (SPL-4)"},
+    "model_name": "SEAGATE ST4000NM0025",
+    "user_capacity": {"bytes": 4000787030016},
+    "smart_status": {"passed": True},
+    "scsi_grown_defect_list": 0,
+    "scsi_error_counter_log": {
+        "read": {"total_errors_corrected": 0, "correction_algorithm_invocations": 0, "total_uncorrected_errors": 0},
+        "write": {"total_errors_corrected": 0, "correction_algorithm_invocations": 0, "total_uncorrected_errors": 0},
+    },
+}
+
+
+def evaluate(Doc, Profile=scanner.DEFAULT_PROFILE):
+
+    Record = Parse_Smart_Json("/dev/sdx", json.dumps(Doc))
+    Identity = scanner.DeviceIdentity(Record.Device, Record.Vendor, Record.Model, Record.Serial, Record.Capacity, None, None)
+    Compiled = scanner.Compile_Rules(scanner.RULES, scanner.PROFILES[Profile])
+
+    return scanner.Evaluate(Compiled, Record.Protocol, Identity, Record)
+
+
+@pytest.mark.parametrize("Profile", sorted(scanner.PROFILES))
+def test_healthy_sas_drive_reports_nothing(Profile):
+
+    assert evaluate(HEALTHY_SAS_DRIVE, Profile) == []
+
+
+def test_failing_sas_drive_reports_its_status():
+
+    Doc = dict(HEALTHY_SAS_DRIVE, smart_status={
+        "passed": False,
+        "scsi": {"ie_string": "FAILURE PREDICTION THRESHOLD EXCEEDED"},
+    })
+
+    assert evaluate(Doc) == ["non-OK smart status FAILURE PREDICTION THRESHOLD EXCEEDED"]
+
+
+def test_intel_233_is_skipped_by_smartctl_model_name():
+
+    Doc = {
+        "device": {"protocol": "ATA"},
+        "model_name": "INTEL SSDSA2M040G2GC",
+        "user_capacity": {"bytes": 40018599936},
+        "ata_smart_attributes": {"table": [
+            {"id": 233, "name": "Media_Wearout_Indicator", "value": 3, "worst": 3, "thresh": 5, "raw": {"value": 0}},
+        ]},
+    }
+
+    assert evaluate(Doc) == []
+    assert evaluate(dict(Doc, model_name="OTHER SSD")) == ["failing on SMART attribute 233 Media_Wearout_Indicator"]
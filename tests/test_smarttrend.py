@@ -0,0 +1,34 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import smarttrend
+from smarttrend import FleetData, Analyze_Attribute
+
+NOW = 1000000000.0
+
+
+def outliers(Values):
+
+    N = len(Values)
+    Data = FleetData(["d" + str(i) for i in range(N)], np.arange(N), np.full(N, NOW - 100.0), np.array(Values, np.float64))
+
+    return [f.Drive for f in Analyze_Attribute(Data, {}, 5, "Reallocated_Sector_Ct", 1.0, Now=NOW)]
+
+
+def test_percentile_of_others_matches_numpy():
+
+    Values = np.array([3.0, 0.0, 7.0, 7.0, 1.0, 20.0, 4.0, 0.0, 2.0, 9.0, 5.0])
+    Expected = [np.percentile(np.delete(Values, i), 99.0) for i in range(len(Values))]
+
+    assert np.allclose(smarttrend._percentile_of_others(Values, 99.0), Expected)
+
+
+def test_top_drive_barely_above_its_peers_is_not_an_outlier():
+
+    assert outliers([8] * 9 + [9]) == []
+
+
+def test_drive_far_above_its_peers_is_an_outlier():
+
+    assert outliers([0] * 9 + [50]) == ["d9"]
@@ -0,0 +1,21 @@
+from sysexec import SysExecutor
+
+
+def test_list_commands_are_keyed_by_argument():
+
+    Executor = SysExecutor()
+
+    assert Executor.run(["printf", "%s|", "a b"]) == "a b|"
+    assert Executor.run(["printf", "%s|", "a", "b"]) == "a|b|"
+    assert Executor.stats()["forks"] == 2
+
+
+def test_stdout_only_output_is_cached_separately():
+
+    Executor = SysExecutor()
+    Cmd = ["sh", "-c", "echo out; echo err >&2"]
+
+    assert Executor.run(Cmd) == "out\nerr\n"
+    assert Executor.run(Cmd, stderr=False) == "out\n"
+    assert Executor.run(Cmd, stderr=False) == "out\n"
+    assert Executor.stats()["hits"] == 1
@@ -30,4 +30,4 @@ for i in sys.argv:
 if len(sys.argv) < 2:
 	Help_RID_Umount()
 
-RID_Umount(sys.argv[1])
+RID_Command(RID_Umount, sys.argv[1])
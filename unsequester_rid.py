@@ -42,4 +42,4 @@ if Rid not in Dict_Rid_To_Dev:
 	sys.exit(1)
 
 # Then...
-RID_Unsequester(Rid, Msg)
+RID_Command(RID_Unsequester, Rid, Msg)